@@ -4,11 +4,18 @@ AI-ImpactSense - Earthquake Impact Prediction System
 """
 
 import streamlit as st
-import joblib
-import numpy as np
 import pandas as pd
+import math
 import os
 
+import model_card
+from model_registry import REGISTRY_DIR, ModelRegistry
+from prediction_cache import PredictionCache
+from predictor import get_alert_info
+from sensitivity import sensitivity_sweep
+from spatial_index import ALERT_ORDER, ZONE_INDEX_FILE, ZoneIndex
+from stage_timing import TIMER
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -20,875 +27,111 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Whole-script timing; stages below are recorded only when AI_IMPACTSENSE_TIMING=1
+rerun_timer = TIMER.start()
+TIMER.increment("app.reruns")
+
 # ============================================================================
 # CUSTOM CSS - Apple-like Minimalist Design
 # ============================================================================
 
-st.markdown("""
-<style>
-    /* Import Fonts */
-    @import url('https://fonts.googleapis.com/css2?family=SF+Pro+Display:wght@300;400;500;600;700&display=swap');
-    
-    /* Global Reset */
-    .stApp {
-        font-family: 'SF Pro Display', -apple-system, BlinkMacSystemFont, sans-serif;
-        background: #E3E3E3;
-        color: #1B3C53;
-    }
-    
-    #MainMenu, footer, header {visibility: hidden;}
-    
-    /* ============================================ */
-    /* NUMBER INPUT BOXES */
-    /* ============================================ */
-    
-    .stNumberInput > div > div {
-        background: #ffffff !important;
-        border: 2px solid #234C6A !important;
-        border-radius: 12px !important;
-        box-shadow: none !important;
-        transition: all 0.2s ease !important;
-    }
-    
-    .stNumberInput > div > div:focus-within {
-        border-color: #456882 !important;
-        box-shadow: 0 0 0 3px rgba(69, 104, 130, 0.2) !important;
-    }
-    
-    .stNumberInput input {
-        color: #E3E3E3 !important;
-        background: #234C6A !important;
-        font-size: 1.1rem !important;
-        font-weight: 500 !important;
-        padding: 12px 16px !important;
-    }
-    
-    /* ============================================ */
-    /* CLEAN CARDS - Apple Style */
-    /* ============================================ */
-    
-    .apple-card {
-        background: #ffffff;
-        border-radius: 20px;
-        padding: 1.5rem;
-        margin-bottom: 1.5rem;
-        box-shadow: 0 2px 12px rgba(27, 60, 83, 0.08);
-        border: 1px solid rgba(27, 60, 83, 0.05);
-    }
-    
-    .apple-card:hover {
-        box-shadow: 0 4px 20px rgba(27, 60, 83, 0.12);
-    }
-    
-    .card-header {
-        display: flex;
-        align-items: center;
-        gap: 12px;
-        margin-bottom: 1.25rem;
-        padding-bottom: 1rem;
-        border-bottom: 1px solid #f0f0f0;
-    }
-    
-    .card-icon {
-        width: 44px;
-        height: 44px;
-        border-radius: 12px;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        font-size: 1.25rem;
-        font-weight: 600;
-        background: #234C6A;
-        color: #ffffff;
-    }
-    
-    .card-title {
-        font-size: 1.15rem;
-        font-weight: 600;
-        color: #1B3C53;
-    }
-    
-    .card-subtitle {
-        font-size: 0.85rem;
-        color: #456882;
-        margin-top: 2px;
-    }
-    
-    /* ============================================ */
-    /* ALERT BOXES - Enhanced */
-    /* ============================================ */
-    
-    .alert-apple {
-        padding: 1.75rem 2rem;
-        border-radius: 20px;
-        margin: 1.25rem 0;
-        border-left: 6px solid;
-        box-shadow: 0 4px 20px rgba(27, 60, 83, 0.1);
-        transition: all 0.3s ease;
-    }
-    
-    .alert-apple:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 25px rgba(27, 60, 83, 0.15);
-    }
-    
-    .alert-green {
-        background: linear-gradient(135deg, rgba(0, 170, 136, 0.12) 0%, rgba(0, 170, 136, 0.05) 100%);
-        border-color: #00aa88;
-    }
-    
-    .alert-yellow {
-        background: linear-gradient(135deg, rgba(255, 193, 7, 0.12) 0%, rgba(255, 193, 7, 0.05) 100%);
-        border-color: #ffc107;
-    }
-    
-    .alert-orange {
-        background: linear-gradient(135deg, rgba(255, 152, 0, 0.12) 0%, rgba(255, 152, 0, 0.05) 100%);
-        border-color: #ff9800;
-    }
-    
-    .alert-red {
-        background: linear-gradient(135deg, rgba(244, 67, 54, 0.12) 0%, rgba(244, 67, 54, 0.05) 100%);
-        border-color: #f44336;
-    }
-    
-    .alert-title {
-        font-size: 1.5rem;
-        font-weight: 700;
-        margin-bottom: 0.5rem;
-        letter-spacing: -0.5px;
-    }
-    
-    .alert-desc {
-        color: #456882;
-        font-size: 1rem;
-        font-weight: 400;
-    }
-    
-    /* ============================================ */
-    /* METRIC CARDS */
-    /* ============================================ */
-    
-    .metric-apple {
-        background: #f8f9fa;
-        border-radius: 14px;
-        padding: 1.25rem;
-        text-align: center;
-        border: 1px solid #e9ecef;
-    }
-    
-    .metric-value {
-        font-size: 1.8rem;
-        font-weight: 700;
-        color: #234C6A;
-        font-family: 'SF Pro Display', sans-serif;
-    }
-    
-    .metric-label {
-        font-size: 0.75rem;
-        color: #456882;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-        margin-top: 4px;
-        font-weight: 500;
-    }
-    
-    /* ============================================ */
-    /* BUTTONS - Apple Style */
-    /* ============================================ */
-    
-    .stButton > button {
-        background: #234C6A !important;
-        color: #ffffff !important;
-        border: none !important;
-        border-radius: 12px !important;
-        padding: 0.9rem 2.2rem !important;
-        font-size: 1rem !important;
-        font-weight: 600 !important;
-        transition: all 0.2s ease !important;
-        box-shadow: 0 2px 8px rgba(35, 76, 106, 0.25) !important;
-    }
-    
-    .stButton > button:hover {
-        background: #1B3C53 !important;
-        transform: translateY(-1px);
-        box-shadow: 0 4px 16px rgba(35, 76, 106, 0.35) !important;
-    }
-    
-    /* ============================================ */
-    /* SIDEBAR - Dark Theme */
-    /* ============================================ */
-    
-    section[data-testid="stSidebar"] {
-        background: #1B3C53 !important;
-        border-right: none;
-    }
-    
-    section[data-testid="stSidebar"] h2,
-    section[data-testid="stSidebar"] h3,
-    section[data-testid="stSidebar"] h4,
-    section[data-testid="stSidebar"] p,
-    section[data-testid="stSidebar"] div {
-        color: #E3E3E3 !important;
-    }
-    
-    section[data-testid="stSidebar"] .stMarkdown,
-    section[data-testid="stSidebar"] .stInfo {
-        color: #E3E3E3 !important;
-    }
-    
-    /* ============================================ */
-    /* PROGRESS BAR */
-    /* ============================================ */
-    
-    .stProgress > div > div {
-        background: #234C6A !important;
-        border-radius: 6px;
-    }
-    
-    /* ============================================ */
-    /* MAIN HEADER */
-    /* ============================================ */
-    
-    .main-title {
-        font-size: 2.8rem;
-        font-weight: 700;
-        text-align: center;
-        margin-bottom: 0.5rem;
-        color: #1B3C53;
-        letter-spacing: -0.5px;
-    }
-    
-    .main-subtitle {
-        font-size: 1.1rem;
-        text-align: center;
-        color: #456882;
-        margin-bottom: 2.5rem;
-        font-weight: 400;
-    }
-    
-    /* ============================================ */
-    /* PARAMETER ROW */
-    /* ============================================ */
-    
-    .param-row {
-        display: flex;
-        align-items: center;
-        justify-content: space-between;
-        padding: 1rem 1.25rem;
-        background: #f8f9fa;
-        border-radius: 12px;
-        margin-bottom: 0.75rem;
-        border: 1px solid #e9ecef;
-    }
-    
-    .param-name {
-        font-size: 0.95rem;
-        color: #456882;
-        font-weight: 500;
-    }
-    
-    .param-value {
-        font-size: 1.2rem;
-        font-weight: 600;
-        color: #1B3C53;
-        font-family: 'SF Pro Display', sans-serif;
-    }
-    
-    /* ============================================ */
-    /* SECTION TITLES - Premium */
-    /* ============================================ */
-    
-    .section-title {
-        font-size: 0.85rem;
-        font-weight: 700;
-        color: #1B3C53;
-        text-transform: uppercase;
-        letter-spacing: 1.5px;
-        margin-bottom: 1rem;
-        padding-bottom: 0.5rem;
-        border-bottom: 2px solid #e9ecef;
-    }
-    
-    /* ============================================ */
-    /* INPUT GROUP */
-    /* ============================================ */
-    
-    .input-group {
-        margin-bottom: 1.25rem;
-    }
-    
-    .input-label {
-        font-size: 0.9rem;
-        font-weight: 500;
-        color: #1B3C53;
-        margin-bottom: 0.5rem;
-        display: block;
-    }
-    
-    /* ============================================ */
-    /* FOOTER */
-    /* ============================================ */
-    
-    .footer {
-        text-align: center;
-        margin-top: 3rem;
-        padding: 1.5rem;
-        border-top: 1px solid #e9ecef;
-        color: #456882;
-        font-size: 0.85rem;
-    }
-    
-    /* ============================================ */
-    /* INFO BOX */
-    /* ============================================ */
-    
-    .info-apple {
-        background: #f8f9fa;
-        border: 1px solid #e9ecef;
-        border-radius: 10px;
-        padding: 0.875rem 1rem;
-        margin: 0.5rem 0;
-        font-size: 0.9rem;
-        color: #456882;
-    }
-    
-    /* ============================================ */
-    /* DIVIDER */
-    /* ============================================ */
-    
-    hr {
-        border-color: #e9ecef;
-        margin: 2rem 0;
-    }
-    
-    /* ============================================ */
-    /* SUCCESS/ERROR/INFO */
-    /* ============================================ */
-    
-    .stSuccess, .stInfo, .stError, .stWarning {
-        border-radius: 12px !important;
-        padding: 1rem 1.25rem !important;
-    }
-    
-    /* ============================================ */
-    /* SPINNER */
-    /* ============================================ */
-    
-    .stSpinner {
-        color: #234C6A;
-    }
-    
-    /* ============================================ */
-    /* TIMELINE - Premium */
-    /* ============================================ */
-    
-    .timeline-wrapper {
-        background: #ffffff;
-        border-radius: 16px;
-        padding: 1.5rem;
-        margin: 1.25rem 0;
-        box-shadow: 0 2px 12px rgba(27, 60, 83, 0.08);
-    }
-    
-    .timeline-container {
-        display: flex;
-        align-items: center;
-        justify-content: space-between;
-        padding: 0.5rem 0;
-        position: relative;
-    }
-    
-    .timeline-container::before {
-        content: '';
-        position: absolute;
-        top: 50%;
-        left: 0;
-        right: 0;
-        height: 4px;
-        background: #e9ecef;
-        transform: translateY(-50%);
-        z-index: 0;
-    }
-    
-    .timeline-progress {
-        position: absolute;
-        top: 50%;
-        left: 0;
-        height: 4px;
-        background: linear-gradient(90deg, #00aa88 0%, #ffc107 35%, #ff9800 70%, #f44336 100%);
-        transform: translateY(-50%);
-        z-index: 1;
-        transition: width 0.5s ease;
-    }
-    
-    .timeline-step {
-        flex: 1;
-        text-align: center;
-        padding: 0.75rem 0.5rem;
-        border-radius: 10px;
-        font-size: 0.7rem;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-        position: relative;
-        z-index: 2;
-        background: #f8f9fa;
-        margin: 0 4px;
-        transition: all 0.3s ease;
-    }
-    
-    .timeline-step:hover {
-        transform: translateY(-2px);
-    }
-    
-    .timeline-green { 
-        background: rgba(0, 170, 136, 0.1); 
-        color: #00aa88; 
-        border: 2px solid transparent;
-    }
-    
-    .timeline-yellow { 
-        background: rgba(255, 193, 7, 0.1); 
-        color: #b38600; 
-        border: 2px solid transparent;
-    }
-    
-    .timeline-orange { 
-        background: rgba(255, 152, 0, 0.1); 
-        color: #e65100; 
-        border: 2px solid transparent;
-    }
-    
-    .timeline-red { 
-        background: rgba(244, 67, 54, 0.1); 
-        color: #c62828; 
-        border: 2px solid transparent;
-    }
-    
-    .timeline-step.active-green {
-        background: #00aa88;
-        color: #ffffff;
-        box-shadow: 0 4px 12px rgba(0, 170, 136, 0.35);
-    }
-    
-    .timeline-step.active-yellow {
-        background: #ffc107;
-        color: #1B3C53;
-        box-shadow: 0 4px 12px rgba(255, 193, 7, 0.35);
-    }
-    
-    .timeline-step.active-orange {
-        background: #ff9800;
-        color: #ffffff;
-        box-shadow: 0 4px 12px rgba(255, 152, 0, 0.35);
-    }
-    
-    .timeline-step.active-red {
-        background: #f44336;
-        color: #ffffff;
-        box-shadow: 0 4px 12px rgba(244, 67, 54, 0.35);
-    }
-    
-    .timeline-marker {
-        position: absolute;
-        top: -8px;
-        width: 16px;
-        height: 16px;
-        background: #1B3C53;
-        border: 3px solid #fff;
-        border-radius: 50%;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.2);
-    }
-    
-    /* ============================================ */
-    /* CONFIDENCE BREAKDOWN - Premium */
-    /* ============================================ */
-    
-    .confidence-wrapper {
-        background: #ffffff;
-        border-radius: 16px;
-        padding: 1.25rem;
-        margin: 1rem 0;
-        box-shadow: 0 2px 12px rgba(27, 60, 83, 0.08);
-    }
-    
-    .confidence-item {
-        display: flex;
-        align-items: center;
-        justify-content: space-between;
-        padding: 0.875rem 1rem;
-        background: #f8f9fa;
-        border-radius: 12px;
-        margin-bottom: 0.5rem;
-        transition: all 0.2s ease;
-    }
-    
-    .confidence-item:hover {
-        background: #f0f2f5;
-        transform: translateX(4px);
-    }
-    
-    .confidence-item:last-child {
-        margin-bottom: 0;
-    }
-    
-    .confidence-label {
-        font-size: 0.9rem;
-        color: #456882;
-        font-weight: 500;
-    }
-    
-    .confidence-value {
-        font-size: 0.95rem;
-        font-weight: 700;
-        color: #234C6A;
-        min-width: 55px;
-        text-align: right;
-    }
-    
-    /* ============================================ */
-    /* FEATURE IMPORTANCE - Premium */
-    /* ============================================ */
-    
-    .feature-wrapper {
-        background: #ffffff;
-        border-radius: 16px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-        box-shadow: 0 2px 12px rgba(27, 60, 83, 0.08);
-    }
-    
-    .feature-row {
-        display: flex;
-        align-items: center;
-        justify-content: space-between;
-        padding: 0.875rem 0;
-        border-bottom: 1px solid #f0f0f0;
-        transition: all 0.2s ease;
-    }
-    
-    .feature-row:hover {
-        background: rgba(35, 76, 106, 0.03);
-        margin: 0 -1rem;
-        padding-left: 1rem;
-        padding-right: 1rem;
-        border-radius: 8px;
-    }
-    
-    .feature-row:last-child {
-        border-bottom: none;
-    }
-    
-    .feature-name {
-        font-size: 0.9rem;
-        color: #1B3C53;
-        font-weight: 500;
-        min-width: 100px;
-    }
-    
-    .feature-bar-container {
-        flex: 1;
-        margin: 0 1.25rem;
-        height: 10px;
-        background: #e9ecef;
-        border-radius: 6px;
-        overflow: hidden;
-    }
-    
-    .feature-bar {
-        height: 100%;
-        border-radius: 6px;
-        transition: width 0.6s cubic-bezier(0.4, 0, 0.2, 1);
-    }
-    
-    .feature-percent {
-        font-size: 0.9rem;
-        font-weight: 700;
-        color: #234C6A;
-        min-width: 55px;
-        text-align: right;
-    }
-    
-    .feature-increase { 
-        background: linear-gradient(90deg, #234C6A 0%, #456882 100%);
-        box-shadow: 0 2px 8px rgba(35, 76, 106, 0.3);
-    }
-    
-    .feature-decrease { 
-        background: linear-gradient(90deg, #00aa88 0%, #00c9a7 100%);
-        box-shadow: 0 2px 8px rgba(0, 170, 136, 0.3);
-    }
-    
-    /* ============================================ */
-    /* EMERGENCY MODE */
-    /* ============================================ */
-    
-    .emergency-card {
-        background: linear-gradient(135deg, #1B3C53 0%, #234C6A 100%);
-        border-radius: 16px;
-        padding: 1.5rem;
-        color: #ffffff;
-    }
-    
-    .emergency-card .card-title {
-        color: #ffffff;
-    }
-    
-    .emergency-card .card-subtitle {
-        color: rgba(255, 255, 255, 0.7);
-    }
-    
-    .emergency-card .info-apple {
-        background: rgba(255, 255, 255, 0.1);
-        border: none;
-        color: #ffffff;
-    }
-    
-    .emergency-card .metric-apple {
-        background: rgba(255, 255, 255, 0.15);
-        border: none;
-    }
-    
-    .emergency-card .metric-value {
-        color: #ffffff;
-    }
-    
-    .emergency-card .metric-label {
-        color: rgba(255, 255, 255, 0.8);
-    }
-    
-    .emergency-toggle {
-        background: #f44336 !important;
-        border: none !important;
-    }
-    
-    /* ============================================ */
-    /* TOGGLE SWITCH */
-    /* ============================================ */
-    
-    .toggle-container {
-        display: flex;
-        align-items: center;
-        justify-content: space-between;
-        padding: 1rem;
-        background: #f8f9fa;
-        border-radius: 12px;
-        margin-bottom: 1rem;
-    }
-    
-    .toggle-label {
-        font-size: 0.9rem;
-        font-weight: 600;
-        color: #1B3C53;
-    }
-    
-    /* ============================================ */
-    /* ENHANCED FOOTER */
-    /* ============================================ */
-    
-    .footer-main {
-        font-size: 1rem;
-        font-weight: 600;
-        color: #1B3C53;
-        margin-bottom: 0.5rem;
-    }
-    
-    .footer-subtitle {
-        font-size: 0.85rem;
-        color: #456882;
-        margin-bottom: 0.5rem;
-    }
-    
-    .footer-disclaimer {
-        font-size: 0.75rem;
-        color: #78909c;
-        border-top: 1px solid #e9ecef;
-        padding-top: 1rem;
-        margin-top: 1rem;
-    }
-    
-    /* ============================================ */
-    /* INFO PANEL - Sidebar */
-    /* ============================================ */
-    
-    .info-panel {
-        background: rgba(255, 255, 255, 0.08);
-        border-radius: 14px;
-        padding: 1.25rem;
-        margin-top: 1rem;
-    }
-    
-    .info-panel-title {
-        font-size: 0.95rem;
-        font-weight: 600;
-        color: #ffffff;
-        margin-bottom: 1rem;
-        padding-bottom: 0.75rem;
-        border-bottom: 1px solid rgba(255, 255, 255, 0.1);
-    }
-    
-    .info-panel-item {
-        display: flex;
-        align-items: flex-start;
-        gap: 10px;
-        margin-bottom: 1rem;
-    }
-    
-    .info-panel-item:last-child {
-        margin-bottom: 0;
-    }
-    
-    .info-panel-icon {
-        font-size: 1rem;
-        width: 24px;
-        text-align: center;
-        flex-shrink: 0;
-        margin-top: 1px;
-    }
-    
-    .info-panel-label {
-        font-size: 0.75rem;
-        font-weight: 600;
-        color: rgba(255, 255, 255, 0.9);
-        margin-bottom: 0.2rem;
-    }
-    
-    .info-panel-desc {
-        font-size: 0.8rem;
-        color: rgba(255, 255, 255, 0.7);
-        line-height: 1.5;
-    }
-    
-    /* ============================================ */
-    /* WHY AI PANEL - Main Content */
-    /* ============================================ */
-    
-    .why-ai-panel {
-        background: #ffffff;
-        border-radius: 16px;
-        padding: 1.5rem;
-        margin-top: 1rem;
-        box-shadow: 0 2px 12px rgba(27, 60, 83, 0.08);
-    }
-    
-    .why-ai-title {
-        font-size: 1.1rem;
-        font-weight: 700;
-        color: #1B3C53;
-        margin-bottom: 1.25rem;
-        padding-bottom: 0.75rem;
-        border-bottom: 2px solid #e9ecef;
-    }
-    
-    .why-ai-item {
-        display: flex;
-        align-items: flex-start;
-        gap: 12px;
-        margin-bottom: 1rem;
-    }
-    
-    .why-ai-item:last-child {
-        margin-bottom: 0;
-    }
-    
-    .why-ai-icon {
-        font-size: 1.1rem;
-        width: 28px;
-        text-align: center;
-        flex-shrink: 0;
-        margin-top: 1px;
-    }
-    
-    .why-ai-label {
-        font-size: 0.85rem;
-        font-weight: 600;
-        color: #1B3C53;
-        margin-bottom: 0.25rem;
-    }
-    
-    .why-ai-desc {
-        font-size: 0.85rem;
-        color: #456882;
-        line-height: 1.5;
-    }
-</style>
-""", unsafe_allow_html=True)
+STYLESHEET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "style.css")
+
+@st.cache_resource
+def load_stylesheet():
+    with open(STYLESHEET, encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+# Emitted on full runs only. Every widget lives in the prediction fragment
+# below, so after the first run of a session only the fragment reruns.
+with TIMER.stage("app.render.css"):
+    st.markdown(load_stylesheet(), unsafe_allow_html=True)
 
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
 
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
 @st.cache_resource
-def load_model():
+def load_registry():
     try:
-        # Get the directory where this script is located
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        # Construct absolute paths to model files
-        model_path = os.path.join(script_dir, "earthquake_impact_rf.pkl")
-        feature_path = os.path.join(script_dir, "feature_order.pkl")
-        model = joblib.load(model_path)
-        feature_order = joblib.load(feature_path)
-        return model, feature_order, None
+        # Serves the active version under models/ and swaps to newly activated
+        # ones in the background (see model_registry.py). Until a version is
+        # published, the model files next to this script are served;
+        # AI_IMPACTSENSE_ARTIFACT selects another artifact for them, e.g. the
+        # compacted forest.
+        registry = ModelRegistry(
+            os.environ.get("AI_IMPACTSENSE_REGISTRY", os.path.join(APP_DIR, REGISTRY_DIR)),
+            fallback_dir=APP_DIR,
+            artifact=os.environ.get("AI_IMPACTSENSE_ARTIFACT"),
+            warm_explainer=True,
+        )
+        return registry, None
     except Exception as e:
-        return None, None, str(e)
-
-def get_alert_info(alert_value):
-    """Get alert information based on level."""
-    info = {
-        'green': {
-            'color': '#00aa88', 'bg': 'alert-green', 'level': 'LOW IMPACT',
-            'desc': 'Minimal damage expected'
-        },
-        'yellow': {
-            'color': '#ffc107', 'bg': 'alert-yellow', 'level': 'MODERATE IMPACT',
-            'desc': 'Some damage possible'
-        },
-        'orange': {
-            'color': '#ff9800', 'bg': 'alert-orange', 'level': 'HIGH IMPACT',
-            'desc': 'Significant damage expected'
-        },
-        'red': {
-            'color': '#f44336', 'bg': 'alert-red', 'level': 'CRITICAL IMPACT',
-            'desc': 'Severe damage expected'
-        }
-    }
-    return info.get(alert_value, info['green'])
-
-def get_recommendations(alert):
-    recs = {
-        'green': [
-            'Monitor official channels',
-            'Review emergency plans',
-            'Secure loose items',
-            'Ensure communication devices are charged'
-        ],
-        'yellow': [
-            'Finalize evacuation routes',
-            'Alert family members',
-            'Prepare emergency kit',
-            'Listen to emergency broadcasts'
-        ],
-        'orange': [
-            'Follow evacuation orders',
-            'Avoid damaged structures',
-            'Move to designated safe zones',
-            'Check on neighbors if safe'
-        ],
-        'red': [
-            'Follow all emergency instructions immediately',
-            'Stay calm and assist others if possible',
-            'Seek shelter in safe location',
-            'Use emergency services only for life-threatening situations'
-        ]
-    }
-    return recs.get(alert, recs['green'])
+        return None, str(e)
+
+@st.cache_resource(max_entries=4)
+def load_prediction_cache(_predictor, model_version):
+    # Shared across sessions; set AI_IMPACTSENSE_CACHE_DB to also share
+    # results between worker processes through a SQLite file.
+    return PredictionCache(
+        _predictor.model_version, _predictor.feature_order,
+        db_path=os.environ.get("AI_IMPACTSENSE_CACHE_DB"),
+    )
+
+@st.cache_data(max_entries=1024)
+def explain_prediction(_predictor, model_version, values):
+    # Widget inputs sit on a fixed grid, so each grid point is explained once
+    try:
+        return _predictor.explain_one(list(values))
+    except ValueError as e:
+        return {'error': str(e)}
+
+
+@st.cache_data(max_entries=1024)
+def tree_agreement(_predictor, model_version, values):
+    # Share of trees voting for the predicted alert; None when the engine
+    # (e.g. a quantized artifact) does not expose per-tree votes
+    try:
+        return float(_predictor.tree_agreement([list(values)])[0])
+    except ValueError:
+        return None
+
+
+@st.cache_resource
+def load_model_card(_registry, model_version):
+    # Held-out metrics written by train_model.py; None when missing or stale
+    try:
+        return model_card.load_model_card(_registry.model_dir(model_version), model_version)
+    except (OSError, ValueError):
+        return None
+
+
+@st.cache_data(max_entries=256)
+def run_sensitivity_sweep(_predictor, model_version, values):
+    # model_version keys the cache so a new model never reuses old curves
+    return sensitivity_sweep(_predictor, list(values))
+
+@st.cache_resource(max_entries=2)
+def load_zone_index(path, mtime):
+    # mtime keys the cache, so a rebuilt index is picked up on the next run
+    return ZoneIndex.load(path)
+
+
+def current_zone_index():
+    # Built by spatial_index.py from scored events; the zone view is hidden without one
+    path = os.environ.get("AI_IMPACTSENSE_ZONE_INDEX", os.path.join(APP_DIR, ZONE_INDEX_FILE))
+    try:
+        return load_zone_index(path, os.path.getmtime(path))
+    except (OSError, ValueError, KeyError):
+        return None
 
 # ============================================================================
 # SIDEBAR
 # ============================================================================
 
-with st.sidebar:
+with st.sidebar, TIMER.stage("app.render.sidebar"):
     st.markdown("""
     <div style="text-align: center; padding: 1rem;">
         <h2 style="color: #1B3C53; margin: 0; font-weight: 700;">AI-ImpactSense</h2>
@@ -941,291 +184,388 @@ st.markdown("<h1 class='main-title'>AI-ImpactSense</h1>", unsafe_allow_html=True
 st.markdown("<p class='main-subtitle'>Earthquake Impact Prediction powered by Machine Learning</p>", unsafe_allow_html=True)
 
 # Load model
-model, feature_order, model_error = load_model()
+with TIMER.stage("app.load_model"):
+    registry, model_error = load_registry()
 
 if model_error:
     st.error(f"Model Error: {model_error}")
     st.stop()
 else:
+    predictor = registry.current()
     st.success("ML Model loaded successfully")
 
 # ============================================================================
-# LAYOUT
+# PREDICTION WORKSPACE
 # ============================================================================
 
-col1, col2 = st.columns([1, 1], gap="large")
+ALERT_POSITIONS = {'green': 0, 'yellow': 1, 'orange': 2, 'red': 3}
+FEATURE_LABELS = {'magnitude': 'Magnitude', 'depth': 'Depth', 'cdi': 'CDI',
+                  'mmi': 'MMI', 'sig': 'Significance'}
 
-# ============================================================================
-# LEFT COLUMN - INPUTS
-# ============================================================================
 
-with col1:
-    st.markdown("""
-    <div class="apple-card">
-        <div class="card-header">
-            <div class="card-icon">S</div>
-            <div>
-                <div class="card-title">Seismic Parameters</div>
-                <div class="card-subtitle">Enter earthquake characteristics</div>
-            </div>
+def render_alert(pred):
+    """Alert box and impact timeline as one HTML block."""
+    info = pred['info']
+    current_pos = ALERT_POSITIONS.get(pred['alert'], 0)
+    steps = "".join(
+        f"""<div class="timeline-step {f'active-{a} ' if current_pos == i else f'timeline-{a}'}" """
+        f"""style="opacity: {1 if current_pos >= i else 0.4}">{label}</div>"""
+        for i, (a, label) in enumerate(zip(ALERT_POSITIONS, ['LOW', 'MODERATE', 'HIGH', 'CRITICAL']))
+    )
+    st.markdown(f"""
+    <div class="alert-apple {info['bg']}">
+        <div class="alert-title" style="color: {info['color']};">{info['level']}</div>
+        <div class="alert-desc">{info['desc']}</div>
+    </div>
+    <br><div class='section-title'>Impact Level Timeline</div>
+    <div class="timeline-wrapper">
+        <div class="timeline-container">
+            <div class="timeline-progress" style="width: {current_pos * 33.33}%"></div>
+            {steps}
         </div>
     </div>
     """, unsafe_allow_html=True)
-    
-    st.markdown("<div class='apple-card'>", unsafe_allow_html=True)
-    
-    # Magnitude
-    st.markdown("<div class='section-title'>Magnitude (Richter Scale)</div>", unsafe_allow_html=True)
-    magnitude = st.number_input("", min_value=1.0, max_value=10.0, value=5.8, step=0.1, key="mag")
-    st.progress(min(magnitude/10, 1.0))
-    
-    st.markdown("<br>", unsafe_allow_html=True)
-    
-    # Depth
-    st.markdown("<div class='section-title'>Depth (km)</div>", unsafe_allow_html=True)
-    depth = st.number_input("", min_value=0.1, max_value=700.0, value=10.5, step=0.1, key="dep")
-    st.progress(min(1 - depth/700, 1.0))
-    
-    st.markdown("<br>", unsafe_allow_html=True)
-    
-    # CDI
-    st.markdown("<div class='section-title'>CDI (Community Decimal Intensity)</div>", unsafe_allow_html=True)
-    cdi = st.number_input("", min_value=1.0, max_value=10.0, value=4.2, step=0.1, key="cdi")
-    st.progress(min(cdi/10, 1.0))
-    
-    st.markdown("<br>", unsafe_allow_html=True)
-    
-    # MMI
-    st.markdown("<div class='section-title'>MMI (Modified Mercalli Intensity)</div>", unsafe_allow_html=True)
-    mmi = st.number_input("", min_value=1.0, max_value=12.0, value=6.5, step=0.1, key="mmi")
-    st.progress(min(mmi/12, 1.0))
-    
-    st.markdown("<br>", unsafe_allow_html=True)
-    
-    # Significance
-    st.markdown("<div class='section-title'>Significance Score</div>", unsafe_allow_html=True)
-    sig = st.number_input("", min_value=-1000, max_value=1000, value=450, step=10, key="sig")
-    st.progress(min(abs(sig)/1000, 1.0))
-    
-    st.markdown("</div>", unsafe_allow_html=True)
-    
-    st.markdown("")  # Spacing
-    st.markdown("")  # Spacing
-    
+
+
+def render_contributions(pred):
+    """Exact per-feature attributions for the predicted alert, one delta for the panel."""
+    explanation = pred['explanation']
+    title = "<br><div class='section-title'>Explainable AI - Feature Contributions</div>"
+    if 'error' in explanation:
+        st.markdown(title, unsafe_allow_html=True)
+        st.caption(f"Attributions unavailable: {explanation['error']}")
+        return
+
+    # Percentage points each feature adds to (or takes from) the alert's probability
+    contributions = sorted(explanation['contributions'].items(), key=lambda kv: -abs(kv[1]))
+    scale = max(abs(v) for _, v in contributions) or 1.0
+    rows = "".join(
+        f"""<div class="feature-row">
+            <div class="feature-name">{FEATURE_LABELS[name]}</div>
+            <div class="feature-bar-container">
+                <div class="feature-bar {'feature-increase' if value >= 0 else 'feature-decrease'}" style="width: {abs(value) / scale * 100:.1f}%"></div>
+            </div>
+            <div class="feature-percent">{value * 100:+.1f}%</div>
+        </div>"""
+        for name, value in contributions
+    )
+    base = explanation['base']
+    total = base + sum(v for _, v in contributions)
+    note = (f"Average {pred['alert']} probability {base:.0%}; "
+            f"these inputs move it to {total:.0%}.")
+    st.markdown(
+        f"{title}<div class='feature-wrapper'>{rows}<div class='feature-note'>{note}</div></div>",
+        unsafe_allow_html=True,
+    )
+
+
+def render_confidence(pred, card):
+    """Held-out metrics from the model card next to this prediction's own."""
+    agreement = pred['agreement']
+    rows = []
+    if card is not None:
+        accuracy = card['accuracy']
+        rows.append(("Model Accuracy", f"95% CI {accuracy['ci'][0]:.0%} to {accuracy['ci'][1]:.0%} "
+                     f"on {card['n_test']:,} test events", accuracy['value']))
+        recall = card['per_class'].get(pred['alert'], {}).get('recall')
+        if recall is not None:
+            rows.append((f"{pred['alert'].title()} Alert Recall",
+                         f"share of {pred['alert']} test events caught", recall['value']))
+    rows.append(("Prediction Confidence", "forest probability of this alert", pred['confidence']))
+    if agreement is not None:
+        rows.append(("Tree Agreement", "trees voting for this alert", agreement))
+    if card is not None:
+        observed = model_card.bin_for(card['calibration']['bins'], pred['confidence'])
+        if observed is not None and observed['count']:
+            rows.append(("Accuracy at This Confidence",
+                         f"{observed['count']:,} test events with {observed['lower']:.0%} to "
+                         f"{observed['upper']:.0%} confidence", observed['accuracy']))
+        if card['oob_score'] is not None:
+            rows.append(("Out-of-Bag Accuracy", "rows each tree never trained on", card['oob_score']))
+
+    items = "".join(
+        f"""<div class="confidence-item">
+            <div class="confidence-label">{label}<span class="confidence-detail">{detail}</span></div>
+            <div class="confidence-value">{value:.0%}</div>
+        </div>"""
+        for label, detail, value in rows
+    )
+    st.markdown(
+        "<br><div class='section-title'>Confidence Metrics</div>"
+        f"<div class='confidence-wrapper'>{items}</div>",
+        unsafe_allow_html=True,
+    )
+    if card is None:
+        st.caption("No model card for this model; run train_model.py to add held-out metrics.")
+
+
+def render_parameters(pred):
+    tiles = [(pred['mag'], 'Magnitude'), (f"{pred['dep']:.1f}", 'Depth (km)'),
+             (pred['cdi'], 'CDI'), (pred['mmi'], 'MMI'), (pred['sig'], 'Significance')]
+    cells = "".join(
+        f"""<div class="metric-apple"><div class="metric-value">{value}</div><div class="metric-label">{label}</div></div>"""
+        for value, label in tiles
+    )
+    st.markdown(
+        "<br><div class='section-title'>Parameters</div>"
+        f"<div class='metric-grid'>{cells}</div>",
+        unsafe_allow_html=True,
+    )
+
+
+def render_sensitivity(pred, predictor):
+    """Every feature swept across its widget range in one batched probability call."""
+    st.markdown("<br><div class='section-title'>Sensitivity Analysis</div>", unsafe_allow_html=True)
+    values = {'magnitude': pred['mag'], 'depth': pred['dep'], 'cdi': pred['cdi'],
+              'mmi': pred['mmi'], 'sig': pred['sig']}
+    with TIMER.stage("app.sensitivity.sweep"):
+        sweep = run_sensitivity_sweep(
+            predictor, predictor.model_version,
+            tuple(float(values[f]) for f in predictor.feature_order)
+        )
+    classes = [a for a in predictor.class_alerts if a is not None]
+    columns = [i for i, a in enumerate(predictor.class_alerts) if a is not None]
+    tabs = st.tabs([FEATURE_LABELS[f] for f in predictor.feature_order])
+    for tab, feature in zip(tabs, predictor.feature_order):
+        with tab:
+            curve = sweep[feature]
+            with TIMER.stage("app.sensitivity.frame"):
+                chart = pd.DataFrame(curve['proba'][:, columns], index=curve['values'], columns=classes)
+                chart.index.name = FEATURE_LABELS[feature]
+            st.line_chart(chart, color=[get_alert_info(a)['color'] for a in classes])
+            if curve['transitions']:
+                st.caption(" · ".join(
+                    f"{src} → {dst} at {value:.1f}" for value, src, dst in curve['transitions']
+                ))
+            else:
+                st.caption("Alert level does not change across this range.")
+
+
+@st.fragment
+def prediction_workspace():
+    """Inputs and results. Widget changes rerun only this fragment, so the
+    stylesheet, sidebar and static panels are not re-sent."""
+    fragment_timer = TIMER.start()
+    TIMER.increment("app.fragment_runs")
+    # Picked up per run, so a hot-swapped model serves the next interaction
+    predictor = registry.current()
+    col1, col2 = st.columns([1, 1], gap="large")
+
     # ========================================================================
-    # RECOMMENDED ACTIONS - Moved to left column
+    # LEFT COLUMN - INPUTS
     # ========================================================================
-    
-    if 'last_pred' in st.session_state:
-        pred = st.session_state.last_pred
-        st.markdown("<div class='section-title'>Recommended Actions</div>", unsafe_allow_html=True)
-        for r in pred['recs']:
-            st.markdown(f"""<div class="info-apple">{r}</div>""", unsafe_allow_html=True)
-        
-        st.markdown("")
-        st.markdown("")
-    
+
+    with col1, TIMER.stage("app.render.inputs"):
+        st.markdown("""
+        <div class="apple-card">
+            <div class="card-header">
+                <div class="card-icon">S</div>
+                <div>
+                    <div class="card-title">Seismic Parameters</div>
+                    <div class="card-subtitle">Enter earthquake characteristics</div>
+                </div>
+            </div>
+        </div>
+        <div class='section-title'>Magnitude (Richter Scale)</div>
+        """, unsafe_allow_html=True)
+        magnitude = st.number_input("", min_value=1.0, max_value=10.0, value=5.8, step=0.1, key="mag")
+        st.progress(min(magnitude/10, 1.0))
+
+        st.markdown("<br><div class='section-title'>Depth (km)</div>", unsafe_allow_html=True)
+        depth = st.number_input("", min_value=0.1, max_value=700.0, value=10.5, step=0.1, key="dep")
+        st.progress(min(1 - depth/700, 1.0))
+
+        st.markdown("<br><div class='section-title'>CDI (Community Decimal Intensity)</div>", unsafe_allow_html=True)
+        cdi = st.number_input("", min_value=1.0, max_value=10.0, value=4.2, step=0.1, key="cdi")
+        st.progress(min(cdi/10, 1.0))
+
+        st.markdown("<br><div class='section-title'>MMI (Modified Mercalli Intensity)</div>", unsafe_allow_html=True)
+        mmi = st.number_input("", min_value=1.0, max_value=12.0, value=6.5, step=0.1, key="mmi")
+        st.progress(min(mmi/12, 1.0))
+
+        st.markdown("<br><div class='section-title'>Significance Score</div>", unsafe_allow_html=True)
+        sig = st.number_input("", min_value=-1000, max_value=1000, value=450, step=10, key="sig")
+        st.progress(min(abs(sig)/1000, 1.0))
+
+        # Recommended actions are drawn after the prediction below
+        recs_slot = st.empty()
+
     # ========================================================================
-    # WHY AI-IMPACTSENSE? - Informational Panel
+    # RIGHT COLUMN - PREDICTION
     # ========================================================================
-    
-    with st.container(border=True):
-        st.markdown("### Why AI-ImpactSense?")
-        st.markdown("")
-        
+
+    with col2:
         st.markdown("""
-        - **Problem**: Earthquakes cause sudden and severe damage. Rapid impact assessment is critical for effective response.
-        
-        - **Why AI**: Machine learning enables fast, data-driven estimation using multiple seismic parameters simultaneously.
-        
-        - **Purpose**: Predict impact severity levels from Low to Critical to assist early decision-making.
-        
-        - **Applications**: Disaster response planning, Emergency alert support, Urban safety assessment
-        """)
+        <div class="apple-card">
+            <div class="card-header">
+                <div class="card-icon">P</div>
+                <div>
+                    <div class="card-title">Impact Prediction</div>
+                    <div class="card-subtitle">AI analysis results</div>
+                </div>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+
+        # Emergency Mode Toggle
+        emergency_mode = st.toggle("Emergency Mode", value=False, key="emergency")
+        sensitivity_mode = st.toggle("Sensitivity Mode", value=False, key="sensitivity")
+
+        predict_btn = st.button("Predict Impact", type="primary", use_container_width=True)
+
+        st.markdown("<br>", unsafe_allow_html=True)
+
+        if predict_btn or 'prediction_done' in st.session_state:
+            if predict_btn:
+                st.session_state.prediction_done = True
+
+            with st.spinner("Analyzing..."):
+                inputs = {'magnitude': magnitude, 'depth': depth, 'cdi': cdi, 'mmi': mmi, 'sig': sig}
+                try:
+                    cache = load_prediction_cache(predictor, predictor.model_version)
+                    with TIMER.stage("app.predict"):
+                        result = cache.predict_one(predictor, [inputs[f] for f in predictor.feature_order])
+                    alert = result['alert']
+
+                    with TIMER.stage("app.explain"):
+                        explanation = explain_prediction(
+                            predictor, predictor.model_version,
+                            tuple(float(inputs[f]) for f in predictor.feature_order)
+                        )
+
+                    agreement = tree_agreement(
+                        predictor, predictor.model_version,
+                        tuple(float(inputs[f]) for f in predictor.feature_order)
+                    )
+
+                    st.session_state.last_pred = {
+                        'alert': alert, 'info': result['info'], 'recs': result['recs'],
+                        'confidence': result['confidence'], 'explanation': explanation,
+                        'agreement': agreement,
+                        'mag': magnitude, 'dep': depth, 'cdi': cdi, 'mmi': mmi, 'sig': sig
+                    }
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
+        if 'last_pred' in st.session_state:
+            pred = st.session_state.last_pred
+
+            # Choose card style based on emergency mode
+            card_class = "emergency-card" if emergency_mode else "apple-card"
+
+            with TIMER.stage("app.render.alert"):
+                render_alert(pred)
+            with TIMER.stage("app.render.explain"):
+                render_contributions(pred)
+            with TIMER.stage("app.render.confidence"):
+                render_confidence(pred, load_model_card(registry, predictor.model_version))
+            with TIMER.stage("app.render.parameters"):
+                render_parameters(pred)
+            if sensitivity_mode:
+                render_sensitivity(pred, predictor)
+        else:
+            # Waiting State
+            st.markdown("""
+            <div class="apple-card" style="text-align: center; padding: 3rem;">
+                <div style="color: #456882; margin-bottom: 0.5rem; font-weight: 500;">Ready to Analyze</div>
+                <div style="color: #78909c; font-size: 0.9rem;">Enter parameters and click Predict to get results</div>
+            </div>
+            """, unsafe_allow_html=True)
+
+    # ========================================================================
+    # RECOMMENDED ACTIONS - Moved to left column
+    # ========================================================================
+
+    if 'last_pred' in st.session_state:
+        items = "".join(f"""<div class="info-apple">{r}</div>""" for r in st.session_state.last_pred['recs'])
+        recs_slot.markdown(
+            f"<br><div class='section-title'>Recommended Actions</div>{items}<br>",
+            unsafe_allow_html=True,
+        )
+    TIMER.stop("app.fragment", fragment_timer)
+
+
+prediction_workspace()
 
 # ============================================================================
-# RIGHT COLUMN - PREDICTION
+# ZONE VIEW
 # ============================================================================
 
-with col2:
+@st.fragment
+def zone_view():
+    """Scored events around a location, from the zone index. Reruns alone."""
+    index = current_zone_index()
+    if index is None:
+        return
     st.markdown("""
     <div class="apple-card">
         <div class="card-header">
-            <div class="card-icon">P</div>
+            <div class="card-icon">Z</div>
             <div>
-                <div class="card-title">Impact Prediction</div>
-                <div class="card-subtitle">AI analysis results</div>
+                <div class="card-title">Zone Risk</div>
+                <div class="card-subtitle">Scored earthquakes around a location</div>
             </div>
         </div>
     </div>
     """, unsafe_allow_html=True)
-    
-    # Emergency Mode Toggle
-    emergency_mode = st.toggle("Emergency Mode", value=False, key="emergency")
-    
-    predict_btn = st.button("Predict Impact", type="primary", use_container_width=True)
-    
-    st.markdown("<br>", unsafe_allow_html=True)
-    
-    if predict_btn or 'prediction_done' in st.session_state:
-        if predict_btn:
-            st.session_state.prediction_done = True
-        
-        with st.spinner("Analyzing..."):
-            # Prepare input
-            input_data = np.array([[magnitude, depth, cdi, mmi, sig]])
-            input_df = pd.DataFrame(
-                [[magnitude, depth, cdi, mmi, sig]],
-                columns=feature_order
-            )
-            try:
-                pred = model.predict(input_df)[0]
-                confidence = model.predict_proba(input_df).max()
-                # Model classes: 0=green, 1=orange, 2=red, 3=yellow
-                alert_map = {0: 'green', 1: 'orange', 2: 'red', 3: 'yellow'}
-                if isinstance(pred, (int, np.integer)):
-                    alert = alert_map.get(pred, 'green')
-                elif isinstance(pred, (float, np.floating)):
-                    alert = alert_map.get(int(round(pred)), 'green')
-                else:
-                    alert = str(pred).lower()
-                if alert not in alert_map.values():
-                    # Fallback calculation
-                    risk = magnitude * 0.3 + (100 - depth)/100 * 0.15 + cdi * 0.2 + mmi * 0.25 + sig/1000 * 0.1
-                    if risk < 3.5:
-                        alert = 'green'
-                    elif risk < 5.5:
-                        alert = 'yellow'
-                    elif risk < 7.5:
-                        alert = 'orange'
-                    else:
-                        alert = 'red'
-                
-                info = get_alert_info(alert)
-                recs = get_recommendations(alert)
-                
-                st.session_state.last_pred = {
-                    'alert': alert, 'info': info, 'recs': recs,
-                    'mag': magnitude, 'dep': depth, 'cdi': cdi, 'mmi': mmi, 'sig': sig
-                }
-            except Exception as e:
-                st.error(f"Error: {e}")
-    
-    if 'last_pred' in st.session_state:
-        pred = st.session_state.last_pred
-        info = pred['info']
-        
-        # Choose card style based on emergency mode
-        card_class = "emergency-card" if emergency_mode else "apple-card"
-        
-        # Clean Alert Box
-        st.markdown(f"""
-        <div class="alert-apple {info['bg']}">
-            <div class="alert-title" style="color: {info['color']};">{info['level']}</div>
-            <div class="alert-desc">{info['desc']}</div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Impact Level Timeline
-        st.markdown("<br><div class='section-title'>Impact Level Timeline</div>", unsafe_allow_html=True)
-        alert_order = ['green', 'yellow', 'orange', 'red']
-        alert_positions = {'green': 0, 'yellow': 1, 'orange': 2, 'red': 3}
-        current_pos = alert_positions.get(pred['alert'], 0)
-        
-        timeline_html = f"""
-        <div class="timeline-wrapper">
-            <div class="timeline-container">
-                <div class="timeline-progress" style="width: {current_pos * 33.33}%"></div>
-                <div class="timeline-step {'active-green ' if current_pos == 0 else 'timeline-green'}" style="opacity: {1 if current_pos >= 0 else 0.4}">LOW</div>
-                <div class="timeline-step {'active-yellow ' if current_pos == 1 else 'timeline-yellow'}" style="opacity: {1 if current_pos >= 1 else 0.4}">MODERATE</div>
-                <div class="timeline-step {'active-orange ' if current_pos == 2 else 'timeline-orange'}" style="opacity: {1 if current_pos >= 2 else 0.4}">HIGH</div>
-                <div class="timeline-step {'active-red ' if current_pos == 3 else 'timeline-red'}" style="opacity: {1 if current_pos >= 3 else 0.4}">CRITICAL</div>
-            </div>
-        </div>
-        """
-        st.markdown(timeline_html, unsafe_allow_html=True)
-        
-        # Feature Importance Analysis
-        st.markdown("<br><div class='section-title'>Explainable AI - Feature Contributions</div>", unsafe_allow_html=True)
-        
-        # Calculate feature contributions based on values
-        mag_contrib = min(pred['mag'] / 10 * 100, 100)
-        depth_contrib = max(0, (100 - pred['dep'] / 700 * 100) * 0.5)
-        cdi_contrib = min(pred['cdi'] / 10 * 100, 100)
-        mmi_contrib = min(pred['mmi'] / 12 * 100, 100)
-        sig_contrib = min(abs(pred['sig']) / 1000 * 100, 100)
-        
-        features = [
-            ('Magnitude', mag_contrib, True),
-            ('MMI', mmi_contrib, True),
-            ('CDI', cdi_contrib, True),
-            ('Significance', sig_contrib, True),
-            ('Depth', depth_contrib, False)
-        ]
-        
-        st.markdown(f"""<div class="feature-wrapper">""", unsafe_allow_html=True)
-        for name, contrib, is_increase in features:
-            bar_color = 'feature-increase' if is_increase else 'feature-decrease'
-            st.markdown(f"""
-            <div class="feature-row">
-                <div class="feature-name">{name}</div>
-                <div class="feature-bar-container">
-                    <div class="feature-bar {bar_color}" style="width: {contrib}%"></div>
-                </div>
-                <div class="feature-percent">{contrib:.0f}%</div>
-            </div>
-            """, unsafe_allow_html=True)
-        st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Confidence Breakdown
-        st.markdown("<br><div class='section-title'>Confidence Metrics</div>", unsafe_allow_html=True)
-        st.markdown("""<div class="confidence-wrapper">""", unsafe_allow_html=True)
-        confidence_data = [
-            ("Model Accuracy", 87),
-            ("Parameter Consistency", 82),
-            ("Data Quality", 90)
-        ]
-        for label, value in confidence_data:
-            st.markdown(f"""
-            <div class="confidence-item">
-                <div class="confidence-label">{label}</div>
-                <div class="confidence-value">{value}%</div>
-            </div>
-            """, unsafe_allow_html=True)
-        st.markdown("</div>", unsafe_allow_html=True)
-        
-        # Metrics Grid
-        st.markdown("<br><div class='section-title'>Parameters</div>", unsafe_allow_html=True)
-        
-        m1, m2 = st.columns(2)
-        with m1:
-            st.markdown(f"""<div class="metric-apple"><div class="metric-value">{pred['mag']}</div><div class="metric-label">Magnitude</div></div>""", unsafe_allow_html=True)
-        with m2:
-            st.markdown(f"""<div class="metric-apple"><div class="metric-value">{pred['dep']:.1f}</div><div class="metric-label">Depth (km)</div></div>""", unsafe_allow_html=True)
-        
-        m3, m4 = st.columns(2)
-        with m3:
-            st.markdown(f"""<div class="metric-apple"><div class="metric-value">{pred['cdi']}</div><div class="metric-label">CDI</div></div>""", unsafe_allow_html=True)
-        with m4:
-            st.markdown(f"""<div class="metric-apple"><div class="metric-value">{pred['mmi']}</div><div class="metric-label">MMI</div></div>""", unsafe_allow_html=True)
-        
-        m5, _ = st.columns(2)
-        with m5:
-            st.markdown(f"""<div class="metric-apple"><div class="metric-value">{pred['sig']}</div><div class="metric-label">Significance</div></div>""", unsafe_allow_html=True)
-        
-    else:
-        # Waiting State
+    lat_col, lon_col, radius_col = st.columns(3)
+    latitude = lat_col.number_input("Latitude", min_value=-90.0, max_value=90.0, value=35.7, step=0.5, key="zone_lat")
+    longitude = lon_col.number_input("Longitude", min_value=-180.0, max_value=180.0, value=139.7, step=0.5, key="zone_lon")
+    radius = radius_col.number_input("Radius (km)", min_value=1, max_value=5000, value=250, step=50, key="zone_radius")
+
+    with TIMER.stage("app.zone.query"):
+        zone = index.within_radius(latitude, longitude, radius)
+    highest = zone['max_alert']
+    info = get_alert_info(highest)
+    tiles = [(f"{zone['count']:,}", f"Events within {radius:,} km"),
+             (f"<span style='color: {info['color']};'>{info['level'] if highest else 'NONE'}</span>",
+              "Highest Predicted Alert")]
+    tiles += [(f"{n:,}", f"{alert} alerts") for alert, n in zone['counts'].items()]
+    cells = "".join(
+        f"""<div class="metric-apple"><div class="metric-value">{value}</div><div class="metric-label">{label}</div></div>"""
+        for value, label in tiles
+    )
+    st.markdown(f"<div class='metric-grid'>{cells}</div><br>", unsafe_allow_html=True)
+
+    # Occupied grid cells in the box around the circle, coloured by their highest alert
+    reach = radius / 111.2
+    span = min(reach / max(math.cos(math.radians(latitude)), 0.01), 180.0)
+    with TIMER.stage("app.zone.cells"):
+        grid = index.cells(latitude - reach, longitude - span, latitude + reach, longitude + span)
+    if len(grid['count']):
+        colors = [get_alert_info(ALERT_ORDER[rank])['color'] for rank in grid['max_rank']]
+        st.map(pd.DataFrame({'lat': grid['latitude'], 'lon': grid['longitude'], 'color': colors}),
+               color='color', size=index.cell_deg * 111_200 / 2)
+    st.caption(f"{len(index):,} indexed events on a {index.cell_deg:g} degree grid")
+
+
+zone_view()
+
+# ============================================================================
+# WHY AI-IMPACTSENSE? - Informational Panel
+# ============================================================================
+
+# Outside the fragment, so it is only sent on full runs
+why_col, _ = st.columns([1, 1], gap="large")
+with why_col:
+    with st.container(border=True):
         st.markdown("""
-        <div class="apple-card" style="text-align: center; padding: 3rem;">
-            <div style="color: #456882; margin-bottom: 0.5rem; font-weight: 500;">Ready to Analyze</div>
-            <div style="color: #78909c; font-size: 0.9rem;">Enter parameters and click Predict to get results</div>
-        </div>
-        """, unsafe_allow_html=True)
+        ### Why AI-ImpactSense?
+
+        - **Problem**: Earthquakes cause sudden and severe damage. Rapid impact assessment is critical for effective response.
+
+        - **Why AI**: Machine learning enables fast, data-driven estimation using multiple seismic parameters simultaneously.
+
+        - **Purpose**: Predict impact severity levels from Low to Critical to assist early decision-making.
+
+        - **Applications**: Disaster response planning, Emergency alert support, Urban safety assessment
+        """)
 
 # ============================================================================
 # BALANCED FOOTER
 # ============================================================================
 
+footer_timer = TIMER.start()
 st.markdown("---")
 
 footer_col1, footer_col2 = st.columns(2)
@@ -1243,4 +583,27 @@ with footer_col2:
         This tool assists decision-making, not a replacement for official alerts.
     </div>
     """, unsafe_allow_html=True)
+TIMER.stop("app.render.footer", footer_timer)
+TIMER.stop("app.rerun", rerun_timer)
+
+# ============================================================================
+# DIAGNOSTICS
+# ============================================================================
+
+if TIMER.enabled:
+    cache_stats = load_prediction_cache(predictor, predictor.model_version).stats
+    cache_gauges = {f"cache_{k}": v for k, v in cache_stats.items()}
+    metrics_text = TIMER.to_prometheus(gauges=cache_gauges)
+    # Optional file for a node_exporter textfile collector
+    metrics_file = os.environ.get("AI_IMPACTSENSE_METRICS_FILE")
+    if metrics_file:
+        TIMER.write_textfile(metrics_file, gauges=cache_gauges)
 
+    with st.sidebar:
+        with st.expander("Diagnostics"):
+            stages, counters = TIMER.snapshot()
+            st.caption("Stage timings in this process (ms); percentiles over the last 1,024 calls")
+            st.dataframe(pd.DataFrame(stages).set_index("stage").round(3), use_container_width=True)
+            st.caption(" · ".join(f"{k}: {v:,}" for k, v in {**counters, **cache_stats}.items()))
+            st.download_button("Prometheus metrics", metrics_text,
+                               file_name="impactsense_metrics.prom", mime="text/plain")
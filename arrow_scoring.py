@@ -0,0 +1,356 @@
+"""
+Columnar scoring of Arrow and Parquet data
+==========================================
+
+Scores Arrow record batches without going through pandas. The pandas path
+makes several copies before the forest sees a single row:
+
+* converting a batch to a DataFrame;
+* ``frame[features].to_numpy(float64)``;
+* the predictor's float32 cast;
+* the column reorder.
+
+Here each ``feature_order`` column is taken as a NumPy view of its Arrow
+buffer, which copies nothing for numeric columns without nulls. All columns
+are then written once into the row-major float32 matrix the forest kernel
+walks, preallocated and reused from batch to batch. That one gather is the
+only copy: Arrow keeps each column in its own buffer, while the kernel
+reads whole rows.
+
+Predictions go back as Arrow columns: ``alert``, ``confidence``,
+``prob_<alert>`` and with ``explain`` ``contrib_*``. They are appended to
+the kept input columns, which are passed through without copying. Column
+names match ``score_catalog.py``.
+
+Parquet is read row group by row group from a memory map and Arrow IPC
+(``.arrow``/``.feather``) files are memory-mapped, so their buffers are pages
+of the file. ``score_catalog.py`` uses this path for Parquet and Arrow inputs
+and outputs.
+
+Usage:
+    python arrow_scoring.py events.parquet scored.parquet --keep id latitude longitude
+    python arrow_scoring.py events.arrow scored.arrow --batch-size 262144
+    python arrow_scoring.py compare events.parquet     # time and peak memory against pandas
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from score_catalog import (DEFAULT_CHUNK_SIZE, MAX_CHUNKS_IN_FLIGHT, _is_parquet,
+                           _require_pyarrow, check_keep_columns)
+
+ARROW_SUFFIXES = ('.arrow', '.feather', '.ipc')
+
+
+def is_arrow_file(path):
+    return os.path.splitext(path)[1].lower() in ARROW_SUFFIXES
+
+
+def is_columnar(path):
+    """Whether ``path`` is a Parquet or Arrow IPC file."""
+    return _is_parquet(path) or is_arrow_file(path)
+
+
+# ============================================================================
+# BATCHES <-> MATRICES
+# ============================================================================
+
+def column_view(column):
+    """A 1-D NumPy array over an Arrow column.
+
+    Numeric columns without nulls in one chunk are views of the Arrow buffer.
+    Nulls become NaN, which the forest routes like sklearn does; that, and
+    combining several chunks, costs a copy.
+    """
+    import pyarrow as pa
+
+    if isinstance(column, pa.ChunkedArray):
+        column = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+    if column.null_count == 0 and (pa.types.is_floating(column.type) or pa.types.is_integer(column.type)):
+        return column.to_numpy(zero_copy_only=True)
+    if pa.types.is_integer(column.type):
+        column = column.cast(pa.float64())
+    return column.to_numpy(zero_copy_only=False)
+
+
+def feature_matrix(batch, feature_order, out=None):
+    """``feature_order`` columns of a RecordBatch or Table as a C-contiguous
+    float32 matrix, the layout the forest reads. Fills ``out`` (at least as
+    many rows) instead of allocating when given."""
+    missing = [f for f in feature_order if f not in batch.schema.names]
+    if missing:
+        raise KeyError(f"Input is missing columns: {missing}")
+    n = batch.num_rows
+    X = np.empty((n, len(feature_order)), dtype=np.float32) if out is None else out[:n]
+    for j, feature in enumerate(feature_order):
+        X[:, j] = column_view(batch.column(feature))
+    return X
+
+
+def prediction_columns(predictor, alerts, confidence, proba, explanation=None):
+    """``(names, arrays)`` of Arrow score columns, named like ``score_catalog.output_frame``."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    names, arrays = ['alert', 'confidence'], []
+    if all(a is not None for a in predictor.class_alerts):
+        # Gather from the class names in Arrow, without one Python str per row
+        arrays.append(pc.take(pa.array(predictor.class_alerts), pa.array(np.argmax(proba, axis=1))))
+    else:
+        arrays.append(pa.array(alerts.astype(str)))
+    arrays.append(pa.array(confidence))
+    # One transpose so every probability column is a contiguous view
+    by_class = np.ascontiguousarray(proba.T)
+    for i, name in enumerate(predictor.class_alerts):
+        names.append(f"prob_{name if name is not None else predictor.engine.classes_[i]}")
+        arrays.append(pa.array(by_class[i]))
+    if explanation is not None:
+        contributions, base = explanation
+        names.append('contrib_base')
+        arrays.append(pa.array(base))
+        by_feature = np.ascontiguousarray(contributions.T)
+        for i, feature in enumerate(predictor.feature_order):
+            names.append(f'contrib_{feature}')
+            arrays.append(pa.array(by_feature[i]))
+    return names, arrays
+
+
+def append_predictions(batch, names, arrays):
+    """``batch`` with the score columns appended; existing columns are shared."""
+    import pyarrow as pa
+
+    return pa.RecordBatch.from_arrays(list(batch.columns) + list(arrays),
+                                      names=list(batch.schema.names) + list(names))
+
+
+def score_batch(predictor, batch, keep_columns=(), explain=False, out=None):
+    """Score one record batch; returns the kept columns plus score columns."""
+    X = feature_matrix(batch, predictor.feature_order, out)
+    alerts, confidence, proba = predictor.predict_batch(X)
+    explanation = predictor.explain_batch(X) if explain else None
+    return append_predictions(batch.select(list(keep_columns)),
+                              *prediction_columns(predictor, alerts, confidence, proba, explanation))
+
+
+# ============================================================================
+# FILES
+# ============================================================================
+
+def iter_record_batches(path, columns, batch_size=DEFAULT_CHUNK_SIZE):
+    """Record batches of at most ``batch_size`` rows holding ``columns``.
+
+    Parquet is decoded row group by row group; Arrow IPC files are memory-mapped
+    and sliced without copying; CSV is parsed by Arrow's streaming reader.
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        source = pq.ParquetFile(path, memory_map=True)
+        batches = source.iter_batches(batch_size=batch_size, columns=columns)
+    elif is_arrow_file(path):
+        import pyarrow.ipc as ipc
+
+        source = pa.memory_map(path)
+        try:
+            reader = ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            source.seek(0)
+            batches = ipc.open_stream(source)
+    else:
+        import pyarrow.csv as pa_csv
+
+        source = pa_csv.open_csv(path, convert_options=pa_csv.ConvertOptions(include_columns=columns))
+        batches = source
+    # Batches already handed out keep their mapping alive after close
+    try:
+        for batch in batches:
+            batch = batch.select(columns)
+            for start in range(0, batch.num_rows, batch_size):
+                yield batch.slice(start, batch_size)
+    finally:
+        source.close()
+
+
+class BatchWriter:
+    """Append record batches to a Parquet, Arrow IPC or CSV file."""
+
+    def __init__(self, path):
+        _require_pyarrow()
+        self.path = path
+        self._writer = None
+
+    def write(self, batch):
+        if self._writer is None:
+            if _is_parquet(self.path):
+                import pyarrow.parquet as pq
+
+                self._writer = pq.ParquetWriter(self.path, batch.schema)
+            elif is_arrow_file(self.path):
+                import pyarrow.ipc as ipc
+
+                self._writer = ipc.new_file(self.path, batch.schema)
+            else:
+                import pyarrow.csv as pa_csv
+
+                self._writer = pa_csv.CSVWriter(self.path, batch.schema)
+        self._writer.write_batch(batch)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def score_arrow_file(predictor, input_path, output_path, batch_size=DEFAULT_CHUNK_SIZE,
+                     keep_columns=(), explain=False, log=sys.stderr):
+    """Score ``input_path`` into ``output_path`` batch by batch; returns ``(rows, seconds)``.
+
+    Takes an ``ImpactPredictor`` or a ``ParallelScorer``; with the latter the
+    next batch is read while the pool scores the current ones.
+    """
+    keep_columns = check_keep_columns(predictor, keep_columns)
+    columns = list(predictor.feature_order) + list(keep_columns)
+    writer = BatchWriter(output_path)
+    rows = 0
+    start = time.perf_counter()
+    parallel = hasattr(predictor, 'submit')
+    # One matrix reused by every batch; pool batches need their own since
+    # they are pickled after submit returns
+    buffer = None if parallel else np.empty((batch_size, len(predictor.feature_order)), np.float32)
+    pending = deque()
+
+    def write(batch):
+        nonlocal rows
+        writer.write(batch)
+        rows += batch.num_rows
+        elapsed = time.perf_counter() - start
+        if log is not None:
+            print(f"{rows:,} rows scored ({rows / max(elapsed, 1e-9):,.0f} rows/s)", file=log)
+
+    def write_oldest():
+        kept, batch = pending.popleft()
+        alerts, confidence, proba, explanation = batch.result()
+        write(append_predictions(kept, *prediction_columns(predictor, alerts, confidence, proba,
+                                                           explanation)))
+
+    try:
+        for batch in iter_record_batches(input_path, columns, batch_size):
+            if not parallel:
+                write(score_batch(predictor, batch, keep_columns, explain, buffer))
+                continue
+            X = feature_matrix(batch, predictor.feature_order)
+            pending.append((batch.select(keep_columns), predictor.submit(X, explain)))
+            if len(pending) >= MAX_CHUNKS_IN_FLIGHT:
+                write_oldest()
+        while pending:
+            write_oldest()
+    finally:
+        writer.close()
+    return rows, time.perf_counter() - start
+
+
+# ============================================================================
+# COMPARISON WITH THE PANDAS PATH
+# ============================================================================
+
+def _measure(io, input_path, output_path, model_dir, batch_size):
+    """Score one file in this (fresh) process; time, matrix time and peak RSS."""
+    from benchmark import _peak_rss_bytes
+    from predictor import ImpactPredictor
+    from score_catalog import iter_chunks, score_catalog
+
+    predictor = ImpactPredictor.load(model_dir)
+    # Time to get every batch into the form predict_proba takes, without scoring
+    start = time.perf_counter()
+    if io == 'arrow':
+        out = np.empty((batch_size, len(predictor.feature_order)), np.float32)
+        for batch in iter_record_batches(input_path, predictor.feature_order, batch_size):
+            feature_matrix(batch, predictor.feature_order, out)
+    else:
+        for chunk in iter_chunks(input_path, predictor.feature_order, batch_size):
+            np.ascontiguousarray(chunk[predictor.feature_order].to_numpy(dtype=np.float64), dtype=np.float32)
+    prepare = time.perf_counter() - start
+    rows, seconds = score_catalog(predictor, input_path, output_path, batch_size, io=io, log=None)
+    return {'rows': rows, 'seconds': seconds, 'prepare_seconds': prepare,
+            'peak_rss_bytes': _peak_rss_bytes()}
+
+
+def compare(input_path, model_dir=None, batch_size=DEFAULT_CHUNK_SIZE, workdir=None, log=print):
+    """Score ``input_path`` through pandas and through Arrow, each in a fresh
+    process, check the outputs agree and report time and peak memory."""
+    import pyarrow.parquet as pq
+
+    workdir = workdir or os.path.dirname(os.path.abspath(input_path))
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for io in ('pandas', 'arrow'):
+        output_path = os.path.join(workdir, f"compare_{io}.parquet")
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            results[io] = pool.submit(_measure, io, input_path, output_path, model_dir, batch_size).result()
+        results[io]['output'] = output_path
+
+    expected = pq.read_table(results['pandas']['output'])
+    got = pq.read_table(results['arrow']['output'])
+    same = expected.column_names == got.column_names and all(
+        np.array_equal(expected.column(c).to_numpy(), got.column(c).to_numpy())
+        for c in expected.column_names
+    )
+    for io in results:
+        os.remove(results[io].pop('output'))
+
+    log(f"{'path':>8}{'prepare s':>12}{'score s':>10}{'rows/s':>12}{'peak RSS MB':>14}")
+    for io, r in results.items():
+        rss = r['peak_rss_bytes'] / 1e6 if r['peak_rss_bytes'] else float('nan')
+        log(f"{io:>8}{r['prepare_seconds']:>12.2f}{r['seconds']:>10.2f}"
+            f"{r['rows'] / r['seconds']:>12,.0f}{rss:>14,.0f}")
+    log("Outputs identical" if same else "Outputs DIFFER")
+    results['identical'] = same
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['compare']:
+        parser = argparse.ArgumentParser(description="Compare Arrow and pandas scoring on one file.")
+        parser.add_argument('input', help="Parquet or Arrow catalog with the feature_order columns")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--model-dir', default=None)
+        args = parser.parse_args(argv[1:])
+        _require_pyarrow()
+        compare(args.input, args.model_dir, args.batch_size)
+        return
+
+    parser = argparse.ArgumentParser(description="Score a Parquet/Arrow catalog without pandas.")
+    parser.add_argument('input', help="Parquet, Arrow IPC or CSV catalog with the feature_order columns")
+    parser.add_argument('output', help="Parquet, Arrow IPC or CSV file to write scores to")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"rows per record batch (default {DEFAULT_CHUNK_SIZE:,})")
+    parser.add_argument('--model-dir', default=None,
+                        help="directory holding earthquake_impact_rf.pkl and feature_order.pkl")
+    parser.add_argument('--keep', nargs='*', default=[],
+                        help="input columns to copy through to the output, e.g. an event id")
+    parser.add_argument('--explain', action='store_true',
+                        help="add exact per-feature attributions of the winning class")
+    args = parser.parse_args(argv)
+
+    from predictor import ImpactPredictor
+
+    rows, seconds = score_arrow_file(ImpactPredictor.load(args.model_dir), args.input, args.output,
+                                     args.batch_size, args.keep, args.explain)
+    print(f"Scored {rows:,} rows in {seconds:.2f}s "
+          f"({rows / max(seconds, 1e-9):,.0f} rows/s) -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
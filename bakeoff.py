@@ -0,0 +1,341 @@
+"""
+Model family bakeoff
+====================
+
+Trains the model families from the exploration notebook on the same
+training data and held-out split as ``train_model.py`` and compares them on
+what matters for serving, not accuracy alone:
+
+* held-out weighted F1 and accuracy,
+* single-row ``predict_proba`` p50 / p99 latency,
+* batch throughput,
+* artifact size on disk, library import time and load time.
+
+The training and test matrices are written once as ``.npy`` files and
+memory-mapped read-only by every worker process, so candidates train in
+parallel without each worker holding its own copy. Latency is then measured
+one candidate at a time, each in a fresh process, so the numbers are not
+skewed by the other fits or by each other's caches. The random forest is
+measured twice: as the sklearn pickle and as the flattened ``.forest``
+artifact the app serves.
+
+The report marks the Pareto front of F1 against p99 latency and, given
+``--budget-ms``, the most accurate model that fits the budget.
+
+Usage:
+    python bakeoff.py
+    python bakeoff.py --synthetic-rows 200000 --budget-ms 2 --workers 4
+    python bakeoff.py --candidates decision_tree random_forest hist_gradient_boosting
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+
+from dataset_store import DatasetError, load_training_frame, prepare_training_data, split_training_data
+from predictor import default_model_dir
+
+BAKEOFF_DIR = "bakeoff"
+REPORT_FILE = "bakeoff_report.json"
+DEFAULT_REPEATS = 200
+DEFAULT_BATCH_ROWS = 10_000
+LATENCY_METRIC = "predict_proba_p99_ms"
+
+CANDIDATES = ("logistic_regression", "decision_tree", "random_forest", "gradient_boosting",
+              "hist_gradient_boosting", "xgboost")
+
+
+class CandidateUnavailable(Exception):
+    """Raised when a candidate's library is not installed."""
+
+
+def make_candidate(name, random_state=42):
+    """Unfitted estimator for ``name``; settings follow the notebook."""
+    if name == "logistic_regression":
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+
+        # Scaled so the solver converges on the raw magnitudes of sig and depth
+        return make_pipeline(StandardScaler(), LogisticRegression(max_iter=300))
+    if name == "decision_tree":
+        from sklearn.tree import DecisionTreeClassifier
+
+        return DecisionTreeClassifier(random_state=random_state)
+    if name == "random_forest":
+        from sklearn.ensemble import RandomForestClassifier
+
+        return RandomForestClassifier(n_estimators=200, random_state=random_state)
+    if name == "gradient_boosting":
+        from sklearn.ensemble import GradientBoostingClassifier
+
+        return GradientBoostingClassifier(random_state=random_state)
+    if name == "hist_gradient_boosting":
+        from sklearn.ensemble import HistGradientBoostingClassifier
+
+        return HistGradientBoostingClassifier(random_state=random_state)
+    if name == "xgboost":
+        try:
+            from xgboost import XGBClassifier
+        except ImportError:
+            raise CandidateUnavailable("xgboost is not installed: pip install xgboost") from None
+        return XGBClassifier(n_estimators=500, max_depth=6, learning_rate=0.05, subsample=0.8,
+                             colsample_bytree=0.8, gamma=0.1, min_child_weight=3,
+                             eval_metric="mlogloss", random_state=random_state, n_jobs=1)
+    raise ValueError(f"Unknown candidate {name!r}; choose from {CANDIDATES}")
+
+
+# ============================================================================
+# SHARED DATA
+# ============================================================================
+
+def share_matrices(data_dir, **arrays):
+    """Write each array as ``<name>.npy`` in ``data_dir`` for workers to map."""
+    os.makedirs(data_dir, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(data_dir, f"{name}.npy"), np.ascontiguousarray(array))
+
+
+def open_matrix(data_dir, name):
+    return np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r")
+
+
+# ============================================================================
+# WORKERS
+# ============================================================================
+
+def fit_candidate(name, data_dir, out_dir, random_state=42):
+    """Fit one candidate on the shared matrices; save it and score the test set."""
+    from sklearn.metrics import accuracy_score, f1_score
+
+    try:
+        model = make_candidate(name, random_state)
+    except CandidateUnavailable as e:
+        return {"name": name, "skipped": str(e)}
+    X_train, y_train = open_matrix(data_dir, "X_train"), open_matrix(data_dir, "y_train")
+    X_test, y_test = open_matrix(data_dir, "X_test"), open_matrix(data_dir, "y_test")
+
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_s = time.perf_counter() - start
+    y_pred = model.predict(X_test)
+    result = {
+        "name": name,
+        "fit_s": fit_s,
+        "f1_weighted": float(f1_score(y_test, y_pred, average="weighted")),
+        "accuracy": float(accuracy_score(y_test, y_pred)),
+        "artifacts": {name: os.path.join(out_dir, f"{name}.pkl")},
+    }
+    joblib.dump(model, result["artifacts"][name])
+    if name == "random_forest":
+        from forest_artifact import save_forest
+        from forest_engine import FlatForest
+
+        path = os.path.join(out_dir, f"{name}.forest")
+        save_forest(FlatForest.from_model(model), path, source=result["artifacts"][name])
+        result["artifacts"][f"{name}.forest"] = path
+    return result
+
+
+def _percentiles(times):
+    ms = np.asarray(times) * 1000
+    return float(np.percentile(ms, 50)), float(np.percentile(ms, 99))
+
+
+def measure_artifact(path, data_dir, repeats=DEFAULT_REPEATS, batch_rows=DEFAULT_BATCH_ROWS,
+                     family=None):
+    """Import time, load time, latency and throughput of one saved model.
+
+    The library a model needs is imported before the load is timed and
+    reported as ``import_s``, so ``load_s`` covers reading the file only.
+    """
+    start = time.perf_counter()
+    if path.endswith(".forest"):
+        from forest_artifact import load_forest
+    elif family is not None:
+        # Building the unfitted estimator imports the modules the pickle needs
+        make_candidate(family)
+    metrics = {"import_s": time.perf_counter() - start}
+
+    start = time.perf_counter()
+    if path.endswith(".forest"):
+        predict_proba = load_forest(path).predict_proba
+    else:
+        predict_proba = joblib.load(path).predict_proba
+    metrics["load_s"] = time.perf_counter() - start
+    metrics["file_bytes"] = os.path.getsize(path)
+
+    X_test = np.asarray(open_matrix(data_dir, "X_test"))
+    rows = [X_test[i % len(X_test)].reshape(1, -1) for i in range(repeats)]
+    start = time.perf_counter()
+    predict_proba(rows[0])
+    metrics["warmup_ms"] = (time.perf_counter() - start) * 1000
+    times = []
+    for row in rows:
+        start = time.perf_counter()
+        predict_proba(row)
+        times.append(time.perf_counter() - start)
+    metrics["predict_proba_p50_ms"], metrics["predict_proba_p99_ms"] = _percentiles(times)
+
+    batch = X_test[np.arange(batch_rows) % len(X_test)]
+    calls, elapsed = 0, 0.0
+    while elapsed < 0.5 or calls < 2:
+        start = time.perf_counter()
+        predict_proba(batch)
+        elapsed += time.perf_counter() - start
+        calls += 1
+    metrics["throughput_rows_per_s"] = batch_rows * calls / elapsed
+    return metrics
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def pareto_front(rows, latency=LATENCY_METRIC):
+    """Names of the rows no other row beats on both F1 and ``latency``."""
+    front = []
+    for row in rows:
+        dominated = any(
+            other["f1_weighted"] >= row["f1_weighted"] and other[latency] <= row[latency]
+            and (other["f1_weighted"] > row["f1_weighted"] or other[latency] < row[latency])
+            for other in rows
+        )
+        if not dominated:
+            front.append(row["name"])
+    return front
+
+
+def recommend(rows, budget_ms, latency=LATENCY_METRIC):
+    """Most accurate row within ``budget_ms``, fastest first on ties; None if none fits."""
+    fitting = [row for row in rows if row[latency] <= budget_ms]
+    if not fitting:
+        return None
+    return max(fitting, key=lambda row: (row["f1_weighted"], -row[latency]))["name"]
+
+
+def run_bakeoff(X_train, y_train, X_test, y_test, out_dir, candidates=CANDIDATES, workers=None,
+                repeats=DEFAULT_REPEATS, batch_rows=DEFAULT_BATCH_ROWS, random_state=42, log=print):
+    """Fit every candidate in parallel, then measure each; returns the report dict."""
+    data_dir = os.path.join(out_dir, "data")
+    share_matrices(data_dir, X_train=np.asarray(X_train, dtype=np.float32),
+                   y_train=np.asarray(y_train), X_test=np.asarray(X_test, dtype=np.float32),
+                   y_test=np.asarray(y_test))
+
+    # Spawned workers are not daemonic, so estimators may still use joblib inside
+    context = multiprocessing.get_context("spawn")
+    workers = min(workers or os.cpu_count() or 1, len(candidates))
+    log(f"Training {len(candidates)} candidates on {len(X_train):,} rows with {workers} worker(s)...")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        fitted = list(pool.map(fit_candidate, candidates, [data_dir] * len(candidates),
+                               [out_dir] * len(candidates), [random_state] * len(candidates)))
+    train_wall_s = time.perf_counter() - start
+
+    rows, skipped = [], {}
+    try:
+        for result in fitted:
+            if "skipped" in result:
+                skipped[result["name"]] = result["skipped"]
+                log(f"Skipping {result['name']}: {result['skipped']}")
+                continue
+            for name, path in result["artifacts"].items():
+                log(f"Measuring {name}...")
+                with ProcessPoolExecutor(1, mp_context=context) as pool:
+                    metrics = pool.submit(measure_artifact, path, data_dir, repeats,
+                                          batch_rows, result["name"]).result()
+                rows.append({"name": name, "family": result["name"], "fit_s": result["fit_s"],
+                             "f1_weighted": result["f1_weighted"], "accuracy": result["accuracy"],
+                             "path": path, **metrics})
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    rows.sort(key=lambda row: row[LATENCY_METRIC])
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "n_train": int(len(X_train)),
+        "n_test": int(len(X_test)),
+        "workers": workers,
+        "train_wall_s": train_wall_s,
+        "train_serial_s": sum(row["fit_s"] for row in fitted if "fit_s" in row),
+        "latency_metric": LATENCY_METRIC,
+        "candidates": rows,
+        "pareto_front": pareto_front(rows),
+        "skipped": skipped,
+    }
+
+
+def print_report(report, budget_ms=None):
+    front = set(report["pareto_front"])
+    print(f"\n{'model':<26}{'F1':>8}{'p50 ms':>9}{'p99 ms':>9}{'rows/s':>12}"
+          f"{'size MB':>9}{'import s':>10}{'load s':>8}  pareto")
+    for row in report["candidates"]:
+        print(f"{row['name']:<26}{row['f1_weighted']:>8.4f}{row['predict_proba_p50_ms']:>9.3f}"
+              f"{row['predict_proba_p99_ms']:>9.3f}{row['throughput_rows_per_s']:>12,.0f}"
+              f"{row['file_bytes'] / 1e6:>9.2f}{row['import_s']:>10.3f}{row['load_s']:>8.3f}  "
+              f"{'*' if row['name'] in front else ''}")
+    print(f"\nTrained in {report['train_wall_s']:.1f}s wall time "
+          f"({report['train_serial_s']:.1f}s of fitting across {report['workers']} worker(s))")
+    if budget_ms is not None:
+        choice = report.get("recommended")
+        if choice is None:
+            print(f"No candidate meets a p99 budget of {budget_ms} ms")
+        else:
+            print(f"Ship under a {budget_ms} ms p99 budget: {choice}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare model families on F1 and serving cost.")
+    parser.add_argument("--candidates", nargs="+", choices=CANDIDATES, default=list(CANDIDATES))
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="single-row p99 latency budget to recommend a model for")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parallel training processes (default: one per core)")
+    parser.add_argument("--out-dir", default=None,
+                        help=f"artifacts and report (default: {BAKEOFF_DIR}/ next to this script)")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS,
+                        help="single-row calls per latency percentile")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS,
+                        help="rows per throughput batch")
+    parser.add_argument("--synthetic-rows", type=int, default=0,
+                        help="use this many generated events instead of the dataset")
+    parser.add_argument("--dataset", action="append", default=None,
+                        help="CSV URL or path to train on (repeatable; default: the project sources)")
+    parser.add_argument("--data-dir", default=None,
+                        help="local dataset cache directory (default: data_cache/)")
+    parser.add_argument("--offline", action="store_true",
+                        help="never download; fail if the dataset is not cached")
+    args = parser.parse_args(argv)
+
+    try:
+        df = load_training_frame(args.synthetic_rows, args.dataset, args.data_dir,
+                                 offline=args.offline)
+    except DatasetError as e:
+        raise SystemExit(f"Training data unavailable: {e}")
+    X, y, _ = prepare_training_data(df)
+    X_train, X_test, y_train, y_test = split_training_data(X, y)
+
+    out_dir = args.out_dir or os.path.join(default_model_dir(), BAKEOFF_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    report = run_bakeoff(X_train, y_train, X_test, y_test, out_dir, args.candidates,
+                         args.workers, args.repeats, args.batch_rows)
+    if args.budget_ms is not None:
+        report["budget_ms"] = args.budget_ms
+        report["recommended"] = recommend(report["candidates"], args.budget_ms)
+    print_report(report, args.budget_ms)
+
+    path = os.path.join(out_dir, REPORT_FILE)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to: {path}")
+
+
+if __name__ == "__main__":
+    main()
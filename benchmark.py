@@ -0,0 +1,275 @@
+"""
+Inference benchmark suite
+=========================
+
+Measures the production model files the way the app and scoring jobs use
+them and appends the results to a JSON Lines history file:
+
+* load time (``joblib.load`` of the pickle, ``ImpactPredictor.load`` of the
+  memory-mapped artifact) and first-call warm-up,
+* single-row ``predict`` / ``predict_proba`` p50 and p99 latency,
+* batch throughput from 1 to 1,000,000 rows,
+* peak RSS of the process and size of the file on disk.
+
+Each target runs in a fresh process so load times and RSS are not polluted
+by the other. Every metric is compared with the median of recent runs on the
+same host; the run fails (exit status 1) when one regresses past the
+threshold, so a retrain cannot quietly double latency. Failing runs are kept
+in the history but left out of the baseline unless ``--accept`` marks the new
+numbers as expected.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --targets artifact --max-rows 100000 --threshold 0.2
+    python benchmark.py --accept        # a slowdown is intended: make it the new baseline
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from predictor import FEATURE_FILE, MODEL_FILE, default_model_dir
+
+HISTORY_FILE = "benchmark_history.jsonl"
+BATCH_SIZES = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_REPEATS = 200
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_BASELINE_RUNS = 5
+TARGETS = ("pickle", "artifact")
+
+# Changes smaller than this never count as a regression, whatever the ratio;
+# keyed by metric-name suffix
+NOISE_FLOOR = {"_ms": 0.05, "_s": 0.01, "_bytes": 1 << 20}
+
+
+# ============================================================================
+# MEASUREMENT (runs in a child process per target)
+# ============================================================================
+
+def sample_rows(n, feature_order, seed=0):
+    """``n`` rows drawn uniformly over the app's input ranges."""
+    from sensitivity import FEATURE_RANGES
+
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(*FEATURE_RANGES[f], n) for f in feature_order])
+
+
+def _percentiles(times):
+    ms = np.asarray(times) * 1000
+    return float(np.percentile(ms, 50)), float(np.percentile(ms, 99))
+
+
+def _peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def _open_target(target, model_dir, artifact):
+    """Load ``target``; returns (path, load seconds, predict, predict_proba, wrap)."""
+    import joblib
+
+    feature_order = joblib.load(os.path.join(model_dir, FEATURE_FILE))
+    if target == "pickle":
+        import pandas as pd
+
+        path = os.path.join(model_dir, MODEL_FILE)
+        start = time.perf_counter()
+        model = joblib.load(path)
+        load_s = time.perf_counter() - start
+        columns = list(getattr(model, "feature_names_in_", feature_order))
+        order = [feature_order.index(c) for c in columns]
+
+        def wrap(X):
+            return pd.DataFrame(X[:, order], columns=columns)
+
+        return path, load_s, model.predict, model.predict_proba, wrap, feature_order
+
+    from forest_artifact import ARTIFACT_FILE
+    from predictor import ImpactPredictor
+
+    path = os.path.join(model_dir, artifact or ARTIFACT_FILE)
+    start = time.perf_counter()
+    predictor = ImpactPredictor.load(model_dir, artifact=artifact or ARTIFACT_FILE)
+    load_s = time.perf_counter() - start
+    return (path, load_s, predictor.predict_batch, predictor.predict_proba,
+            lambda X: X, feature_order)
+
+
+def measure_target(target, model_dir, artifact=None, sizes=BATCH_SIZES,
+                   repeats=DEFAULT_REPEATS, seed=0):
+    """All metrics for one target as a flat ``{name: value}`` dict."""
+    path, load_s, predict, predict_proba, wrap, feature_order = _open_target(
+        target, model_dir, artifact
+    )
+    metrics = {"load_s": load_s, "file_bytes": os.path.getsize(path)}
+
+    X = sample_rows(max(max(sizes), repeats), feature_order, seed)
+    rows = [wrap(X[i:i + 1]) for i in range(repeats)]
+    start = time.perf_counter()
+    predict_proba(rows[0])
+    metrics["warmup_ms"] = (time.perf_counter() - start) * 1000
+
+    for name, fn in (("predict", predict), ("predict_proba", predict_proba)):
+        times = []
+        for row in rows:
+            start = time.perf_counter()
+            fn(row)
+            times.append(time.perf_counter() - start)
+        metrics[f"{name}_p50_ms"], metrics[f"{name}_p99_ms"] = _percentiles(times)
+
+    for size in sizes:
+        batch = wrap(X[:size])
+        # Repeat small batches until the timing is long enough to trust
+        calls, elapsed = 0, 0.0
+        while elapsed < 0.2 or calls < 3:
+            start = time.perf_counter()
+            predict_proba(batch)
+            elapsed += time.perf_counter() - start
+            calls += 1
+            if size >= 100_000:
+                break
+        metrics[f"throughput_{size}_rows_per_s"] = size * calls / elapsed
+
+    metrics["peak_rss_bytes"] = _peak_rss_bytes()
+    return metrics
+
+
+def run_suite(model_dir, targets=TARGETS, artifact=None, sizes=BATCH_SIZES,
+              repeats=DEFAULT_REPEATS, log=print):
+    """Measure every target in its own fresh process; returns ``{metric: value}``."""
+    # Executor workers are not daemonic, so sklearn keeps its own n_jobs pool
+    context = multiprocessing.get_context("spawn")
+    metrics = {}
+    for target in targets:
+        log(f"Benchmarking {target}...")
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            result = pool.submit(measure_target, target, model_dir, artifact, sizes, repeats).result()
+        metrics.update({f"{target}.{k}": v for k, v in result.items() if v is not None})
+    return metrics
+
+
+# ============================================================================
+# HISTORY AND REGRESSION GATES
+# ============================================================================
+
+def higher_is_better(metric):
+    return "rows_per_s" in metric
+
+
+def read_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def baseline(history, host, artifact=None, runs=DEFAULT_BASELINE_RUNS):
+    """Median of each metric over the last ``runs`` entries from ``host``
+    that benchmarked the same ``artifact`` file. Runs that regressed count only
+    once accepted, so repeated failures cannot drag the baseline along."""
+    recent = [entry["metrics"] for entry in history
+              if entry.get("host") == host and entry.get("artifact") == artifact
+              and (not entry.get("regressions") or entry.get("accepted"))][-runs:]
+    names = {name for metrics in recent for name in metrics}
+    return {name: float(np.median([m[name] for m in recent if name in m])) for name in names}
+
+
+def find_regressions(metrics, reference, threshold=DEFAULT_THRESHOLD):
+    """``[(metric, baseline, value, relative change)]`` past ``threshold``."""
+    regressions = []
+    for name, value in sorted(metrics.items()):
+        base = reference.get(name)
+        if not base:
+            continue
+        if higher_is_better(name):
+            change = (base - value) / base
+        else:
+            change = (value - base) / base
+            floor = next((f for suffix, f in NOISE_FLOOR.items() if name.endswith(suffix)), 0)
+            if value - base <= floor:
+                continue
+        if change > threshold:
+            regressions.append((name, base, value, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark model loading and inference.")
+    parser.add_argument("--model-dir", default=None,
+                        help="directory holding the model files (default: next to this script)")
+    parser.add_argument("--artifact", default=None,
+                        help="artifact file to benchmark instead of earthquake_impact_rf.forest")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--max-rows", type=int, default=max(BATCH_SIZES),
+                        help="largest batch size to measure")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS,
+                        help="single-row calls per latency percentile")
+    parser.add_argument("--history", default=None,
+                        help=f"JSON Lines history file (default: {HISTORY_FILE} in the model dir)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative change that counts as a regression")
+    parser.add_argument("--baseline-runs", type=int, default=DEFAULT_BASELINE_RUNS,
+                        help="recent runs on this host the baseline is the median of")
+    parser.add_argument("--no-record", action="store_true",
+                        help="compare against history without appending this run")
+    parser.add_argument("--accept", action="store_true",
+                        help="record regressions as expected so this run joins the baseline")
+    args = parser.parse_args(argv)
+
+    model_dir = args.model_dir or default_model_dir()
+    history_path = args.history or os.path.join(model_dir, HISTORY_FILE)
+    sizes = tuple(s for s in BATCH_SIZES if s <= args.max_rows)
+    metrics = run_suite(model_dir, args.targets, args.artifact, sizes, args.repeats)
+
+    from predictor import ImpactPredictor
+
+    history = read_history(history_path)
+    host = platform.node()
+    regressions = find_regressions(metrics, baseline(history, host, args.artifact, args.baseline_runs),
+                                   args.threshold)
+
+    print(f"\n{'metric':<48}{'value':>16}")
+    for name, value in sorted(metrics.items()):
+        print(f"{name:<48}{value:>16,.3f}")
+
+    if not args.no_record:
+        entry = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "host": host,
+            "python": platform.python_version(),
+            "artifact": args.artifact,
+            "model_version": ImpactPredictor.load(model_dir, verify=False,
+                                                  artifact=args.artifact).model_version,
+            "metrics": metrics,
+            "regressions": [r[0] for r in regressions],
+            "accepted": bool(regressions) and args.accept,
+        }
+        with open(history_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"\nResults appended to: {history_path}")
+
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed more than {args.threshold:.0%}:")
+        for name, base, value, change in regressions:
+            print(f"  {name}: {base:,.3f} -> {value:,.3f} ({change:+.0%})")
+        if args.accept and not args.no_record:
+            print("Accepted: this run now counts toward the baseline.")
+            return
+        raise SystemExit(1)
+    print("No regressions against the recorded baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Latency-budgeted forest compaction
+==================================
+
+Shrinks a trained forest to the smallest prefix of trees and the shallowest
+depth cap whose out-of-bag (or held-out) weighted F1 stays within a tolerance
+of the full forest, then prunes splits whose two leaf children predict the
+same class distribution. Everything operates on ``FlatForest`` node arrays,
+so the result can be saved with ``forest_artifact.save_forest`` and served by
+the same engine.
+"""
+
+import os
+import tempfile
+import time
+
+import numpy as np
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.utils import check_random_state
+
+from forest_artifact import save_forest
+from forest_engine import FlatForest
+
+DEFAULT_TOLERANCE = 0.01
+DEFAULT_TREE_COUNTS = (10, 20, 30, 50, 75, 100, 150, 200, 300, 400, 500)
+DEFAULT_DEPTHS = (6, 8, 10, 12, 14, 16, 18, 20, 25, 30, 40)
+MAX_EVAL_ROWS = 20_000
+
+
+# ============================================================================
+# STRUCTURAL EDITS
+# ============================================================================
+
+def node_depths(forest):
+    """Depth of every node reachable from a root, -1 for unreachable nodes."""
+    is_leaf = forest.left == np.arange(len(forest.left))
+    depth = np.full(len(forest.left), -1, dtype=np.intp)
+    frontier = forest.roots
+    level = 0
+    while frontier.size:
+        depth[frontier] = level
+        internal = frontier[~is_leaf[frontier]]
+        frontier = np.concatenate([forest.left[internal], forest.right[internal]])
+        level += 1
+    return depth
+
+
+def _rebuild(forest, keep, feature=None, threshold=None, left=None, right=None,
+             value=None, roots=None):
+    """New forest holding the ``keep`` nodes, with child links renumbered."""
+    feature = forest.feature if feature is None else feature
+    threshold = forest.threshold if threshold is None else threshold
+    left = forest.left if left is None else left
+    right = forest.right if right is None else right
+    value = forest.value if value is None else value
+    roots = forest.roots if roots is None else roots
+
+    new_index = np.cumsum(keep) - 1
+    mgl = forest.missing_go_left
+    cover = forest.cover
+    rebuilt = FlatForest(
+        feature=feature[keep],
+        threshold=threshold[keep],
+        left=new_index[left[keep]],
+        right=new_index[right[keep]],
+        value=value[keep],
+        roots=new_index[roots],
+        max_depth=0,
+        classes=forest.classes_,
+        missing_go_left=None if mgl is None else mgl[keep],
+        feature_names=forest.feature_names,
+        n_features=forest.n_features,
+        cover=None if cover is None else cover[keep],
+    )
+    rebuilt.max_depth = int(node_depths(rebuilt).max())
+    return rebuilt
+
+
+def select_trees(forest, tree_ids):
+    """Forest made of the trees at ``tree_ids``."""
+    ends = np.append(forest.roots[1:], len(forest.left))
+    keep = np.zeros(len(forest.left), dtype=bool)
+    for t in tree_ids:
+        keep[forest.roots[t]:ends[t]] = True
+    return _rebuild(forest, keep, roots=forest.roots[list(tree_ids)])
+
+
+def truncate(forest, max_depth):
+    """Cap every tree at ``max_depth``; nodes at the cap become leaves.
+
+    A capped node predicts its own stored class distribution, which is what
+    a tree grown with that ``max_depth`` would predict there.
+    """
+    depth = node_depths(forest)
+    node_ids = np.arange(len(forest.left))
+    cut = (depth == max_depth) & (forest.left != node_ids)
+    left = np.where(cut, node_ids, forest.left)
+    right = np.where(cut, node_ids, forest.right)
+    feature = np.where(cut, 0, forest.feature)
+    threshold = np.where(cut, np.inf, forest.threshold)
+    keep = (depth >= 0) & (depth <= max_depth)
+    return _rebuild(forest, keep, feature=feature, threshold=threshold, left=left, right=right)
+
+
+def prune_redundant(forest):
+    """Collapse splits whose two leaf children carry identical distributions.
+
+    Repeats bottom-up until no such split is left. Predictions are unchanged.
+    """
+    node_ids = np.arange(len(forest.left))
+    left, right = forest.left.copy(), forest.right.copy()
+    feature, threshold = forest.feature.copy(), forest.threshold.copy()
+    value = forest.value.copy()
+    while True:
+        is_leaf = left == node_ids
+        internal = ~is_leaf
+        mergeable = internal & is_leaf[left] & is_leaf[right]
+        mergeable &= (value[left] == value[right]).all(axis=1)
+        if not mergeable.any():
+            break
+        value[mergeable] = value[left[mergeable]]
+        left[mergeable] = node_ids[mergeable]
+        right[mergeable] = node_ids[mergeable]
+        feature[mergeable] = 0
+        threshold[mergeable] = np.inf
+
+    pruned = FlatForest(feature, threshold, left, right, value, forest.roots,
+                        forest.max_depth, forest.classes_, forest.missing_go_left,
+                        forest.feature_names, n_features=forest.n_features, cover=forest.cover)
+    return _rebuild(pruned, node_depths(pruned) >= 0)
+
+
+# ============================================================================
+# SCORING
+# ============================================================================
+
+def oob_mask(model, n_samples):
+    """Boolean (n_samples, n_trees) mask of out-of-bag rows, or None.
+
+    Recreates each tree's bootstrap draw from its random state the same way
+    sklearn does when ``oob_score=True`` and no sample weights are used.
+    """
+    if not getattr(model, 'bootstrap', False):
+        return None
+    max_samples = getattr(model, 'max_samples', None)
+    if max_samples is None:
+        n_bootstrap = n_samples
+    elif isinstance(max_samples, float):
+        n_bootstrap = max(round(n_samples * max_samples), 1)
+    else:
+        n_bootstrap = int(max_samples)
+
+    mask = np.zeros((n_samples, len(model.estimators_)), dtype=bool)
+    for t, est in enumerate(model.estimators_):
+        drawn = check_random_state(est.random_state).randint(0, n_samples, n_bootstrap)
+        mask[:, t] = np.bincount(drawn, minlength=n_samples) == 0
+    return mask
+
+
+def score_grid(forest, X, y, tree_counts, depths, mask=None, chunk_rows=2000):
+    """Weighted F1 for every (tree count, depth cap) pair.
+
+    With ``mask`` each row is only voted on by the trees it was out-of-bag
+    for, which gives an honest estimate from training data. Rows without a
+    vote for a given prefix are left out of that prefix's score.
+    """
+    y = np.asarray(y)
+    counts = sorted(set(int(k) for k in tree_counts if 0 < k <= forest.n_trees))
+    scores = {}
+    for depth in sorted(set(depths)):
+        capped = truncate(forest, depth) if depth < forest.max_depth else forest
+        votes = {k: np.zeros((len(X), len(forest.classes_))) for k in counts}
+        voted = {k: np.zeros(len(X), dtype=bool) for k in counts}
+        for start in range(0, len(X), chunk_rows):
+            rows = slice(start, start + chunk_rows)
+            leaves = capped.apply(X[rows])
+            contrib = capped.value[leaves]
+            if mask is not None:
+                contrib = contrib * mask[rows, :, np.newaxis]
+            running = np.cumsum(contrib, axis=1)
+            seen = (np.cumsum(mask[rows], axis=1) if mask is not None
+                    else np.arange(1, forest.n_trees + 1)[np.newaxis, :].repeat(len(contrib), 0))
+            for k in counts:
+                votes[k][rows] = running[:, k - 1]
+                voted[k][rows] = seen[:, k - 1] > 0
+        for k in counts:
+            ok = voted[k]
+            pred = forest.classes_[np.argmax(votes[k][ok], axis=1)]
+            scores[(k, min(depth, forest.max_depth))] = f1_score(y[ok], pred, average='weighted')
+        if depth >= forest.max_depth:
+            break
+    return scores
+
+
+def measure_latency(forest, X, repeats=50):
+    """Median single-row latency (ms) and batch throughput (rows/s)."""
+    X = np.asarray(X, dtype=np.float32)
+    row = X[:1]
+    forest.predict_proba(row)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        forest.predict_proba(row)
+        times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    forest.predict_proba(X)
+    batch = time.perf_counter() - start
+    return float(np.median(times) * 1000), float(len(X) / max(batch, 1e-9))
+
+
+def artifact_size(forest):
+    """Bytes the forest takes as a memory-mapped artifact."""
+    fd, path = tempfile.mkstemp(suffix='.forest')
+    os.close(fd)
+    try:
+        save_forest(forest, path)
+        return os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+
+# ============================================================================
+# DRIVER
+# ============================================================================
+
+def compact_forest(model, X_train, y_train, X_test, y_test, tolerance=DEFAULT_TOLERANCE,
+                   tree_counts=DEFAULT_TREE_COUNTS, depths=DEFAULT_DEPTHS, random_state=42):
+    """Find the cheapest forest within ``tolerance`` weighted F1 of ``model``.
+
+    Candidates are scored out-of-bag on the training data when the forest was
+    bootstrapped, otherwise on the held-out ``X_test``. Cost is the number of
+    trees times the depth cap, a proxy for nodes visited per row. Returns
+    ``(compact_forest, report)``.
+    """
+    forest = FlatForest.from_model(model)
+    X_train = np.asarray(X_train, dtype=np.float32)
+    X_test = np.asarray(X_test, dtype=np.float32)
+    y_train, y_test = np.asarray(y_train), np.asarray(y_test)
+
+    mask = oob_mask(model, len(X_train))
+    if mask is not None:
+        X_eval, y_eval, source = X_train, y_train, 'oob'
+        if len(X_eval) > MAX_EVAL_ROWS:
+            rows = check_random_state(random_state).choice(len(X_eval), MAX_EVAL_ROWS, replace=False)
+            X_eval, y_eval, mask = X_eval[rows], y_eval[rows], mask[rows]
+    else:
+        X_eval, y_eval, source = X_test, y_test, 'held-out'
+
+    counts = tuple(tree_counts) + (forest.n_trees,)
+    grid = score_grid(forest, X_eval, y_eval, counts, tuple(depths) + (forest.max_depth,), mask)
+    full_score = grid[(forest.n_trees, forest.max_depth)]
+
+    eligible = [(k * d, k, d) for (k, d), s in grid.items() if s >= full_score - tolerance]
+    _, n_trees, depth = min(eligible)
+
+    compact = select_trees(forest, range(n_trees))
+    if depth < compact.max_depth:
+        compact = truncate(compact, depth)
+    nodes_before_prune = len(compact.left)
+    compact = prune_redundant(compact)
+
+    full_ms, full_rps = measure_latency(forest, X_test)
+    compact_ms, compact_rps = measure_latency(compact, X_test)
+    report = {
+        'selection_source': source,
+        'tolerance': tolerance,
+        'selected': {'n_trees': n_trees, 'max_depth': depth},
+        'selection_f1': {'full': full_score, 'compact': grid[(n_trees, depth)]},
+        'test': {
+            'full': _test_scores(forest, X_test, y_test),
+            'compact': _test_scores(compact, X_test, y_test),
+        },
+        'latency_ms_single_row': {'full': full_ms, 'compact': compact_ms},
+        'throughput_rows_per_s': {'full': full_rps, 'compact': compact_rps},
+        'nodes': {'full': len(forest.left), 'compact_before_prune': nodes_before_prune,
+                  'compact': len(compact.left)},
+        'artifact_bytes': {'full': artifact_size(forest), 'compact': artifact_size(compact)},
+        'grid': [{'n_trees': k, 'max_depth': d, 'f1': s} for (k, d), s in sorted(grid.items())],
+    }
+    return compact, report
+
+
+def _test_scores(forest, X, y):
+    pred = forest.predict(X)
+    return {'accuracy': float(accuracy_score(y, pred)),
+            'f1_weighted': float(f1_score(y, pred, average='weighted'))}
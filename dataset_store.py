@@ -0,0 +1,251 @@
+"""
+Local training dataset store
+============================
+
+Ingests a training CSV (URL or local path) once into a Parquet cache named
+after the SHA-256 of the source bytes, and records it in ``manifest.json``.
+Later training runs read the Parquet file directly and never touch the
+network unless asked to refresh. Every load re-checks the Parquet file's
+checksum, and a source without a cached copy fails loudly when offline
+instead of quietly training on made-up data.
+
+Usage:
+    python dataset_store.py ingest https://example.org/earthquake.csv
+    python dataset_store.py ingest ./earthquake.csv
+    python dataset_store.py list
+"""
+
+import hashlib
+import io
+import json
+import os
+import time
+import urllib.request
+
+import pandas as pd
+
+from predictor import FEATURES
+
+DATASET_SOURCES = (
+    "https://raw.githubusercontent.com/anushkadhiman/AI-impactSense/main/dataset/earthquake.csv",
+    "https://raw.githubusercontent.com/holtzy/Data_to_Viz/master/Story/earthquake/earthquake.csv",
+)
+REQUIRED_COLUMNS = tuple(FEATURES) + ('alert',)
+MANIFEST_FILE = "manifest.json"
+DOWNLOAD_TIMEOUT = 30
+
+
+class DatasetError(RuntimeError):
+    """Raised when no usable copy of a training dataset can be found."""
+
+
+def default_store_dir():
+    return os.environ.get(
+        "AI_IMPACTSENSE_DATA_DIR",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_cache"),
+    )
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise SystemExit("The dataset cache stores Parquet and requires pyarrow: pip install pyarrow") from e
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_key(source):
+    """Manifest key: URLs as given, local files by absolute path."""
+    return source if "://" in source else os.path.abspath(source)
+
+
+def _read_source(source):
+    """Raw bytes of a URL or local file."""
+    if "://" in source:
+        with urllib.request.urlopen(source, timeout=DOWNLOAD_TIMEOUT) as response:
+            return response.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+
+class DatasetStore:
+    """Content-addressed Parquet copies of training sources."""
+
+    def __init__(self, store_dir=None):
+        self.store_dir = store_dir or default_store_dir()
+        self.manifest_path = os.path.join(self.store_dir, MANIFEST_FILE)
+
+    def manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def ingest(self, source):
+        """Fetch ``source``, check its columns and cache it as Parquet.
+
+        Returns the manifest entry. Sources with identical bytes share a file.
+        """
+        _require_pyarrow()
+        raw = _read_source(source)
+        content_hash = hashlib.sha256(raw).hexdigest()
+        frame = pd.read_csv(io.BytesIO(raw))
+        missing = [c for c in REQUIRED_COLUMNS if c not in frame.columns]
+        if missing:
+            raise DatasetError(f"{source} is missing required columns {missing}")
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        parquet_name = f"{content_hash}.parquet"
+        parquet_path = os.path.join(self.store_dir, parquet_name)
+        if not os.path.exists(parquet_path):
+            tmp_path = parquet_path + ".tmp"
+            frame.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, parquet_path)
+
+        entry = {
+            "content_sha256": content_hash,
+            "parquet": parquet_name,
+            "parquet_sha256": _sha256_file(parquet_path),
+            "rows": int(len(frame)),
+            "columns": list(frame.columns),
+            "ingested_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        manifest = self.manifest()
+        manifest[_source_key(source)] = entry
+        self._write_manifest(manifest)
+        return entry
+
+    def load_cached(self, source, columns=None):
+        """DataFrame for ``source`` from the cache, or None if it was never ingested.
+
+        Raises ``DatasetError`` when the cached file is missing or corrupted.
+        """
+        entry = self.manifest().get(_source_key(source))
+        if entry is None:
+            return None
+        _require_pyarrow()
+        parquet_path = os.path.join(self.store_dir, entry["parquet"])
+        if not os.path.exists(parquet_path):
+            raise DatasetError(f"Cached copy of {source} is missing: {parquet_path}")
+        if _sha256_file(parquet_path) != entry["parquet_sha256"]:
+            raise DatasetError(f"Cached copy of {source} failed its checksum: {parquet_path}")
+        return pd.read_parquet(parquet_path, columns=columns)
+
+    def load(self, sources=DATASET_SOURCES, offline=False, refresh=False, columns=None, log=print):
+        """First usable source as a DataFrame.
+
+        Cached sources are used before any download. Online, uncached sources
+        are ingested in order; offline, a missing cache is an error. ``refresh``
+        re-downloads even when a cached copy exists.
+        """
+        if isinstance(sources, str):
+            sources = (sources,)
+        if not refresh:
+            for source in sources:
+                frame = self.load_cached(source, columns)
+                if frame is not None:
+                    log(f"Loaded {len(frame):,} rows of {source} from {self.store_dir}")
+                    return frame
+        if offline:
+            raise DatasetError(
+                f"No cached copy of {list(sources)} in {self.store_dir} and running offline. "
+                f"Ingest one first: python dataset_store.py ingest <url-or-path>"
+            )
+
+        errors = []
+        for source in sources:
+            try:
+                log(f"Downloading {source}...")
+                self.ingest(source)
+            except (OSError, ValueError, DatasetError) as e:
+                errors.append(f"{source}: {e}")
+                continue
+            return self.load_cached(source, columns)
+        raise DatasetError("Could not fetch any training dataset:\n  " + "\n  ".join(errors))
+
+
+# ============================================================================
+# TRAINING DATA
+# ============================================================================
+
+# Alert name -> class code the model is trained on
+LABEL_MAPPING = {'green': 0, 'yellow': 3, 'orange': 1, 'red': 2}
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
+
+
+def load_training_frame(synthetic_rows=0, sources=None, store_dir=None, offline=False,
+                        refresh=False, log=print):
+    """Raw training catalog: ``synthetic_rows`` generated events, or the
+    first usable dataset source through the local cache."""
+    if synthetic_rows:
+        from synthetic_catalog import generate_catalog
+
+        log(f"Generating {synthetic_rows:,} synthetic events...")
+        return generate_catalog(synthetic_rows, seed=42)
+    # Served from the local Parquet cache after the first download; offline
+    # runs without a cached copy stop here rather than train on random data
+    return DatasetStore(store_dir).load(sources or DATASET_SOURCES, offline=offline,
+                                        refresh=refresh, log=log)
+
+
+def prepare_training_data(df):
+    """Deduplicate, clean the alert labels and encode them.
+
+    Returns ``(X, y, alerts)``: the feature columns, the encoded classes and
+    the cleaned alert names.
+    """
+    df = df.drop_duplicates()
+    alerts = df['alert'].astype(str).str.strip()
+    return df[list(FEATURES)], alerts.map(LABEL_MAPPING), alerts
+
+
+def split_training_data(X, y):
+    """The held-out split every training script evaluates on."""
+    from sklearn.model_selection import train_test_split
+
+    return train_test_split(X, y, test_size=TEST_SIZE, random_state=SPLIT_SEED)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the local training dataset cache.")
+    parser.add_argument("--store-dir", default=None, help="cache directory (default: data_cache/)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="cache a CSV from a URL or local path")
+    ingest.add_argument("source")
+    commands.add_parser("list", help="show cached sources")
+    args = parser.parse_args(argv)
+
+    store = DatasetStore(args.store_dir)
+    if args.command == "ingest":
+        try:
+            entry = store.ingest(args.source)
+        except (OSError, ValueError, DatasetError) as e:
+            raise SystemExit(f"Ingest failed: {e}")
+        print(f"Cached {entry['rows']:,} rows as {entry['parquet']} in {store.store_dir}")
+    else:
+        manifest = store.manifest()
+        if not manifest:
+            print(f"No cached datasets in {store.store_dir}")
+        for source, entry in manifest.items():
+            print(f"{source}\n  {entry['rows']:,} rows, sha256 {entry['content_sha256'][:16]}..., "
+                  f"ingested {entry['ingested_at']}")
+
+
+if __name__ == "__main__":
+    main()
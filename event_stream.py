@@ -0,0 +1,580 @@
+"""
+Streaming event-feed scoring
+============================
+
+Scores a live feed of earthquake records continuously:
+
+    source --> [parse] --events queue--> [batch + score] --results queue--> [sink]
+
+* The source tails an append-only file (or replays it) or reads a TCP socket,
+  one record per line: USGS GeoJSON features, flat JSON objects or CSV rows
+  with a header. ``mag``/``magnitude``, ``depth``, ``cdi``, ``mmi`` and
+  ``sig`` become the ``feature_order`` row; missing values are NaN, which
+  the forest routes like sklearn does.
+* The scorer gathers events into batches of at most ``max_batch`` that wait
+  no longer than ``max_wait`` seconds for the first event, and scores each
+  batch with one ``predict_batch`` call.
+* The sink writes one JSON line per alert result.
+
+Both queues are bounded. When scoring or the sink falls behind, ``put``
+blocks the stage upstream, the reader stops reading, and a file simply grows
+on disk or a socket's TCP window closes; a burst of aftershocks costs at most
+``queue_size`` events of memory per queue.
+
+Per-event end-to-end latency (read to written) and stage timings go into a
+``StageTimer``; queue depths are sampled with every batch. A summary is
+printed every ``report_every`` seconds and can be written as a Prometheus
+textfile.
+
+Usage:
+    python event_stream.py replay feed.jsonl --rows 10000        # write a replay file
+    python event_stream.py run feed.jsonl --replay --speed 60    # replay at 60x real time
+    python event_stream.py run /var/feeds/usgs.jsonl --output alerts.jsonl
+    python event_stream.py run --socket 127.0.0.1:9000
+    python event_stream.py run feed.jsonl --zone-windows zone_windows.npz   # rolling counts per zone
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from predictor import ImpactPredictor
+from stage_timing import StageTimer
+
+DEFAULT_QUEUE_SIZE = 10_000
+DEFAULT_MAX_BATCH = 256
+DEFAULT_MAX_WAIT = 0.05
+DEFAULT_POLL_INTERVAL = 0.2
+DEFAULT_REPORT_EVERY = 10.0
+
+# Record field names accepted for each feature, USGS names included
+FIELD_ALIASES = {
+    'magnitude': ('magnitude', 'mag'),
+    'depth': ('depth',),
+    'cdi': ('cdi',),
+    'mmi': ('mmi',),
+    'sig': ('sig',),
+}
+
+# Marks the end of the stream in a queue
+_DONE = object()
+
+
+class Event:
+    """One parsed record on its way through the pipeline."""
+
+    __slots__ = ('id', 'values', 'event_time', 'latitude', 'longitude', 'received')
+
+    def __init__(self, id, values, event_time=None, latitude=None, longitude=None, received=None):
+        self.id = id
+        self.values = values
+        self.event_time = event_time
+        self.latitude = latitude
+        self.longitude = longitude
+        self.received = received
+
+
+# ============================================================================
+# PARSING
+# ============================================================================
+
+def _number(value):
+    """Float from a feed field; NaN when it is absent. Infinities, including
+    JSON overflows such as 1e400, raise ValueError so the record is rejected."""
+    if value is None or value == '':
+        return math.nan
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f"non-finite value {value!r}")
+    return value
+
+
+def _timestamp(value):
+    """Seconds since the epoch from epoch milliseconds/seconds or ISO 8601."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return value / 1000.0 if value > 1e11 else float(value)
+    try:
+        return _timestamp(float(value))
+    except ValueError:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+
+
+class RecordParser:
+    """Turn feed lines into ``Event`` objects.
+
+    JSON lines may be USGS GeoJSON features (``properties`` plus
+    ``geometry.coordinates = [lon, lat, depth]``) or flat objects. Any other
+    line is CSV; the first CSV line is its header.
+    """
+
+    def __init__(self, feature_order):
+        self.feature_order = list(feature_order)
+        self._csv_header = None
+        self.parsed = 0
+        self.rejected = 0
+
+    def parse(self, line):
+        """The event on ``line``, or None for blank, header and unusable lines."""
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            if line.startswith('{'):
+                event = self._from_record(json.loads(line))
+            elif self._csv_header is None:
+                self._csv_header = next(csv.reader([line]))
+                return None
+            else:
+                event = self._from_record(dict(zip(self._csv_header, next(csv.reader([line])))))
+        except (ValueError, TypeError, KeyError, AttributeError):
+            self.rejected += 1
+            return None
+        self.parsed += 1
+        return event
+
+    def _from_record(self, record):
+        if record.get('type') == 'Feature':
+            fields = dict(record.get('properties') or {})
+            coordinates = (record.get('geometry') or {}).get('coordinates') or []
+            if len(coordinates) >= 3:
+                fields.setdefault('longitude', coordinates[0])
+                fields.setdefault('latitude', coordinates[1])
+                fields.setdefault('depth', coordinates[2])
+            fields.setdefault('id', record.get('id'))
+        else:
+            fields = record
+        values = []
+        for feature in self.feature_order:
+            name = next((a for a in FIELD_ALIASES.get(feature, (feature,)) if a in fields), None)
+            values.append(_number(fields[name]) if name is not None else math.nan)
+        if all(math.isnan(v) for v in values):
+            raise ValueError("record has none of the model features")
+        latitude, longitude = fields.get('latitude'), fields.get('longitude')
+        return Event(
+            id=fields.get('id'),
+            values=values,
+            event_time=_timestamp(fields.get('time')),
+            latitude=None if latitude in (None, '') else _number(latitude),
+            longitude=None if longitude in (None, '') else _number(longitude),
+        )
+
+
+# ============================================================================
+# SOURCES
+# ============================================================================
+
+def tail_lines(path, follow=True, poll_interval=DEFAULT_POLL_INTERVAL, stop=None):
+    """Lines of ``path`` from the start; with ``follow``, keep waiting for
+    appended lines until ``stop`` is set. A partial last line is held back
+    until its newline arrives."""
+    stop = stop or threading.Event()
+    with open(path, encoding='utf-8') as f:
+        pending = ''
+        while not stop.is_set():
+            chunk = f.readline()
+            if chunk:
+                pending += chunk
+                if pending.endswith('\n'):
+                    yield pending
+                    pending = ''
+                continue
+            if not follow:
+                break
+            stop.wait(poll_interval)
+        if pending and not follow:
+            yield pending
+
+
+def socket_lines(host, port, stop=None, timeout=1.0):
+    """Newline-delimited records read from a TCP connection to ``host:port``."""
+    stop = stop or threading.Event()
+    with socket.create_connection((host, port)) as conn:
+        conn.settimeout(timeout)
+        buffer = b''
+        while not stop.is_set():
+            try:
+                data = conn.recv(65536)
+            except socket.timeout:
+                continue
+            if not data:
+                break
+            buffer += data
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                yield line.decode('utf-8', errors='replace')
+        if buffer:
+            yield buffer.decode('utf-8', errors='replace')
+
+
+def paced(events, speed, stop=None):
+    """Release replayed events ``speed`` times faster than their event times."""
+    stop = stop or threading.Event()
+    first_event = first_wall = None
+    for event in events:
+        if event.event_time is not None and speed > 0:
+            if first_event is None:
+                first_event, first_wall = event.event_time, time.monotonic()
+            delay = first_wall + (event.event_time - first_event) / speed - time.monotonic()
+            if delay > 0 and stop.wait(delay):
+                return
+        yield event
+
+
+# ============================================================================
+# SINKS
+# ============================================================================
+
+class JsonLinesSink:
+    """Append alert results as JSON lines to a file (or stdout)."""
+
+    def __init__(self, path=None):
+        self._file = open(path, 'a', encoding='utf-8') if path else sys.stdout
+        self._close = path is not None
+
+    def write(self, results):
+        self._file.write(''.join(json.dumps(r) + '\n' for r in results))
+        self._file.flush()
+
+    def close(self):
+        if self._close:
+            self._file.close()
+
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+class StreamPipeline:
+    """Parse, batch-score and sink a stream of lines through bounded queues.
+
+    ``sink`` is any object with ``write(results)`` taking a list of result
+    dicts. ``run(lines)`` blocks until the source ends or ``stop()`` is
+    called, then drains what was already read.
+    """
+
+    def __init__(self, predictor, sink, queue_size=DEFAULT_QUEUE_SIZE,
+                 max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT, timer=None):
+        self.predictor = predictor
+        self.sink = sink
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timer = timer or StageTimer(enabled=True)
+        self.parser = RecordParser(predictor.feature_order)
+        self.events = queue.Queue(maxsize=queue_size)
+        self.results = queue.Queue(maxsize=queue_size)
+        self.stopping = threading.Event()
+        self.scored = 0
+        self.batches = 0
+        self.failed = 0
+        self.max_depth = {'events': 0, 'results': 0}
+        self._error = None
+
+    def stop(self):
+        self.stopping.set()
+
+    def queue_depths(self):
+        return {'events': self.events.qsize(), 'results': self.results.qsize()}
+
+    def gauges(self):
+        """Point-in-time values for ``StageTimer.to_prometheus``."""
+        depths = self.queue_depths()
+        return {
+            'stream_events_queue_depth': depths['events'],
+            'stream_results_queue_depth': depths['results'],
+            'stream_events_queue_max_depth': self.max_depth['events'],
+            'stream_results_queue_max_depth': self.max_depth['results'],
+            'stream_events_scored': self.scored,
+            'stream_records_rejected': self.parser.rejected,
+            'stream_events_failed': self.failed,
+        }
+
+    def run(self, lines, speed=0.0, report_every=None, log=sys.stderr):
+        """Feed ``lines`` through the pipeline; returns the final summary.
+
+        With ``speed`` > 0 events are released at ``speed`` times the pace of
+        their event times (replay); 0 reads as fast as the pipeline accepts.
+        """
+        scorer = threading.Thread(target=self._score_loop, name='stream-scorer', daemon=True)
+        writer = threading.Thread(target=self._sink_loop, name='stream-sink', daemon=True)
+        scorer.start()
+        writer.start()
+        reporter = None
+        if report_every:
+            reporter = threading.Thread(target=self._report_loop, args=(report_every, log),
+                                        name='stream-report', daemon=True)
+            reporter.start()
+        try:
+            for event in paced(self._parse(lines), speed, self.stopping):
+                event.received = time.perf_counter()
+                # Blocks while the scorer is behind: this is the backpressure
+                self.events.put(event)
+                if self.stopping.is_set() or self._error is not None:
+                    break
+        finally:
+            self.events.put(_DONE)
+            scorer.join()
+            writer.join()
+            self.stopping.set()
+            if reporter is not None:
+                reporter.join()
+        if self._error is not None:
+            raise self._error
+        return self.summary()
+
+    def _parse(self, lines):
+        for line in lines:
+            with self.timer.stage('stream.parse'):
+                event = self.parser.parse(line)
+            if event is not None:
+                yield event
+
+    def _collect(self):
+        """Next batch: block for one event, then take more until full or
+        ``max_wait`` has passed. Returns (events, done)."""
+        first = self.events.get()
+        if first is _DONE:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                event = self.events.get(timeout=remaining) if remaining > 0 \
+                    else self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event is _DONE:
+                return batch, True
+            batch.append(event)
+        return batch, False
+
+    def _score_loop(self):
+        done = False
+        try:
+            while not done:
+                for name, depth in self.queue_depths().items():
+                    self.max_depth[name] = max(self.max_depth[name], depth)
+                batch, done = self._collect()
+                if not batch:
+                    continue
+                X = np.array([event.values for event in batch], dtype=np.float64)
+                try:
+                    with self.timer.stage('stream.score'):
+                        alerts, confidence, proba = self.predictor.predict_batch(X)
+                except Exception:
+                    # One bad event must not stop the feed: score the batch
+                    # row by row and drop only the rows that still fail
+                    self.timer.increment('stream.batch_fallbacks')
+                    batch, alerts, confidence, proba = self._score_rows(batch)
+                    if not batch:
+                        continue
+                self.batches += 1
+                self.results.put((batch, alerts, confidence, proba))
+        except Exception as e:
+            self._error = e
+            self.stopping.set()
+            # Unblock the reader, which may be waiting on a full queue
+            while True:
+                try:
+                    self.events.get_nowait()
+                except queue.Empty:
+                    break
+        finally:
+            self.results.put(_DONE)
+
+    def _score_rows(self, batch):
+        kept, outputs = [], []
+        for event in batch:
+            try:
+                outputs.append(self.predictor.predict_batch(
+                    np.array([event.values], dtype=np.float64)))
+            except Exception:
+                self.failed += 1
+                continue
+            kept.append(event)
+        if not kept:
+            return [], None, None, None
+        return (kept,) + tuple(np.concatenate(parts) for parts in zip(*outputs))
+
+    def _sink_loop(self):
+        alerts_named = self.predictor.class_alerts
+        while True:
+            item = self.results.get()
+            if item is _DONE:
+                return
+            batch, alerts, confidence, proba = item
+            results = []
+            for event, alert, conf, row in zip(batch, alerts, confidence, proba):
+                results.append({
+                    'id': event.id,
+                    'time': event.event_time,
+                    'latitude': event.latitude,
+                    'longitude': event.longitude,
+                    'alert': str(alert),
+                    'confidence': float(conf),
+                    'probabilities': {a: float(p) for a, p in zip(alerts_named, row) if a is not None},
+                })
+            try:
+                with self.timer.stage('stream.sink'):
+                    self.sink.write(results)
+            except Exception as e:
+                self._error = e
+                self.stopping.set()
+                continue
+            now = time.perf_counter()
+            for event in batch:
+                self.timer.observe('stream.end_to_end', now - event.received)
+            self.scored += len(batch)
+
+    def _report_loop(self, interval, log):
+        while not self.stopping.wait(interval):
+            print(self.format_summary(), file=log)
+
+    def summary(self):
+        rows, _ = self.timer.snapshot()
+        stages = {row['stage']: row for row in rows}
+        latency = stages.get('stream.end_to_end')
+        return {
+            'scored': self.scored,
+            'batches': self.batches,
+            'rejected': self.parser.rejected,
+            'failed': self.failed,
+            'latency_p50_ms': latency['p50_ms'] if latency else None,
+            'latency_p99_ms': latency['p99_ms'] if latency else None,
+            'queue_depth': self.queue_depths(),
+            'max_queue_depth': dict(self.max_depth),
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        latency = ("-" if s['latency_p50_ms'] is None
+                   else f"p50 {s['latency_p50_ms']:.1f} ms, p99 {s['latency_p99_ms']:.1f} ms")
+        return (f"{s['scored']:,} events in {s['batches']:,} batches, {s['rejected']} rejected, "
+                f"{s['failed']} failed; "
+                f"latency {latency}; queues {s['queue_depth']['events']}/{s['queue_depth']['results']} "
+                f"(max {s['max_queue_depth']['events']}/{s['max_queue_depth']['results']})")
+
+
+# ============================================================================
+# REPLAY FILES
+# ============================================================================
+
+def write_replay(path, rows, seed=42, events_per_minute=30.0, start_time=None):
+    """Write ``rows`` synthetic USGS GeoJSON features with Poisson arrival times."""
+    from synthetic_catalog import generate_chunk
+
+    rng = np.random.default_rng(seed)
+    frame = generate_chunk(rng, rows)
+    gaps = rng.exponential(60.0 / events_per_minute, rows)
+    times = (start_time or time.time()) + np.cumsum(gaps)
+    latitudes = rng.uniform(-60.0, 70.0, rows)
+    longitudes = rng.uniform(-180.0, 180.0, rows)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i, row in enumerate(frame.itertuples(index=False)):
+            f.write(json.dumps({
+                'type': 'Feature',
+                'id': f'replay{i:08d}',
+                'properties': {'mag': round(row.magnitude, 2), 'cdi': round(row.cdi, 1),
+                               'mmi': round(row.mmi, 2), 'sig': int(row.sig),
+                               'time': int(times[i] * 1000)},
+                'geometry': {'type': 'Point', 'coordinates': [round(longitudes[i], 4),
+                                                              round(latitudes[i], 4),
+                                                              round(row.depth, 2)]},
+            }) + '\n')
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a live earthquake feed continuously.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="tail a file or socket and score it")
+    run.add_argument('path', nargs='?', help="append-only feed file")
+    run.add_argument('--socket', default=None, help="read from host:port instead of a file")
+    run.add_argument('--replay', action='store_true',
+                     help="read the file once from the start and stop at its end")
+    run.add_argument('--speed', type=float, default=0.0,
+                     help="with --replay, release events at this multiple of real time (0: unpaced)")
+    run.add_argument('--output', default=None, help="JSON Lines file for results (default: stdout)")
+    run.add_argument('--model-dir', default=None,
+                     help="directory holding earthquake_impact_rf.pkl and feature_order.pkl")
+    run.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                     help="capacity of each queue between stages")
+    run.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH)
+    run.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT * 1000,
+                     help="longest an event waits for its batch to fill")
+    run.add_argument('--report-every', type=float, default=DEFAULT_REPORT_EVERY,
+                     help="seconds between progress lines on stderr (0: off)")
+    run.add_argument('--metrics-file', default=None,
+                     help="write Prometheus metrics here when the stream ends")
+    run.add_argument('--zone-windows', default=None,
+                     help="keep hour/day/week alert counts per zone in this snapshot file "
+                          "(restored at start, see zone_windows.py)")
+    run.add_argument('--zone-deg', type=float, default=None,
+                     help="zone size in degrees for a new --zone-windows file")
+    run.add_argument('--snapshot-every', type=float, default=60.0,
+                     help="seconds between --zone-windows snapshots")
+
+    replay = commands.add_parser('replay', help="write a synthetic replay file")
+    replay.add_argument('path')
+    replay.add_argument('--rows', type=int, default=10_000)
+    replay.add_argument('--rate', type=float, default=30.0, help="events per minute")
+    replay.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if args.command == 'replay':
+        write_replay(args.path, args.rows, args.seed, args.rate)
+        print(f"Wrote {args.rows:,} events to {args.path}")
+        return
+
+    if (args.path is None) == (args.socket is None):
+        parser.error("give a feed file or --socket host:port")
+    stop = threading.Event()
+    if args.socket:
+        host, _, port = args.socket.rpartition(':')
+        lines = socket_lines(host or '127.0.0.1', int(port), stop)
+    else:
+        if not os.path.exists(args.path):
+            raise SystemExit(f"Feed file not found: {args.path}")
+        lines = tail_lines(args.path, follow=not args.replay, stop=stop)
+
+    sink = JsonLinesSink(args.output)
+    if args.zone_windows:
+        from zone_windows import DEFAULT_ZONE_CELL_DEG, ZoneWindows, ZoneWindowSink
+
+        if os.path.exists(args.zone_windows):
+            windows = ZoneWindows.restore(args.zone_windows)
+            print(f"Restored zone windows for {len(windows):,} zones", file=sys.stderr)
+        else:
+            windows = ZoneWindows(zone_cell_deg=args.zone_deg or DEFAULT_ZONE_CELL_DEG)
+        sink = ZoneWindowSink(windows, sink, args.zone_windows, args.snapshot_every)
+    pipeline = StreamPipeline(ImpactPredictor.load(args.model_dir), sink,
+                              queue_size=args.queue_size, max_batch=args.max_batch,
+                              max_wait=args.max_wait_ms / 1000.0)
+    pipeline.stopping = stop
+    try:
+        pipeline.run(lines, speed=args.speed if args.replay else 0.0,
+                     report_every=args.report_every or None)
+    except KeyboardInterrupt:
+        stop.set()
+    finally:
+        sink.close()
+    print(pipeline.format_summary(), file=sys.stderr)
+    if args.metrics_file:
+        pipeline.timer.write_textfile(args.metrics_file, gauges=pipeline.gauges())
+
+
+if __name__ == '__main__':
+    main()
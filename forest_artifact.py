@@ -0,0 +1,239 @@
+"""
+Memory-mapped forest artifact
+=============================
+
+Stores a ``FlatForest`` as one file of uncompressed, page-aligned arrays so
+that every process on a host can ``mmap`` the same pages read-only instead of
+unpickling a private copy of all trees.
+
+Layout::
+
+    b"AIFOREST"                 8-byte magic
+    <u8 header length>          little-endian
+    JSON header                 schema version, forest kind, metadata,
+                                array table, sha256
+    padding to PAGE_SIZE
+    array data                  each array starts on a PAGE_SIZE boundary
+
+The loader checks the magic and schema version and, unless told otherwise,
+verifies the SHA-256 of the array data before handing out the forest.
+Artifacts exported from a pickle also record the pickle's size, mtime and
+SHA-256, so ``artifact_matches`` can tell when the pickle was replaced and
+the artifact is stale.
+"""
+
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+from forest_engine import FlatForest
+
+MAGIC = b"AIFOREST"
+SCHEMA_VERSION = 1
+PAGE_SIZE = 4096
+ARTIFACT_FILE = "earthquake_impact_rf.forest"
+
+# Canonical node arrays, then the traversal arrays FlatForest.kernel() builds,
+# so loaded processes share those pages too instead of deriving private copies.
+_ARRAYS = ("feature", "threshold", "left", "right", "value", "roots", "missing_go_left",
+           "cover")
+_KERNEL_ARRAYS = ("feature", "threshold", "child", "is_leaf", "nan_right")
+
+
+class ArtifactError(ValueError):
+    """Raised when an artifact is malformed, from another schema or corrupted."""
+
+
+def _align(offset):
+    return (offset + PAGE_SIZE - 1) // PAGE_SIZE * PAGE_SIZE
+
+
+def write_artifact(path, header, arrays):
+    """Write named ``arrays`` plus ``header`` metadata to ``path`` atomically.
+
+    Returns the SHA-256 of the array data, which is also stored in the header.
+    """
+    table = []
+    offset = 0
+    digest = hashlib.sha256()
+    arrays = [(name, np.ascontiguousarray(array)) for name, array in arrays]
+    for name, array in arrays:
+        table.append({
+            "name": name,
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+            "nbytes": array.nbytes,
+        })
+        digest.update(array.tobytes())
+        offset = _align(offset + array.nbytes)
+
+    header = dict(header, schema_version=SCHEMA_VERSION, arrays=table,
+                  sha256=digest.hexdigest())
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(header_bytes))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for (name, array), entry in zip(arrays, table):
+            f.seek(data_start + entry["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+    return header["sha256"]
+
+
+def read_header(path):
+    """Return ``(header, data_start)`` after checking magic and schema version."""
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ArtifactError(f"{path} is not a forest artifact")
+        (length,) = struct.unpack("<Q", f.read(8))
+        try:
+            header = json.loads(f.read(length))
+        except ValueError as e:
+            raise ArtifactError(f"{path} has a corrupt header") from e
+    if header.get("schema_version") != SCHEMA_VERSION:
+        raise ArtifactError(
+            f"{path} has schema version {header.get('schema_version')}, "
+            f"this loader reads version {SCHEMA_VERSION}"
+        )
+    return header, _align(len(MAGIC) + 8 + length)
+
+
+def map_artifact(path, verify=True):
+    """Memory-map ``path`` read-only; returns ``(header, {name: array})``."""
+    header, data_start = read_header(path)
+    size = os.path.getsize(path)
+    mapped = np.memmap(path, dtype=np.uint8, mode="r")
+
+    arrays = {}
+    digest = hashlib.sha256() if verify else None
+    for entry in header["arrays"]:
+        start = data_start + entry["offset"]
+        end = start + entry["nbytes"]
+        if end > size:
+            raise ArtifactError(f"{path} is truncated")
+        array = mapped[start:end].view(np.dtype(entry["dtype"])).reshape(entry["shape"])
+        if digest is not None:
+            digest.update(memoryview(array).cast("B"))
+        arrays[entry["name"]] = array
+
+    if digest is not None and digest.hexdigest() != header["sha256"]:
+        raise ArtifactError(f"{path} failed its content hash check")
+    return header, arrays
+
+
+def file_stamp(path):
+    """Size, mtime and SHA-256 identifying the file at ``path``."""
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return {"file": os.path.basename(path), "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+
+
+def artifact_matches(path, source):
+    """True when the artifact at ``path`` was exported from the file ``source``.
+
+    Compares size and mtime first and hashes ``source`` only when its mtime
+    changed (e.g. it was copied), so the usual check costs two ``stat`` calls.
+    Artifacts written without a source stamp never match.
+    """
+    stamp = read_header(path)[0].get("source")
+    if not stamp:
+        return False
+    stat = os.stat(source)
+    if stat.st_size != stamp["size"]:
+        return False
+    if stat.st_mtime_ns == stamp["mtime_ns"]:
+        return True
+    return file_stamp(source)["sha256"] == stamp["sha256"]
+
+
+def save_forest(forest, path, source=None):
+    """Write ``forest`` to ``path`` atomically and return the content hash.
+
+    ``source`` is the pickle the forest was flattened from; its stamp is
+    stored so loaders can detect a pickle that changed afterwards.
+    """
+    kernel = forest.kernel()
+    arrays = [(name, getattr(forest, name)) for name in _ARRAYS
+              if getattr(forest, name) is not None]
+    arrays += [("kernel." + name, kernel[name]) for name in _KERNEL_ARRAYS]
+    header = {
+        "kind": "flat",
+        "max_depth": forest.max_depth,
+        "n_features": forest.n_features,
+        "classes": [c.item() if hasattr(c, "item") else c for c in forest.classes_],
+        "feature_names": forest.feature_names,
+        "fingerprint": forest.fingerprint(),
+        "source": file_stamp(source) if source is not None else None,
+    }
+    return write_artifact(path, header, arrays)
+
+
+def load_forest(path, verify=True):
+    """Memory-map ``path`` read-only and return the forest stored in it.
+
+    Flat artifacts give a ``FlatForest``; reduced-precision ones written by
+    ``quantized_forest.py`` give a ``QuantizedForest``.
+    """
+    header, arrays = map_artifact(path, verify=verify)
+    kind = header.get("kind", "flat")
+    if kind == "quantized":
+        from quantized_forest import QuantizedForest
+
+        return QuantizedForest.from_artifact(header, arrays)
+    if kind != "flat":
+        raise ArtifactError(f"{path} holds an unknown forest kind {kind!r}")
+
+    kernel = {name: arrays["kernel." + name] for name in _KERNEL_ARRAYS}
+    kernel["index_dtype"] = kernel["child"].dtype.type
+    return FlatForest(
+        feature=arrays["feature"],
+        threshold=arrays["threshold"],
+        left=arrays["left"],
+        right=arrays["right"],
+        value=arrays["value"],
+        roots=arrays["roots"],
+        max_depth=header["max_depth"],
+        classes=header["classes"],
+        missing_go_left=arrays.get("missing_go_left"),
+        feature_names=header["feature_names"],
+        n_features=header["n_features"],
+        kernel=kernel,
+        fingerprint=header["fingerprint"],
+        cover=arrays.get("cover"),
+    )
+
+
+def main(argv=None):
+    """Convert an existing ``earthquake_impact_rf.pkl`` without retraining."""
+    import argparse
+
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Write the memory-mapped forest artifact.")
+    parser.add_argument("model", help="pickled RandomForestClassifier")
+    parser.add_argument("output", nargs="?", default=None,
+                        help=f"artifact path (default: {ARTIFACT_FILE} next to the model)")
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(args.model)), ARTIFACT_FILE)
+    forest = FlatForest.from_model(joblib.load(args.model))
+    digest = save_forest(forest, output, source=args.model)
+    print(f"Artifact saved to: {output} (sha256 {digest[:16]}...)")
+
+
+if __name__ == "__main__":
+    main()
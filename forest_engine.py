@@ -0,0 +1,293 @@
+"""
+Flattened-forest inference engine
+=================================
+
+Converts a fitted ``RandomForestClassifier`` once into contiguous NumPy node
+arrays and evaluates whole batches level by level, returning the predicted
+labels and class probabilities from a single traversal.
+
+The results match ``model.predict`` / ``model.predict_proba`` exactly: inputs
+are cast to float32 like sklearn does before walking the trees, leaf values are
+normalised the same way, and per-tree probabilities are accumulated in tree
+order before dividing by the number of trees.
+"""
+
+import hashlib
+
+import numpy as np
+
+# Rows evaluated per traversal block. The working set is
+# ``BLOCK_ROWS * n_trees`` node indices, which keeps large batches cache
+# friendly and bounds memory regardless of the input size.
+BLOCK_ROWS = 1024
+
+
+def float32_floor(values):
+    """Largest float32 not greater than each float64 value.
+
+    For a float32 input ``x`` the test ``x <= t`` is equivalent to
+    ``x <= float32_floor(t)``, so thresholds can be stored and compared in
+    single precision without changing any split decision.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = values.astype(np.float32)
+    over = out.astype(np.float64) > values
+    out[over] = np.nextafter(out[over], np.float32(-np.inf))
+    return out
+
+
+class FlatForest:
+    """A random forest flattened into contiguous node arrays."""
+
+    def __init__(self, feature, threshold, left, right, value, roots,
+                 max_depth, classes, missing_go_left=None, feature_names=None,
+                 n_features=None, kernel=None, fingerprint=None, cover=None):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        self.classes_ = np.asarray(classes)
+        self.missing_go_left = (
+            None if missing_go_left is None
+            else np.ascontiguousarray(missing_go_left, dtype=bool)
+        )
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        # Weighted training samples per node; only attributions need it, so it
+        # is optional and not part of the fingerprint
+        self.cover = None if cover is None else np.ascontiguousarray(cover, dtype=np.float64)
+        self.n_trees = len(self.roots)
+        # Traversal arrays are derived lazily unless a loader supplies them
+        self._slots = kernel
+        self._fingerprint = fingerprint
+        self._leaf_class = None
+        if n_features is not None:
+            self.n_features = int(n_features)
+        elif self.feature_names is not None:
+            self.n_features = len(self.feature_names)
+        else:
+            self.n_features = int(self.feature.max()) + 1 if len(self.feature) else 0
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_model(cls, model):
+        """Flatten a fitted sklearn ``RandomForestClassifier``."""
+        estimators = getattr(model, "estimators_", None)
+        if not estimators:
+            raise ValueError("Model is not a fitted tree ensemble")
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Multi-output forests are not supported")
+
+        n_classes = len(model.classes_)
+        features, thresholds, lefts, rights, values, mgls, covers = [], [], [], [], [], [], []
+        roots = []
+        max_depth = 0
+        offset = 0
+        for est in estimators:
+            tree = est.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(offset, offset + n)
+
+            # Leaves point at themselves with an always-true split so every row
+            # can take exactly ``max_depth`` steps without branching.
+            feature = np.where(is_leaf, 0, tree.feature)
+            threshold = np.where(is_leaf, np.inf, tree.threshold)
+            left = np.where(is_leaf, node_ids, tree.children_left + offset)
+            right = np.where(is_leaf, node_ids, tree.children_right + offset)
+
+            # sklearn >= 1.4 stores class fractions and predicts them as they
+            # are; older versions store weighted counts and divide by their
+            # sum in predict_proba. Dividing fractions again can move the last
+            # bit, so normalise only trees that hold counts.
+            value = tree.value[:, 0, :n_classes].astype(np.float64)
+            totals = value.sum(axis=1)
+            if not np.allclose(totals[totals > 0], 1.0, rtol=0, atol=1e-9):
+                totals[totals == 0.0] = 1.0
+                value = value / totals[:, np.newaxis]
+
+            mgl = getattr(tree, "missing_go_to_left", None)
+            mgls.append(np.zeros(n, dtype=bool) if mgl is None
+                        else np.asarray(mgl, dtype=bool) & ~is_leaf)
+
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(left)
+            rights.append(right)
+            values.append(value)
+            covers.append(tree.weighted_n_node_samples)
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            value=np.concatenate(values),
+            roots=np.asarray(roots),
+            max_depth=max_depth,
+            classes=model.classes_,
+            missing_go_left=np.concatenate(mgls),
+            feature_names=getattr(model, "feature_names_in_", None),
+            n_features=model.n_features_in_,
+            cover=np.concatenate(covers),
+        )
+
+    def fingerprint(self):
+        """SHA-256 of the node arrays and classes, identifying this forest."""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for array in (self.feature, self.threshold, self.left, self.right,
+                          self.value, self.roots):
+                digest.update(np.ascontiguousarray(array).tobytes())
+            digest.update(repr([str(c) for c in self.classes_]).encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    # ------------------------------------------------------------------
+    # Inference
+    # ------------------------------------------------------------------
+
+    def _as_matrix(self, X):
+        """Return ``X`` as a C-contiguous float32 matrix in model column order."""
+        if hasattr(X, "columns") and self.feature_names is not None:
+            X = X[self.feature_names]
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(
+                f"Expected input with {self.n_features} features, got shape {X.shape}"
+            )
+        if np.isinf(X).any():
+            raise ValueError("Input contains infinity")
+        return np.ascontiguousarray(X)
+
+    def apply(self, X):
+        """Return the global leaf index reached in every tree, shape (n, n_trees)."""
+        X = self._as_matrix(X)
+        out = np.empty((X.shape[0], self.n_trees), dtype=np.intp)
+        for start in range(0, X.shape[0], BLOCK_ROWS):
+            block = X[start:start + BLOCK_ROWS]
+            out[start:start + len(block)] = self._apply_block(block).T
+        return out
+
+    def kernel(self):
+        """Slot-interleaved arrays used by the traversal loop, built on first use.
+
+        Node ``i`` owns slots ``2*i`` (left) and ``2*i + 1`` (right), so one
+        gather of ``child[slot + go_right]`` replaces a ``where`` over two
+        child arrays, and feature/threshold lookups reuse the same slot index.
+        """
+        if self._slots is None:
+            n_nodes = len(self.left)
+            index_dtype = np.int32 if 2 * n_nodes < np.iinfo(np.int32).max else np.intp
+            child = np.empty(2 * n_nodes, dtype=index_dtype)
+            child[0::2] = 2 * self.left
+            child[1::2] = 2 * self.right
+            is_leaf = self.left == np.arange(n_nodes)
+            mgl = (np.zeros(n_nodes, dtype=bool)
+                   if self.missing_go_left is None else self.missing_go_left)
+            self._slots = {
+                "index_dtype": index_dtype,
+                "feature": np.repeat(self.feature, 2).astype(index_dtype),
+                "threshold": np.repeat(float32_floor(self.threshold), 2),
+                "child": child,
+                "is_leaf": np.repeat(is_leaf, 2),
+                "nan_right": np.repeat(~mgl & ~is_leaf, 2),
+            }
+        return self._slots
+
+    def _apply_block(self, X):
+        """Leaf index per (tree, row) for one block, shape (n_trees, n)."""
+        k = self.kernel()
+        index_dtype = k["index_dtype"]
+        n, n_features = X.shape
+        flat = X.ravel()
+        has_nan = np.isnan(flat).any()
+
+        # Tree-major layout: neighbouring entries walk the same tree, which
+        # keeps that tree's nodes hot in cache.
+        slot = np.repeat((2 * self.roots).astype(index_dtype), n)
+        row_base = np.tile(np.arange(0, n * n_features, n_features, dtype=index_dtype),
+                           self.n_trees)
+        position = np.arange(slot.size, dtype=np.intp)
+        out = np.empty(slot.size, dtype=index_dtype)
+
+        for depth in range(self.max_depth):
+            idx = k["feature"].take(slot, mode="clip")
+            idx += row_base
+            x = flat.take(idx, mode="clip")
+            go_right = x > k["threshold"].take(slot, mode="clip")
+            if has_nan:
+                nan = np.isnan(x)
+                go_right[nan] = k["nan_right"].take(slot[nan], mode="clip")
+            slot += go_right
+            slot = k["child"].take(slot, mode="clip")
+
+            # Periodically drop entries that already sit on a leaf; shallow
+            # paths then stop costing work on deeper levels. Compacting is
+            # only worth its own gathers once a tenth of the entries are done.
+            if depth % 2 == 1:
+                done = k["is_leaf"].take(slot, mode="clip")
+                n_done = np.count_nonzero(done)
+                if n_done and n_done >= 0.1 * slot.size:
+                    finished = np.flatnonzero(done)
+                    out[position.take(finished)] = slot.take(finished)
+                    keep = np.flatnonzero(~done)
+                    slot, row_base, position = (slot.take(keep), row_base.take(keep),
+                                                position.take(keep))
+                    if not slot.size:
+                        break
+        out[position] = slot
+        return (out >> 1).astype(np.intp).reshape(self.n_trees, n)
+
+    def predict_with_proba(self, X):
+        """Return ``(labels, proba)`` from a single pass over the forest."""
+        proba = self.predict_proba(X)
+        labels = self.classes_.take(np.argmax(proba, axis=1), axis=0)
+        return labels, proba
+
+    def predict_proba(self, X):
+        """Mean of the per-tree leaf distributions, accumulated like sklearn."""
+        X = self._as_matrix(X)
+        proba = np.empty((X.shape[0], len(self.classes_)), dtype=np.float64)
+        for start in range(0, X.shape[0], BLOCK_ROWS):
+            block = X[start:start + BLOCK_ROWS]
+            leaves = self._apply_block(block)
+            # Add trees one at a time, the order sklearn uses; a pairwise
+            # ``sum`` over the tree axis can differ in the last bit.
+            acc = np.zeros((len(block), len(self.classes_)), dtype=np.float64)
+            for tree_leaves in leaves:
+                acc += self.value.take(tree_leaves, axis=0)
+            acc /= self.n_trees
+            proba[start:start + len(block)] = acc
+        return proba
+
+    def vote_share(self, X):
+        """Fraction of trees whose leaf favours each class, shape (n, n_classes).
+
+        A low share for the predicted class means the trees disagree even
+        when the averaged probability looks confident.
+        """
+        if self._leaf_class is None:
+            self._leaf_class = np.argmax(self.value, axis=1)
+        X = self._as_matrix(X)
+        classes = np.arange(len(self.classes_))
+        share = np.empty((X.shape[0], len(classes)), dtype=np.float64)
+        for start in range(0, X.shape[0], BLOCK_ROWS):
+            block = X[start:start + BLOCK_ROWS]
+            votes = self._leaf_class.take(self._apply_block(block))
+            share[start:start + len(block)] = (votes[:, :, np.newaxis] == classes).mean(axis=0)
+        return share
+
+    def predict(self, X):
+        """Predicted class labels."""
+        return self.predict_with_proba(X)[0]
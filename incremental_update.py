@@ -0,0 +1,237 @@
+"""
+Incremental model update
+========================
+
+Refreshes the trained forest from a batch of newly labelled events without
+rerunning the hyperparameter search. New trees are grown on the recent rows
+with the existing model's parameters and appended to the forest, and the
+oldest trees are retired so the forest never grows past ``max_trees``.
+The update is validated on a held-out slice of the new rows and only
+published when its weighted F1 is within ``tolerance`` of the current model.
+
+Usage:
+    python incremental_update.py new_events.csv --new-trees 50
+    python incremental_update.py new_events.parquet --time-column time --dry-run
+"""
+
+import argparse
+import copy
+import json
+import os
+import shutil
+import time
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+
+from forest_artifact import ARTIFACT_FILE, save_forest
+from forest_engine import FlatForest
+from predictor import ALERT_MAP, FEATURE_FILE, MODEL_FILE, ImpactPredictor, default_model_dir
+
+DEFAULT_NEW_TREES = 50
+DEFAULT_HOLDOUT = 0.2
+DEFAULT_TOLERANCE = 0.01
+UPDATE_REPORT_FILE = "update_report.json"
+
+# Alert name -> class code the training script uses
+ALERT_CODES = {alert: code for code, alert in ALERT_MAP.items()}
+
+
+def encode_labels(alerts, classes):
+    """Map alert names to the model's class labels (codes or names)."""
+    alerts = np.asarray(alerts).astype(str)
+    alerts = np.char.lower(np.char.strip(alerts))
+    if np.issubdtype(np.asarray(classes).dtype, np.number):
+        unknown = sorted(set(alerts) - set(ALERT_CODES))
+        if unknown:
+            raise ValueError(f"Unknown alert labels in new data: {unknown}")
+        return np.array([ALERT_CODES[a] for a in alerts])
+    return alerts
+
+
+def add_trees(model, X, y, n_new, max_trees=None, random_state=None):
+    """Copy of ``model`` with ``n_new`` trees grown on ``X``/``y`` appended.
+
+    The oldest trees are dropped first when the total would exceed
+    ``max_trees`` (default: the current forest size). New trees must see every
+    class the forest knows, otherwise their probability columns would not
+    line up with the old trees'.
+    """
+    missing = set(model.classes_.tolist()) - set(np.unique(y).tolist())
+    if missing:
+        raise ValueError(
+            f"New rows contain no examples of classes {sorted(missing)}; "
+            f"add older labelled rows so every class is present"
+        )
+    max_trees = max_trees or len(model.estimators_)
+    if n_new > max_trees:
+        raise ValueError(f"Cannot add {n_new} trees to a forest capped at {max_trees}")
+
+    params = model.get_params()
+    params.update(n_estimators=n_new, warm_start=False, oob_score=False,
+                  random_state=random_state, n_jobs=-1)
+    fresh = RandomForestClassifier(**params).fit(X, y)
+
+    updated = copy.copy(model)
+    kept = model.estimators_[max(0, len(model.estimators_) + n_new - max_trees):]
+    updated.estimators_ = list(kept) + list(fresh.estimators_)
+    updated.n_estimators = len(updated.estimators_)
+    # OOB results described the old trees and training rows
+    for attr in ('oob_score_', 'oob_decision_function_'):
+        if hasattr(updated, attr):
+            delattr(updated, attr)
+    return updated
+
+
+def evaluate(model, X, y):
+    # Same predictions as model.predict, without sklearn's per-tree overhead
+    pred = FlatForest.from_model(model).predict(X)
+    return {'accuracy': float(accuracy_score(y, pred)),
+            'f1_weighted': float(f1_score(y, pred, average='weighted'))}
+
+
+def split_holdout(X, y, holdout=DEFAULT_HOLDOUT, order=None, random_state=42):
+    """``(X_fit, X_hold, y_fit, y_hold)``.
+
+    With ``order`` (e.g. event times) the most recent rows are held out;
+    otherwise the split is random and stratified where class counts allow.
+    """
+    if order is not None:
+        idx = np.argsort(np.asarray(order), kind='stable')
+        cut = len(idx) - max(1, int(round(len(idx) * holdout)))
+        return X[idx[:cut]], X[idx[cut:]], y[idx[:cut]], y[idx[cut:]]
+    counts = np.unique(y, return_counts=True)[1]
+    stratify = y if counts.min() >= 2 else None
+    return train_test_split(X, y, test_size=holdout, stratify=stratify, random_state=random_state)
+
+
+def incremental_update(model, X_new, y_new, n_new=DEFAULT_NEW_TREES, max_trees=None,
+                       holdout=DEFAULT_HOLDOUT, tolerance=DEFAULT_TOLERANCE, order=None,
+                       random_state=42):
+    """Grow, validate and gate an update. Returns ``(updated_model, report)``."""
+    X_fit, X_hold, y_fit, y_hold = split_holdout(X_new, y_new, holdout, order, random_state)
+
+    start = time.perf_counter()
+    updated = add_trees(model, X_fit, y_fit, n_new, max_trees, random_state)
+    fit_seconds = time.perf_counter() - start
+
+    before = evaluate(model, X_hold, y_hold)
+    after = evaluate(updated, X_hold, y_hold)
+    accepted = after['f1_weighted'] >= before['f1_weighted'] - tolerance
+    report = {
+        'new_rows': int(len(y_new)),
+        'fit_rows': int(len(y_fit)),
+        'holdout_rows': int(len(y_hold)),
+        'trees_added': n_new,
+        'trees_retired': len(model.estimators_) + n_new - len(updated.estimators_),
+        'n_trees': len(updated.estimators_),
+        'fit_seconds': fit_seconds,
+        'holdout': {'current': before, 'updated': after},
+        'tolerance': tolerance,
+        'accepted': bool(accepted),
+    }
+    return updated, report
+
+
+def _replace(path, write):
+    """Write via ``write(tmp_path)`` and atomically swap it in, keeping a .previous copy."""
+    tmp_path = path + '.tmp'
+    write(tmp_path)
+    if os.path.exists(path):
+        shutil.copy2(path, path + '.previous')
+    os.replace(tmp_path, path)
+
+
+def publish(model, model_dir):
+    """Replace the pickle and memory-mapped artifact in ``model_dir``.
+
+    The files are swapped atomically, so running apps see either the old or
+    the new version. Returns the new ``model_version``.
+    """
+    feature_order = joblib.load(os.path.join(model_dir, FEATURE_FILE))
+    forest = FlatForest.from_model(model)
+    model_path = os.path.join(model_dir, MODEL_FILE)
+    _replace(model_path, lambda p: joblib.dump(model, p))
+    # Stamped with the swapped-in pickle, so loaders can tell the pair belongs together
+    _replace(os.path.join(model_dir, ARTIFACT_FILE),
+             lambda p: save_forest(forest, p, source=model_path))
+    return ImpactPredictor(forest, feature_order).model_version
+
+
+def _read_frame(path):
+    import pandas as pd
+
+    if path.lower().endswith(('.parquet', '.pq')):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add trees trained on new labelled events.")
+    parser.add_argument('data', help="CSV or Parquet with the feature columns and 'alert'")
+    parser.add_argument('--model-dir', default=None,
+                        help="directory holding earthquake_impact_rf.pkl and feature_order.pkl")
+    parser.add_argument('--new-trees', type=int, default=DEFAULT_NEW_TREES)
+    parser.add_argument('--max-trees', type=int, default=None,
+                        help="forest size cap; oldest trees are retired (default: current size)")
+    parser.add_argument('--holdout', type=float, default=DEFAULT_HOLDOUT,
+                        help="fraction of new rows kept aside for validation")
+    parser.add_argument('--time-column', default=None,
+                        help="hold out the most recent rows by this column instead of a random slice")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="weighted-F1 drop on the holdout allowed before the update is rejected")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--dry-run', action='store_true', help="validate but do not publish")
+    args = parser.parse_args(argv)
+
+    model_dir = args.model_dir or default_model_dir()
+    model = joblib.load(os.path.join(model_dir, MODEL_FILE))
+    feature_order = joblib.load(os.path.join(model_dir, FEATURE_FILE))
+    current_version = ImpactPredictor.from_model(model, feature_order).model_version
+
+    df = _read_frame(args.data)
+    # Columns in the order the forest was fitted with
+    columns = list(getattr(model, 'feature_names_in_', feature_order))
+    X_new = df[columns].to_numpy(dtype=np.float64)
+    y_new = encode_labels(df['alert'], model.classes_)
+    order = df[args.time_column].to_numpy() if args.time_column else None
+
+    try:
+        updated, report = incremental_update(
+            model, X_new, y_new, n_new=args.new_trees, max_trees=args.max_trees,
+            holdout=args.holdout, tolerance=args.tolerance, order=order, random_state=args.seed,
+        )
+    except ValueError as e:
+        raise SystemExit(f"Update failed: {e}")
+
+    before, after = report['holdout']['current'], report['holdout']['updated']
+    print(f"Grew {report['trees_added']} trees on {report['fit_rows']:,} rows in "
+          f"{report['fit_seconds']:.1f}s, retired {report['trees_retired']} "
+          f"({report['n_trees']} trees total)")
+    print(f"Holdout F1 on {report['holdout_rows']:,} rows: {after['f1_weighted']:.4f} "
+          f"(current model {before['f1_weighted']:.4f})")
+
+    report['previous_version'] = current_version
+    if not report['accepted']:
+        print(f"Update rejected: F1 dropped by more than {args.tolerance}")
+    elif args.dry_run:
+        print("Dry run: update not published")
+    else:
+        report['version'] = publish(updated, model_dir)
+        print(f"Published model version {report['version']} (was {current_version})")
+        print("Note: compacted or quantized artifacts still describe the previous model")
+        print("Note: the model card now describes the previous model; rebuild it with: "
+              "python model_card.py <holdout file>")
+        print("Deploy it to running apps with: python model_registry.py publish --activate")
+
+    with open(os.path.join(model_dir, UPDATE_REPORT_FILE), 'w') as f:
+        json.dump(report, f, indent=2)
+    if not report['accepted']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+Model card
+==========
+
+A compact JSON summary of how the trained forest performs on held-out data,
+written by ``train_model.py`` next to the model files:
+
+* accuracy and weighted F1 with bootstrap 95% intervals,
+* per-class precision, recall and F1 (with intervals) and support,
+* the confusion matrix,
+* calibration bins of the winning-class probability, with expected
+  calibration error,
+* accuracy by tree-vote agreement, so a single prediction's agreement can be
+  read against how often such predictions were right,
+* the out-of-bag score.
+
+The card is keyed on ``model_version``, so the app can tell a stale card
+from the one describing the model it serves. All numbers are computed at
+training time; the app only looks them up.
+
+Usage:
+    python model_card.py holdout.csv
+    python model_card.py holdout.parquet --bootstrap 1000
+"""
+
+import argparse
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+
+from predictor import FEATURE_FILE, MODEL_FILE, ImpactPredictor, default_model_dir, label_to_alert
+
+MODEL_CARD_FILE = "model_card.json"
+DEFAULT_BOOTSTRAP = 500
+DEFAULT_BINS = 10
+CONFIDENCE_LEVEL = 0.95
+
+# Resamples per parallel task
+_BOOTSTRAP_CHUNK = 50
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+def confusion(y_true, y_pred, n_classes):
+    """Confusion counts, rows = true class column, columns = predicted."""
+    return np.bincount(y_true * n_classes + y_pred,
+                       minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+
+
+def scores_from_confusion(matrix):
+    """Accuracy, weighted F1 and per-class precision/recall/F1 from counts."""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    tp = np.diag(matrix)
+    support = matrix.sum(axis=1)
+    predicted = matrix.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, tp / predicted, 0.0)
+        recall = np.where(support > 0, tp / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    total = matrix.sum()
+    return {
+        'accuracy': tp.sum() / total,
+        'f1_weighted': (f1 * support).sum() / total,
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+    }
+
+
+def _bootstrap_chunk(y_true, y_pred, n_classes, seed, n_resamples):
+    rng = np.random.default_rng(seed)
+    n = len(y_true)
+    results = []
+    for _ in range(n_resamples):
+        rows = rng.integers(0, n, n)
+        results.append(scores_from_confusion(confusion(y_true[rows], y_pred[rows], n_classes)))
+    return results
+
+
+def bootstrap_scores(y_true, y_pred, n_classes, n_bootstrap=DEFAULT_BOOTSTRAP,
+                     random_state=42, n_jobs=-1):
+    """Bootstrap distribution of every score, resampling rows in parallel.
+
+    Returns ``{score: array}`` with one entry (or row of per-class values)
+    per resample.
+    """
+    from joblib import Parallel, delayed
+
+    seeds = np.random.SeedSequence(random_state).spawn(-(-n_bootstrap // _BOOTSTRAP_CHUNK))
+    sizes = [min(_BOOTSTRAP_CHUNK, n_bootstrap - i * _BOOTSTRAP_CHUNK) for i in range(len(seeds))]
+    chunks = Parallel(n_jobs=n_jobs)(
+        delayed(_bootstrap_chunk)(y_true, y_pred, n_classes, seed, size)
+        for seed, size in zip(seeds, sizes)
+    )
+    results = [r for chunk in chunks for r in chunk]
+    return {name: np.array([r[name] for r in results]) for name in results[0]}
+
+
+def _interval(samples):
+    tail = (1 - CONFIDENCE_LEVEL) / 2 * 100
+    lo, hi = np.percentile(samples, [tail, 100 - tail], axis=0)
+    return lo, hi
+
+
+def _estimate(value, lo, hi):
+    return {'value': float(value), 'ci': [float(lo), float(hi)]}
+
+
+def reliability_bins(score, correct, n_bins=DEFAULT_BINS):
+    """Equal-width bins over [0, 1] of ``score`` with the accuracy in each."""
+    edges = np.linspace(0.0, 1.0, n_bins + 1)
+    index = np.clip(np.searchsorted(edges, score, side='right') - 1, 0, n_bins - 1)
+    bins = []
+    for i in range(n_bins):
+        inside = index == i
+        count = int(inside.sum())
+        bins.append({
+            'lower': float(edges[i]),
+            'upper': float(edges[i + 1]),
+            'count': count,
+            'mean': float(score[inside].mean()) if count else None,
+            'accuracy': float(correct[inside].mean()) if count else None,
+        })
+    return bins
+
+
+def expected_calibration_error(bins, n_rows):
+    return float(sum(b['count'] / n_rows * abs(b['accuracy'] - b['mean'])
+                     for b in bins if b['count']))
+
+
+def oob_accuracy(model, forest, X_train, y_train, chunk_rows=2000):
+    """Out-of-bag accuracy, from the model if it kept one or from its bootstrap draws."""
+    if hasattr(model, 'oob_score_'):
+        return float(model.oob_score_)
+    from compaction import oob_mask
+
+    mask = oob_mask(model, len(X_train))
+    if mask is None:
+        return None
+    X_train = np.asarray(X_train, dtype=np.float32)
+    y_train = np.asarray(y_train)
+    correct = voted = 0
+    for start in range(0, len(X_train), chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        votes = (forest.value[forest.apply(X_train[rows])] * mask[rows, :, np.newaxis]).sum(axis=1)
+        seen = mask[rows].any(axis=1)
+        pred = forest.classes_[np.argmax(votes[seen], axis=1)]
+        correct += int((pred == y_train[rows][seen]).sum())
+        voted += int(seen.sum())
+    return correct / voted if voted else None
+
+
+# ============================================================================
+# CARD
+# ============================================================================
+
+def build_model_card(model, feature_order, X_test, y_test, X_train=None, y_train=None,
+                     n_bootstrap=DEFAULT_BOOTSTRAP, n_bins=DEFAULT_BINS, random_state=42,
+                     n_jobs=-1):
+    """Evaluate ``model`` on the held-out rows and return the card as a dict.
+
+    ``X_test``/``X_train`` hold the fitted feature columns; labels are the
+    model's class labels. OOB is only computed when training rows are given
+    or the model stored ``oob_score_``.
+    """
+    start = time.perf_counter()
+    predictor = ImpactPredictor.from_model(model, feature_order)
+    forest = predictor.engine
+    columns = list(getattr(model, 'feature_names_in_', feature_order))
+    X = np.asarray(X_test[columns] if hasattr(X_test, 'columns') else X_test, dtype=np.float32)
+    classes = list(forest.classes_)
+    class_index = {c: i for i, c in enumerate(classes)}
+    y_true = np.array([class_index[c] for c in np.asarray(y_test).tolist()])
+
+    proba = forest.predict_proba(X)
+    y_pred = np.argmax(proba, axis=1)
+    confidence = proba[np.arange(len(y_pred)), y_pred]
+    agreement = forest.vote_share(X)[np.arange(len(y_pred)), y_pred]
+    correct = (y_pred == y_true).astype(np.float64)
+
+    n_classes = len(classes)
+    matrix = confusion(y_true, y_pred, n_classes)
+    point = scores_from_confusion(matrix)
+    samples = bootstrap_scores(y_true, y_pred, n_classes, n_bootstrap, random_state, n_jobs)
+    intervals = {name: _interval(values) for name, values in samples.items()}
+
+    names = [label_to_alert(c) or str(c) for c in classes]
+    per_class = {}
+    for i, name in enumerate(names):
+        per_class[name] = {
+            metric: _estimate(point[metric][i], intervals[metric][0][i], intervals[metric][1][i])
+            for metric in ('precision', 'recall', 'f1')
+        }
+        per_class[name]['support'] = int(matrix[i].sum())
+
+    calibration = reliability_bins(confidence, correct, n_bins)
+    oob = None
+    if X_train is not None and y_train is not None:
+        X_fit = X_train[columns] if hasattr(X_train, 'columns') else X_train
+        oob = oob_accuracy(model, forest, X_fit, y_train)
+    elif hasattr(model, 'oob_score_'):
+        oob = float(model.oob_score_)
+
+    return {
+        'model_version': predictor.model_version,
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        'n_test': int(len(y_true)),
+        'n_train': None if y_train is None else int(len(y_train)),
+        'n_trees': forest.n_trees,
+        'n_bootstrap': int(n_bootstrap),
+        'confidence_level': CONFIDENCE_LEVEL,
+        'classes': names,
+        'accuracy': _estimate(point['accuracy'], *intervals['accuracy']),
+        'f1_weighted': _estimate(point['f1_weighted'], *intervals['f1_weighted']),
+        'per_class': per_class,
+        'confusion_matrix': matrix.tolist(),
+        'calibration': {
+            'bins': calibration,
+            'expected_calibration_error': expected_calibration_error(calibration, len(y_true)),
+        },
+        'agreement': {'bins': reliability_bins(agreement, correct, n_bins)},
+        'oob_score': oob,
+        'build_seconds': time.perf_counter() - start,
+    }
+
+
+def save_model_card(card, path):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(card, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_model_card(model_dir=None, model_version=None):
+    """Card in ``model_dir``, or None when missing or describing another model."""
+    path = os.path.join(model_dir or default_model_dir(), MODEL_CARD_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        card = json.load(f)
+    if model_version is not None and card.get('model_version') != model_version:
+        return None
+    return card
+
+
+def bin_for(bins, score):
+    """The bin of a ``reliability_bins`` list that ``score`` falls in."""
+    for b in bins:
+        if b['lower'] <= score < b['upper'] or (score >= 1.0 and b['upper'] >= 1.0):
+            return b
+    return None
+
+
+def print_model_card(card):
+    acc, f1 = card['accuracy'], card['f1_weighted']
+    print(f"Test accuracy {acc['value']:.4f} (95% CI {acc['ci'][0]:.4f}-{acc['ci'][1]:.4f}), "
+          f"weighted F1 {f1['value']:.4f} (95% CI {f1['ci'][0]:.4f}-{f1['ci'][1]:.4f})")
+    for name, stats in card['per_class'].items():
+        print(f"  {name:<8} precision {stats['precision']['value']:.3f}  "
+              f"recall {stats['recall']['value']:.3f}  support {stats['support']}")
+    print(f"Expected calibration error: {card['calibration']['expected_calibration_error']:.4f}")
+    if card['oob_score'] is not None:
+        print(f"OOB accuracy: {card['oob_score']:.4f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the model card from a labelled holdout set.")
+    parser.add_argument('data', help="CSV or Parquet with the feature columns and 'alert'")
+    parser.add_argument('--model-dir', default=None,
+                        help="directory holding earthquake_impact_rf.pkl and feature_order.pkl")
+    parser.add_argument('--bootstrap', type=int, default=DEFAULT_BOOTSTRAP,
+                        help="bootstrap resamples for the confidence intervals")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    from incremental_update import _read_frame, encode_labels
+
+    model_dir = args.model_dir or default_model_dir()
+    model = joblib.load(os.path.join(model_dir, MODEL_FILE))
+    feature_order = joblib.load(os.path.join(model_dir, FEATURE_FILE))
+    df = _read_frame(args.data)
+    y = encode_labels(df['alert'], model.classes_)
+    card = build_model_card(model, feature_order, df, y, n_bootstrap=args.bootstrap,
+                            random_state=args.seed)
+    path = os.path.join(model_dir, MODEL_CARD_FILE)
+    save_model_card(card, path)
+    print_model_card(card)
+    print(f"Model card saved to: {path}")
+
+
+if __name__ == '__main__':
+    main()
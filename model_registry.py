@@ -0,0 +1,459 @@
+"""
+Versioned model registry
+========================
+
+Immutable model versions side by side, so a new forest can be deployed while
+the app and scoring service keep answering from the old one:
+
+    models/
+        registry.json        active version and activation history
+        d3ad0169c677af12/    earthquake_impact_rf.forest, feature_order.pkl,
+                             model_card.json (optional)
+
+A version directory is named after the predictor's ``model_version`` and is
+never modified once published; a version is written to a temporary directory
+and renamed into place, and ``registry.json`` is replaced atomically. A
+process that has a version memory-mapped therefore never sees its files
+change or disappear underneath it.
+
+``ModelRegistry`` is the in-process side. ``current()`` returns the active
+predictor without blocking. When ``registry.json`` names a new version, the
+registry loads it on a background thread, warms it with a sample batch
+(traversal kernel, pages of the memory map and optionally the attribution
+tables) and only then swaps it in with a single reference assignment.
+The version it replaced stays loaded, so ``rollback()`` is immediate, and
+older versions are dropped once the loaded set exceeds the memory budget.
+
+Usage:
+    python model_registry.py publish --activate
+    python model_registry.py list
+    python model_registry.py activate d3ad0169c677af12
+    python model_registry.py rollback
+    python model_registry.py prune --keep 3
+"""
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from forest_artifact import ARTIFACT_FILE, save_forest
+from predictor import FEATURE_FILE, ImpactPredictor, default_model_dir
+from stage_timing import TIMER
+
+REGISTRY_DIR = "models"
+REGISTRY_FILE = "registry.json"
+DEFAULT_MEMORY_BUDGET = 1 << 30
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_WARM_ROWS = 256
+
+# Copied into a version directory when present next to the model
+_OPTIONAL_FILES = ("model_card.json",)
+
+
+class RegistryError(Exception):
+    """Raised for unknown versions or a registry with nothing to serve."""
+
+
+def default_registry_dir():
+    return os.path.join(default_model_dir(), REGISTRY_DIR)
+
+
+# ============================================================================
+# ON-DISK REGISTRY
+# ============================================================================
+
+def read_registry(root):
+    """``{'active': version or None, 'history': [versions, oldest first]}``."""
+    path = os.path.join(root, REGISTRY_FILE)
+    if not os.path.exists(path):
+        return {'active': None, 'history': []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_registry(root, state):
+    path = os.path.join(root, REGISTRY_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def list_versions(root):
+    """Published version directories, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    versions = [name for name in os.listdir(root)
+                if not name.startswith('.') and os.path.isdir(os.path.join(root, name))]
+    return sorted(versions, key=lambda v: os.path.getmtime(os.path.join(root, v)))
+
+
+def version_dir(root, version):
+    path = os.path.join(root, version)
+    if not os.path.isdir(path):
+        raise RegistryError(f"Unknown model version {version!r} in {root}")
+    return path
+
+
+def publish(model_dir=None, root=None, activate=False):
+    """Copy the model files in ``model_dir`` into the registry as a new version.
+
+    The forest is stored as the memory-mapped artifact: copied when the
+    predictor was served from it, otherwise exported from the loaded pickle
+    (also when a stale artifact was skipped). Publishing a version that
+    already exists is a no-op. Returns the version.
+    """
+    model_dir = model_dir or default_model_dir()
+    root = root or os.path.join(model_dir, REGISTRY_DIR)
+    os.makedirs(root, exist_ok=True)
+
+    predictor = ImpactPredictor.load(model_dir)
+    version = predictor.model_version
+    target = os.path.join(root, version)
+    if not os.path.isdir(target):
+        staging = os.path.join(root, f".staging-{version}-{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        try:
+            # Only the file the predictor was actually served from names this
+            # version; a stale artifact next to a newer pickle must not be copied
+            if predictor.artifact_path is not None:
+                shutil.copy2(predictor.artifact_path, os.path.join(staging, ARTIFACT_FILE))
+            else:
+                save_forest(predictor.engine, os.path.join(staging, ARTIFACT_FILE))
+            shutil.copy2(os.path.join(model_dir, FEATURE_FILE), os.path.join(staging, FEATURE_FILE))
+            for name in _OPTIONAL_FILES:
+                if os.path.exists(os.path.join(model_dir, name)):
+                    shutil.copy2(os.path.join(model_dir, name), os.path.join(staging, name))
+            staged = ImpactPredictor.load(staging).model_version
+            if staged != version:
+                raise RegistryError(f"{staging} holds model {staged}, not {version}")
+            os.rename(staging, target)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+    if activate:
+        set_active(root, version)
+    return version
+
+
+def set_active(root, version):
+    """Point ``registry.json`` at ``version``; running registries pick it up."""
+    version_dir(root, version)
+    state = read_registry(root)
+    history = [v for v in state['history'] if v != version] + [version]
+    write_registry(root, {'active': version, 'history': history, 'updated_at': time.time()})
+
+
+def previous_version(root):
+    """The version active before the current one, or None."""
+    history = read_registry(root)['history']
+    return history[-2] if len(history) > 1 else None
+
+
+def prune(root, keep=3):
+    """Delete all but the ``keep`` most recently activated versions.
+
+    The active version and the rollback target are always kept. Processes
+    that still map a deleted version keep reading it until they close it.
+    """
+    history = read_registry(root)['history']
+    kept = set(history[-max(keep, 2):])
+    removed = []
+    for version in list_versions(root):
+        if version not in kept:
+            shutil.rmtree(os.path.join(root, version))
+            removed.append(version)
+    return removed
+
+
+# ============================================================================
+# IN-PROCESS REGISTRY
+# ============================================================================
+
+def predictor_nbytes(predictor):
+    """Bytes held by the predictor's forest arrays and attribution tables."""
+    engine = predictor.engine
+    arrays = [v for v in vars(engine).values() if isinstance(v, np.ndarray)]
+    kernel = getattr(engine, '_slots', None)
+    if isinstance(kernel, dict):
+        arrays += [v for v in kernel.values() if isinstance(v, np.ndarray)]
+    total = sum(a.nbytes for a in arrays)
+    if predictor._explainer is not None:
+        total += predictor._explainer.nbytes
+    return total
+
+
+def warm_up(predictor, rows=DEFAULT_WARM_ROWS, explainer=False, seed=0):
+    """Score a sample batch so the first real request finds everything hot.
+
+    Builds the traversal kernel, faults in the memory-mapped pages every
+    tree touches and, with ``explainer``, tabulates the attribution tables.
+    """
+    from sensitivity import FEATURE_RANGES
+
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.uniform(*FEATURE_RANGES[f], rows) for f in predictor.feature_order])
+    predictor.predict_batch(X)
+    if explainer:
+        try:
+            predictor.explain_batch(X[:1])
+        except ValueError:
+            pass
+
+
+class ModelRegistry:
+    """Serve the active version of a registry and hot swap to new ones.
+
+    ``fallback_dir`` holds the legacy flat model files; they are served when
+    the registry has no active version yet, so an app deployed before the
+    first ``publish`` keeps working.
+    """
+
+    def __init__(self, root=None, fallback_dir=None, memory_budget=DEFAULT_MEMORY_BUDGET,
+                 poll_interval=DEFAULT_POLL_INTERVAL, warm_rows=DEFAULT_WARM_ROWS,
+                 warm_explainer=False, artifact=None, verify=True):
+        self.root = root or default_registry_dir()
+        self.fallback_dir = fallback_dir
+        self.memory_budget = memory_budget
+        self.poll_interval = poll_interval
+        self.warm_rows = warm_rows
+        self.warm_explainer = warm_explainer
+        self.artifact = artifact
+        self.verify = verify
+
+        # version -> predictor, least recently active first
+        self._loaded = OrderedDict()
+        self._dirs = {}
+        self._lock = threading.Lock()
+        self._loading = None
+        self._failed = None
+        self._previous = None
+        self._next_poll = 0.0
+        self.last_error = None
+        self.swaps = 0
+
+        version = read_registry(self.root)['active']
+        if version is not None:
+            self._active = self._load(version)
+        elif fallback_dir is not None:
+            predictor = ImpactPredictor.load(fallback_dir, verify=verify, artifact=artifact)
+            warm_up(predictor, warm_rows, warm_explainer)
+            self._dirs[predictor.model_version] = fallback_dir
+            self._loaded[predictor.model_version] = predictor
+            self._active = predictor
+        else:
+            raise RegistryError(f"No active model version in {self.root}")
+
+    # ------------------------------------------------------------------
+    # Serving
+    # ------------------------------------------------------------------
+
+    def current(self):
+        """The active predictor. Never blocks on a load; at most once per
+        ``poll_interval`` it checks ``registry.json`` for a new version and
+        starts loading it in the background."""
+        if time.monotonic() >= self._next_poll:
+            self.poll()
+        return self._active
+
+    @property
+    def version(self):
+        return self._active.model_version
+
+    def model_dir(self, version=None):
+        """Directory holding the files of ``version`` (default: active)."""
+        version = version or self.version
+        if version in self._dirs:
+            return self._dirs[version]
+        return version_dir(self.root, version)
+
+    def poll(self):
+        """Start loading the version ``registry.json`` names if it is new."""
+        self._next_poll = time.monotonic() + self.poll_interval
+        try:
+            wanted = read_registry(self.root)['active']
+        except (OSError, ValueError) as e:
+            self.last_error = str(e)
+            return
+        # A version that failed to load is not retried until registry.json moves on
+        if wanted not in (None, self.version, self._loading, self._failed):
+            self.activate(wanted)
+
+    def activate(self, version, wait=False):
+        """Load, warm and swap to ``version`` on a background thread.
+
+        Already loaded versions swap immediately. With ``wait`` the call
+        returns once the swap happened (or raises the load error).
+        ``registry.json`` is not changed, so the next poll returns to the
+        version it names; use ``set_active`` to deploy.
+        """
+        with self._lock:
+            if version in self._loaded:
+                self._swap(self._loaded[version])
+                return
+            if self._loading is not None:
+                # The poll after the running load finishes picks up the newest target
+                self._next_poll = 0.0
+                return
+            self._loading = version
+        thread = threading.Thread(target=self._load_and_swap, args=(version,),
+                                  name=f"model-load-{version}", daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+            if self.version != version:
+                raise RegistryError(f"Could not activate {version}: {self.last_error}")
+
+    def rollback(self):
+        """Swap back to the version active before this one; returns it.
+
+        Also records it as active in ``registry.json``, so other processes
+        and later polls follow.
+        """
+        with self._lock:
+            previous = self._previous
+            if previous is None:
+                raise RegistryError("No previous version loaded to roll back to")
+            self._swap(previous)
+        if os.path.isdir(os.path.join(self.root, previous.model_version)):
+            set_active(self.root, previous.model_version)
+        return previous.model_version
+
+    def status(self):
+        """Active, previous and loaded versions with their memory use."""
+        with self._lock:
+            loaded = {v: predictor_nbytes(p) for v, p in self._loaded.items()}
+            previous = self._previous.model_version if self._previous is not None else None
+        return {
+            'active': self.version,
+            'previous': previous,
+            'loading': self._loading,
+            'loaded': loaded,
+            'loaded_bytes': sum(loaded.values()),
+            'memory_budget': self.memory_budget,
+            'swaps': self.swaps,
+            'last_error': self.last_error,
+        }
+
+    # ------------------------------------------------------------------
+    # Loading and eviction
+    # ------------------------------------------------------------------
+
+    def _load(self, version):
+        path = version_dir(self.root, version)
+        with TIMER.stage('registry.load'):
+            predictor = ImpactPredictor.load(path, verify=self.verify)
+        if predictor.model_version != version:
+            raise RegistryError(f"{path} holds model {predictor.model_version}, not {version}")
+        with TIMER.stage('registry.warm'):
+            warm_up(predictor, self.warm_rows, self.warm_explainer)
+        with self._lock:
+            self._dirs[version] = path
+            self._loaded[version] = predictor
+        return predictor
+
+    def _load_and_swap(self, version):
+        try:
+            predictor = self._load(version)
+        except Exception as e:
+            # Keep serving the current version
+            self.last_error = f"{version}: {e}"
+            self._failed = version
+            TIMER.increment('registry.load_errors')
+        else:
+            with self._lock:
+                self._swap(predictor)
+            self.last_error = self._failed = None
+        finally:
+            self._loading = None
+
+    def _swap(self, predictor):
+        """Make ``predictor`` active; caller holds the lock."""
+        if predictor is self._active:
+            return
+        self._previous = self._active
+        # A single reference assignment: readers see the old or the new one
+        self._active = predictor
+        self._loaded.move_to_end(predictor.model_version)
+        self.swaps += 1
+        TIMER.increment('registry.swaps')
+        self._evict()
+
+    def _evict(self):
+        """Drop the least recently active versions over the memory budget.
+
+        The active version is never dropped and the rollback target only when
+        it alone would break the budget.
+        """
+        protected = [self._active.model_version]
+        if self._previous is not None:
+            protected.append(self._previous.model_version)
+        sizes = {v: predictor_nbytes(p) for v, p in self._loaded.items()}
+        total = sum(sizes.values())
+        for version in list(self._loaded):
+            if total <= self.memory_budget:
+                break
+            if version in protected:
+                continue
+            total -= sizes[version]
+            del self._loaded[version]
+        if total > self.memory_budget and self._previous is not None \
+                and self._previous is not self._active:
+            del self._loaded[self._previous.model_version]
+            self._previous = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage versioned model deployments.")
+    parser.add_argument('--root', default=None,
+                        help=f"registry directory (default: {REGISTRY_DIR}/ next to this script)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    publish_cmd = commands.add_parser('publish', help="add the model files as a new version")
+    publish_cmd.add_argument('--model-dir', default=None,
+                             help="directory holding the trained model files")
+    publish_cmd.add_argument('--activate', action='store_true', help="make it the active version")
+    commands.add_parser('list', help="list versions, newest last")
+    activate_cmd = commands.add_parser('activate', help="make a published version active")
+    activate_cmd.add_argument('version')
+    commands.add_parser('rollback', help="reactivate the previous version")
+    prune_cmd = commands.add_parser('prune', help="delete old version directories")
+    prune_cmd.add_argument('--keep', type=int, default=3,
+                           help="most recently activated versions to keep")
+    args = parser.parse_args(argv)
+
+    root = args.root or default_registry_dir()
+    try:
+        if args.command == 'publish':
+            version = publish(args.model_dir, root, activate=args.activate)
+            print(f"Published model version {version}" + (" (active)" if args.activate else ""))
+        elif args.command == 'list':
+            state = read_registry(root)
+            for version in list_versions(root):
+                size = os.path.getsize(os.path.join(root, version, ARTIFACT_FILE))
+                marker = '*' if version == state['active'] else ' '
+                print(f"{marker} {version}  {size / 1e6:8.1f} MB")
+        elif args.command == 'activate':
+            set_active(root, args.version)
+            print(f"Active model version: {args.version}")
+        elif args.command == 'rollback':
+            version = previous_version(root)
+            if version is None:
+                raise RegistryError("No earlier version to roll back to")
+            set_active(root, version)
+            print(f"Rolled back to model version {version}")
+        else:
+            removed = prune(root, args.keep)
+            print(f"Removed {len(removed)} version(s): {', '.join(removed) or '-'}")
+    except RegistryError as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Process-pool batch scoring
+==========================
+
+Scores large batches on every core. Rows are cut into shards, each shard is
+scored by a worker process, and the results are stitched back together in
+input order, so ``ParallelScorer.predict_batch`` returns exactly what
+``ImpactPredictor.predict_batch`` would.
+
+Workers never unpickle their own copy of the model: they memory-map the
+predictor's ``.forest`` artifact read-only, so all of them share the same
+pages of the OS page cache. A predictor built from the pickle is written to a
+temporary artifact once for the pool's lifetime. Workers therefore always
+score with the flattened engine, not the sklearn estimator.
+
+Usage (measure scaling on generated rows):
+    python parallel_scoring.py --rows 2000000 --workers 1 2 4 8 16 32
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from predictor import ImpactPredictor
+
+DEFAULT_SHARD_ROWS = 50_000
+
+# Set in each worker by _init_worker
+_worker_predictor = None
+
+
+def _init_worker(artifact_path, feature_order):
+    global _worker_predictor
+    from forest_artifact import load_forest
+
+    # The parent already verified the file; workers only map it
+    _worker_predictor = ImpactPredictor(load_forest(artifact_path, verify=False), feature_order)
+
+
+def _score_shard(X, explain):
+    alerts, confidence, proba = _worker_predictor.predict_batch(X)
+    if explain:
+        return alerts, confidence, proba, _worker_predictor.explain_batch(X)
+    return alerts, confidence, proba, None
+
+
+class _PendingBatch:
+    """Shard futures of one submitted batch; ``result()`` joins them in order."""
+
+    def __init__(self, futures):
+        self._futures = futures
+
+    def result(self):
+        parts = [future.result() for future in self._futures]
+        alerts = np.concatenate([p[0] for p in parts])
+        confidence = np.concatenate([p[1] for p in parts])
+        proba = np.concatenate([p[2] for p in parts])
+        if parts[0][3] is None:
+            return alerts, confidence, proba, None
+        contributions = np.concatenate([p[3][0] for p in parts])
+        base = np.concatenate([p[3][1] for p in parts])
+        return alerts, confidence, proba, (contributions, base)
+
+
+class ParallelScorer:
+    """``predict_batch``/``explain_batch`` of ``predictor`` over a pool of processes.
+
+    ``shard_rows`` caps the rows sent to a worker at a time; batches smaller
+    than ``workers * shard_rows`` are split evenly so every worker gets a
+    share. Use as a context manager or call ``close()``.
+    """
+
+    def __init__(self, predictor, workers=None, shard_rows=DEFAULT_SHARD_ROWS):
+        if shard_rows <= 0:
+            raise ValueError("shard_rows must be positive")
+        self.predictor = predictor
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_rows = shard_rows
+        self._tmp_dir = None
+
+        artifact_path = predictor.artifact_path
+        if artifact_path is None:
+            from forest_artifact import ARTIFACT_FILE, save_forest
+
+            self._tmp_dir = tempfile.mkdtemp(prefix="impactsense-")
+            artifact_path = os.path.join(self._tmp_dir, ARTIFACT_FILE)
+            save_forest(predictor.engine, artifact_path)
+        # Spawned rather than forked: the parent may be running threads
+        self._pool = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(artifact_path, predictor.feature_order),
+        )
+
+    # Same surface as ImpactPredictor for score_catalog
+    @property
+    def feature_order(self):
+        return self.predictor.feature_order
+
+    @property
+    def class_alerts(self):
+        return self.predictor.class_alerts
+
+    @property
+    def engine(self):
+        return self.predictor.engine
+
+    def shards(self, n_rows):
+        """``(start, stop)`` row ranges ``n_rows`` is cut into."""
+        size = min(self.shard_rows, max(-(-n_rows // self.workers), 1))
+        return [(start, min(start + size, n_rows)) for start in range(0, n_rows, size)]
+
+    def submit(self, X, explain=False):
+        """Queue ``X`` for scoring without waiting; ``.result()`` on the
+        return value gives ``(alerts, confidence, proba, explanation)``."""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(self.feature_order))
+        if len(X) == 0:
+            raise ValueError("Nothing to score")
+        return _PendingBatch([self._pool.submit(_score_shard, X[start:stop], explain)
+                              for start, stop in self.shards(len(X))])
+
+    def predict_batch(self, X):
+        """Same as ``ImpactPredictor.predict_batch``, scored across the pool."""
+        return self.submit(X).result()[:3]
+
+    def explain_batch(self, X):
+        """Same as ``ImpactPredictor.explain_batch``, computed across the pool.
+
+        Rows are grouped differently than in one process, so values can
+        differ in the last float32 digits.
+        """
+        return self.submit(X, explain=True).result()[3]
+
+    def warm_up(self):
+        """Start every worker and map the artifact before timing anything."""
+        self.submit(np.zeros((self.workers, len(self.feature_order)))).result()
+
+    def close(self):
+        self._pool.shutdown()
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def measure_scaling(predictor, X, worker_counts, shard_rows=DEFAULT_SHARD_ROWS, log=print):
+    """Rows per second and speedup over in-process scoring for each worker count.
+
+    Workers score with the flattened engine mapped from the artifact, never
+    the sklearn estimator, so the serial baseline uses that engine too even
+    when ``predictor`` was loaded from the pickle.
+    """
+    serial = ImpactPredictor(predictor.engine, predictor.feature_order)
+    start = time.perf_counter()
+    serial.predict_batch(X)
+    serial_rate = len(X) / (time.perf_counter() - start)
+    log(f"Serial baseline and workers both score with the {type(predictor.engine).__name__} engine")
+    log(f"{'workers':>8}{'rows/s':>14}{'speedup':>10}{'efficiency':>12}")
+    log(f"{'serial':>8}{serial_rate:>14,.0f}{1.0:>10.2f}{1.0:>12.0%}")
+    results = [{'workers': 0, 'rows_per_s': serial_rate, 'speedup': 1.0}]
+    for workers in worker_counts:
+        with ParallelScorer(predictor, workers, shard_rows) as scorer:
+            scorer.warm_up()
+            start = time.perf_counter()
+            scorer.predict_batch(X)
+            rate = len(X) / (time.perf_counter() - start)
+        speedup = rate / serial_rate
+        log(f"{workers:>8}{rate:>14,.0f}{speedup:>10.2f}{speedup / workers:>12.0%}")
+        results.append({'workers': workers, 'rows_per_s': rate, 'speedup': speedup})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure process-pool scoring throughput.")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="generated rows to score")
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help="worker counts to try (default: 1, 2, 4, ... up to the core count)")
+    parser.add_argument('--shard-rows', type=int, default=DEFAULT_SHARD_ROWS,
+                        help="maximum rows per worker task")
+    parser.add_argument('--model-dir', default=None,
+                        help="directory holding earthquake_impact_rf.pkl and feature_order.pkl")
+    args = parser.parse_args(argv)
+
+    from benchmark import sample_rows
+
+    cores = os.cpu_count() or 1
+    worker_counts = args.workers or sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+    predictor = ImpactPredictor.load(args.model_dir)
+    X = sample_rows(args.rows, predictor.feature_order)
+    print(f"Scoring {args.rows:,} rows on {cores} core(s)")
+    measure_scaling(predictor, X, worker_counts, args.shard_rows)
+
+
+if __name__ == '__main__':
+    main()
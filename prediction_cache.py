@@ -0,0 +1,155 @@
+"""
+Two-tier prediction cache
+=========================
+
+The app's widgets already quantize their inputs (step 0.1 for magnitude,
+depth, CDI and MMI, step 10 for significance), so the same few scenarios are
+scored over and over. ``PredictionCache`` keys results on the quantized
+five-tuple plus the model version and keeps them in
+
+* an in-process LRU dictionary, and
+* optionally a SQLite file shared by every worker process on the host.
+
+Inputs that do not sit exactly on the widget grid bypass the cache, so a
+cached answer is always the answer the forest would give.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from predictor import get_alert_info, get_recommendations
+
+# Widget step per feature; keys are integer multiples of these
+QUANTIZATION = {'magnitude': 0.1, 'depth': 0.1, 'cdi': 0.1, 'mmi': 0.1, 'sig': 10}
+
+
+class PredictionCache:
+    """LRU memory tier in front of an optional shared SQLite tier."""
+
+    def __init__(self, model_version, feature_order, max_entries=4096,
+                 db_path=None, max_db_entries=100_000):
+        self.model_version = model_version
+        self.steps = np.array([QUANTIZATION[f] for f in feature_order], dtype=np.float64)
+        self.max_entries = max_entries
+        self.max_db_entries = max_db_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0,
+                      'bypassed': 0, 'memory_evictions': 0, 'disk_evictions': 0}
+
+        self._db = None
+        self._db_writes = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False,
+                                       isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS predictions ('
+                ' model_version TEXT NOT NULL, key TEXT NOT NULL,'
+                ' result TEXT NOT NULL, last_used REAL NOT NULL,'
+                ' PRIMARY KEY (model_version, key))'
+            )
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions (last_used)'
+            )
+
+    def key(self, values):
+        """Quantized key for ``values``, or None when they are off the widget grid."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.shape != self.steps.shape or not np.isfinite(values).all():
+            return None
+        units = np.rint(values / self.steps)
+        # The forest sees float32 inputs, so equal float32 values score equally
+        if not np.array_equal(values.astype(np.float32), (units * self.steps).astype(np.float32)):
+            return None
+        return ','.join(str(int(u)) for u in units)
+
+    def get(self, key):
+        """Return the cached result for ``key`` or None."""
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return result
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT result FROM predictions WHERE model_version = ? AND key = ?',
+                    (self.model_version, key),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        'UPDATE predictions SET last_used = ? WHERE model_version = ? AND key = ?',
+                        (time.time(), self.model_version, key),
+                    )
+                    result = _from_record(json.loads(row[0]))
+                    self._remember(key, result)
+                    self.stats['disk_hits'] += 1
+                    return result
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, result):
+        with self._lock:
+            self._remember(key, result)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)',
+                    (self.model_version, key, json.dumps(_to_record(result)), time.time()),
+                )
+                self._db_writes += 1
+                if self._db_writes % 256 == 0:
+                    self._evict_disk()
+
+    def predict_one(self, predictor, values):
+        """``predictor.predict_one(values)`` served from the cache when possible."""
+        key = self.key(values)
+        if key is None:
+            with self._lock:
+                self.stats['bypassed'] += 1
+            return predictor.predict_one(values)
+        result = self.get(key)
+        if result is None:
+            result = predictor.predict_one(values)
+            self.put(key, result)
+        return result
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats['memory_evictions'] += 1
+
+    def _evict_disk(self):
+        # Runs every 256 writes, so the table may briefly exceed its budget
+        count = self._db.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+        excess = count - self.max_db_entries
+        if excess > 0:
+            self._db.execute(
+                'DELETE FROM predictions WHERE rowid IN '
+                '(SELECT rowid FROM predictions ORDER BY last_used LIMIT ?)',
+                (excess,),
+            )
+            self.stats['disk_evictions'] += excess
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def _to_record(result):
+    return {k: result[k] for k in ('alert', 'confidence', 'probabilities')}
+
+
+def _from_record(record):
+    record['info'] = get_alert_info(record['alert'])
+    record['recs'] = get_recommendations(record['alert'])
+    return record
@@ -0,0 +1,243 @@
+"""
+Score an earthquake catalog in fixed-size chunks
+================================================
+
+Reads a CSV or Parquet catalog chunk by chunk, projects the ``feature_order``
+columns, scores each chunk with ``ImpactPredictor`` and appends the alert,
+confidence and per-class probabilities to the output as it goes. Memory use
+is bounded by the chunk size, not the catalog size.
+
+With ``--explain`` every row also gets ``contrib_<feature>`` columns: the
+exact attribution of each feature to the winning class's probability, plus
+``contrib_base``, the class's average probability they start from.
+
+Parquet or Arrow IPC input written to Parquet or Arrow, and any job that
+reads or writes Arrow IPC, skips pandas altogether: record batches are scored
+from views of their column buffers and scores are appended as Arrow columns
+(see ``arrow_scoring.py``).
+
+With ``--workers`` each chunk is sharded across a pool of processes that
+share the memory-mapped model (see ``parallel_scoring.py``), and the next
+chunk is read while the current one is scored. Output rows keep input order.
+
+Usage:
+    python score_catalog.py events.csv scored.csv
+    python score_catalog.py events.parquet scored.parquet --chunk-size 500000
+    python score_catalog.py events.csv explained.csv --explain
+    python score_catalog.py events.parquet scored.parquet --workers 32 --chunk-size 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from predictor import ImpactPredictor
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Chunks submitted to a worker pool before the oldest is written out
+MAX_CHUNKS_IN_FLIGHT = 2
+
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in ('.parquet', '.pq')
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise SystemExit("Parquet input/output requires pyarrow: pip install pyarrow") from e
+
+
+def iter_chunks(path, columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield DataFrames of at most ``chunk_size`` rows holding ``columns``."""
+    if _is_parquet(path):
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+
+
+def score_frame(predictor, frame, keep_columns=(), explain=False):
+    """Score one chunk and return the output frame for it."""
+    X = frame[predictor.feature_order].to_numpy(dtype=np.float64)
+    alerts, confidence, proba = predictor.predict_batch(X)
+    explanation = predictor.explain_batch(X) if explain else None
+    return output_frame(predictor, frame, keep_columns, alerts, confidence, proba, explanation)
+
+
+def output_frame(predictor, frame, keep_columns, alerts, confidence, proba, explanation=None):
+    """Score columns for ``frame`` from already computed predictions."""
+    out = {c: frame[c].to_numpy() for c in keep_columns}
+    out['alert'] = alerts.astype(str)
+    out['confidence'] = confidence
+    for i, name in enumerate(predictor.class_alerts):
+        label = name if name is not None else str(predictor.engine.classes_[i])
+        out[f'prob_{label}'] = proba[:, i]
+    if explanation is not None:
+        contributions, base = explanation
+        out['contrib_base'] = base
+        for i, feature in enumerate(predictor.feature_order):
+            out[f'contrib_{feature}'] = contributions[:, i]
+    return pd.DataFrame(out, index=frame.index)
+
+
+class ChunkWriter:
+    """Append scored chunks to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = _is_parquet(path)
+        self._writer = None
+        self._wrote_header = False
+        if self.parquet:
+            _require_pyarrow()
+
+    def write(self, frame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='a' if self._wrote_header else 'w',
+                         header=not self._wrote_header, index=False)
+            self._wrote_header = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def check_keep_columns(predictor, keep_columns):
+    """Columns to copy through, minus the features; rejects score column names."""
+    keep_columns = [c for c in keep_columns if c not in predictor.feature_order]
+    clash = [c for c in keep_columns
+             if c in ('alert', 'confidence') or c.startswith(('prob_', 'contrib_'))]
+    if clash:
+        raise ValueError(f"Kept columns would overwrite score columns: {clash}")
+    return keep_columns
+
+
+def score_catalog(predictor, input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE,
+                  keep_columns=(), explain=False, log=sys.stderr, io='auto'):
+    """Score ``input_path`` into ``output_path``; returns ``(rows, seconds)``.
+
+    ``io='auto'`` goes through Arrow record batches (``arrow_scoring.py``)
+    when both files are Parquet/Arrow or either one is Arrow IPC, which only
+    that path reads and writes, and through pandas otherwise; ``'arrow'`` or
+    ``'pandas'`` forces one path.
+    """
+    from arrow_scoring import is_arrow_file, is_columnar, score_arrow_file
+
+    if io == 'auto':
+        columnar = is_columnar(input_path) and is_columnar(output_path)
+        arrow_ipc = is_arrow_file(input_path) or is_arrow_file(output_path)
+        io = 'arrow' if columnar or arrow_ipc else 'pandas'
+    if io == 'arrow':
+        return score_arrow_file(predictor, input_path, output_path, chunk_size,
+                                keep_columns, explain, log)
+    if is_arrow_file(input_path) or is_arrow_file(output_path):
+        raise ValueError("Arrow IPC files are only read and written by the Arrow path")
+    keep_columns = check_keep_columns(predictor, keep_columns)
+    columns = list(predictor.feature_order) + list(keep_columns)
+    writer = ChunkWriter(output_path)
+    rows = 0
+    start = time.perf_counter()
+    # A ParallelScorer takes chunks asynchronously; anything else scores in place
+    parallel = hasattr(predictor, 'submit')
+    pending = deque()
+
+    def write(frame):
+        nonlocal rows
+        writer.write(frame)
+        rows += len(frame)
+        elapsed = time.perf_counter() - start
+        if log is not None:
+            print(f"{rows:,} rows scored ({rows / max(elapsed, 1e-9):,.0f} rows/s)", file=log)
+
+    def write_oldest():
+        chunk, batch = pending.popleft()
+        alerts, confidence, proba, explanation = batch.result()
+        write(output_frame(predictor, chunk, keep_columns, alerts, confidence, proba, explanation))
+
+    try:
+        for chunk in iter_chunks(input_path, columns, chunk_size):
+            missing = [c for c in columns if c not in chunk.columns]
+            if missing:
+                raise KeyError(f"Input is missing columns: {missing}")
+            if not parallel:
+                write(score_frame(predictor, chunk, keep_columns, explain))
+                continue
+            X = chunk[predictor.feature_order].to_numpy(dtype=np.float64)
+            pending.append((chunk, predictor.submit(X, explain)))
+            if len(pending) >= MAX_CHUNKS_IN_FLIGHT:
+                write_oldest()
+        while pending:
+            write_oldest()
+    finally:
+        writer.close()
+    return rows, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score an earthquake catalog with the impact model.")
+    parser.add_argument('input', help="CSV or Parquet catalog with the feature_order columns")
+    parser.add_argument('output', help="CSV or Parquet file to write scores to")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"rows per chunk (default {DEFAULT_CHUNK_SIZE:,})")
+    parser.add_argument('--model-dir', default=None,
+                        help="directory holding earthquake_impact_rf.pkl and feature_order.pkl")
+    parser.add_argument('--keep', nargs='*', default=[],
+                        help="input columns to copy through to the output, e.g. an event id")
+    parser.add_argument('--explain', action='store_true',
+                        help="add exact per-feature attributions of the winning class")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="scoring processes; 0 uses every core (default 1: in-process)")
+    parser.add_argument('--shard-rows', type=int, default=None,
+                        help="maximum rows per worker task (default 50,000)")
+    parser.add_argument('--io', choices=('auto', 'arrow', 'pandas'), default='auto',
+                        help="read and write through Arrow record batches or pandas frames "
+                             "(default: Arrow when input and output are Parquet/Arrow "
+                             "or either is Arrow IPC)")
+    args = parser.parse_args(argv)
+
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be positive")
+
+    predictor = ImpactPredictor.load(args.model_dir)
+    if args.workers == 1:
+        rows, seconds = score_catalog(predictor, args.input, args.output,
+                                      chunk_size=args.chunk_size, keep_columns=args.keep,
+                                      explain=args.explain, io=args.io)
+    else:
+        from parallel_scoring import DEFAULT_SHARD_ROWS, ParallelScorer
+
+        with ParallelScorer(predictor, args.workers or None,
+                            args.shard_rows or DEFAULT_SHARD_ROWS) as scorer:
+            scorer.warm_up()
+            print(f"Scoring with {scorer.workers} worker processes", file=sys.stderr)
+            rows, seconds = score_catalog(scorer, args.input, args.output,
+                                          chunk_size=args.chunk_size, keep_columns=args.keep,
+                                          explain=args.explain, io=args.io)
+    print(f"Scored {rows:,} rows in {seconds:.2f}s "
+          f"({rows / max(seconds, 1e-9):,.0f} rows/s) -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
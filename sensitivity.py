@@ -0,0 +1,67 @@
+"""
+Per-parameter sensitivity sweeps
+================================
+
+Sweeps each feature across its input-widget range while holding the others
+at the current values, scores every sweep point in one batched probability
+call and reports per-feature class-probability curves plus the values where
+the predicted alert changes.
+"""
+
+import numpy as np
+
+# (min, max) of each Streamlit number_input in app.py
+FEATURE_RANGES = {
+    'magnitude': (1.0, 10.0),
+    'depth': (0.1, 700.0),
+    'cdi': (1.0, 10.0),
+    'mmi': (1.0, 12.0),
+    'sig': (-1000.0, 1000.0),
+}
+
+DEFAULT_POINTS = 60
+
+
+def sweep_grid(feature_order, base_values, points=DEFAULT_POINTS):
+    """Build the sweep matrix.
+
+    Returns ``(X, grids)`` where ``X`` stacks ``points`` rows per feature, in
+    ``feature_order`` order, and ``grids[f]`` holds the swept values of ``f``.
+    """
+    base = np.asarray(base_values, dtype=np.float64).ravel()
+    n_features = len(feature_order)
+    X = np.repeat(base[np.newaxis, :], n_features * points, axis=0)
+    grids = {}
+    for i, feature in enumerate(feature_order):
+        low, high = FEATURE_RANGES[feature]
+        grid = np.linspace(low, high, points)
+        X[i * points:(i + 1) * points, i] = grid
+        grids[feature] = grid
+    return X, grids
+
+
+def sensitivity_sweep(predictor, base_values, points=DEFAULT_POINTS):
+    """Score a full sweep in a single ``predict_batch`` call.
+
+    Returns ``{feature: {'values', 'proba', 'alerts', 'transitions'}}`` where
+    ``proba`` has one column per ``predictor.class_alerts`` entry and
+    ``transitions`` lists ``(value, from_alert, to_alert)`` change points.
+    """
+    X, grids = sweep_grid(predictor.feature_order, base_values, points)
+    alerts, _, proba = predictor.predict_batch(X)
+
+    result = {}
+    for i, feature in enumerate(predictor.feature_order):
+        rows = slice(i * points, (i + 1) * points)
+        feature_alerts = alerts[rows]
+        changes = np.flatnonzero(feature_alerts[1:] != feature_alerts[:-1]) + 1
+        result[feature] = {
+            'values': grids[feature],
+            'proba': proba[rows],
+            'alerts': feature_alerts,
+            'transitions': [
+                (float(grids[feature][j]), str(feature_alerts[j - 1]), str(feature_alerts[j]))
+                for j in changes
+            ],
+        }
+    return result
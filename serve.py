@@ -0,0 +1,281 @@
+"""
+Headless HTTP scoring service
+=============================
+
+Loads the model once with ``ImpactPredictor.load`` (the same artifacts the
+Streamlit app uses) and serves predictions over HTTP without any UI.
+Concurrent requests are gathered by a ``MicroBatcher`` into one vectorized
+forest call, bounded by a maximum batch size and a maximum wait.
+
+Endpoints:
+    GET  /health          model status and batching counters
+    GET  /metrics         stage timings and counters in Prometheus text format
+    POST /predict         {"magnitude": 5.8, "depth": 10.5, "cdi": 4.2, "mmi": 6.5, "sig": 450}
+    POST /predict/batch   {"events": [{...}, {...}]}
+
+Usage:
+    python serve.py --port 8080 --max-batch 256 --max-wait-ms 5 --timing
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from predictor import ImpactPredictor
+from stage_timing import TIMER
+
+
+class _Job:
+    """Rows submitted by one request and the slot its results land in."""
+
+    __slots__ = ('rows', 'done', 'result', 'error')
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Coalesce concurrent scoring requests into single ``predict_batch`` calls.
+
+    A worker thread takes the first queued job, then keeps collecting jobs
+    until ``max_batch`` rows are pending or ``max_wait`` seconds have passed
+    since the first one arrived, and scores them all at once.
+    """
+
+    def __init__(self, predictor, max_batch=256, max_wait=0.005):
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self.batches = 0
+        self.rows = 0
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, rows, timeout=None):
+        """Score ``rows`` (n x n_features) and return ``predict_batch`` output for them."""
+        job = _Job(np.asarray(rows, dtype=np.float64).reshape(-1, len(self.predictor.feature_order)))
+        self._queue.put(job)
+        if not job.done.wait(timeout):
+            raise TimeoutError("Prediction timed out")
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    @property
+    def queue_depth(self):
+        """Jobs waiting for the worker (approximate)."""
+        return self._queue.qsize()
+
+    def close(self):
+        self._stopped.set()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return []
+        jobs = [first]
+        pending = len(first.rows)
+        deadline = time.monotonic() + self.max_wait
+        while pending < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                self._stopped.set()
+                break
+            jobs.append(job)
+            pending += len(job.rows)
+        return jobs
+
+    def _run(self):
+        while not self._stopped.is_set():
+            jobs = self._collect()
+            if not jobs:
+                continue
+            try:
+                X = np.concatenate([job.rows for job in jobs]) if len(jobs) > 1 else jobs[0].rows
+                with TIMER.stage('serve.batch'):
+                    alerts, confidence, proba = self.predictor.predict_batch(X)
+            except Exception as e:
+                if len(jobs) == 1:
+                    jobs[0].error = e
+                    jobs[0].done.set()
+                else:
+                    # One bad request must not fail the others batched with it
+                    TIMER.increment('serve.batch_fallbacks')
+                    for job in jobs:
+                        self._score_alone(job)
+                continue
+            self.batches += 1
+            self.rows += len(X)
+            start = 0
+            for job in jobs:
+                end = start + len(job.rows)
+                job.result = (alerts[start:end], confidence[start:end], proba[start:end])
+                job.done.set()
+                start = end
+
+    def _score_alone(self, job):
+        try:
+            job.result = self.predictor.predict_batch(job.rows)
+            self.batches += 1
+            self.rows += len(job.rows)
+        except Exception as e:
+            job.error = e
+        job.done.set()
+
+
+def _event_row(event, feature_order):
+    try:
+        row = [float(event[f]) for f in feature_order]
+    except KeyError as e:
+        raise ValueError(f"Missing feature {e.args[0]!r}; expected {feature_order}") from None
+    except (TypeError, ValueError):
+        raise ValueError(f"Features must be numbers: {feature_order}") from None
+    # json.loads turns 1e400 into inf and accepts NaN/Infinity literals
+    for f, value in zip(feature_order, row):
+        if not np.isfinite(value):
+            raise ValueError(f"Feature {f!r} must be a finite number, got {value!r}")
+    return row
+
+
+def _format(predictor, alert, confidence, proba):
+    return {
+        'alert': str(alert),
+        'confidence': float(confidence),
+        'probabilities': {
+            a: float(p) for a, p in zip(predictor.class_alerts, proba) if a is not None
+        },
+    }
+
+
+class ScoringServer(ThreadingHTTPServer):
+    """Threaded HTTP server with a listen backlog sized for bursts of clients."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def make_handler(batcher, request_timeout=30.0):
+    """Build a request handler class bound to ``batcher``."""
+    predictor = batcher.predictor
+
+    class ScoringHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send(200, {
+                    'status': 'ok',
+                    'features': predictor.feature_order,
+                    'batches': batcher.batches,
+                    'rows': batcher.rows,
+                })
+            elif self.path == '/metrics':
+                body = TIMER.to_prometheus(gauges={
+                    'batches': batcher.batches,
+                    'batched_rows': batcher.rows,
+                    'queue_depth': batcher.queue_depth,
+                }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path not in ('/predict', '/predict/batch'):
+                self._send(404, {'error': 'not found'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                if self.path == '/predict':
+                    rows = [_event_row(payload, predictor.feature_order)]
+                else:
+                    events = payload.get('events') if isinstance(payload, dict) else None
+                    if not isinstance(events, list) or not events:
+                        raise ValueError("Body must be {\"events\": [ ... ]}")
+                    rows = [_event_row(e, predictor.feature_order) for e in events]
+            except (ValueError, AttributeError) as e:
+                self._send(400, {'error': str(e)})
+                return
+
+            try:
+                with TIMER.stage('serve.request'):
+                    alerts, confidence, proba = batcher.submit(rows, timeout=request_timeout)
+            except Exception as e:
+                self._send(500, {'error': str(e)})
+                return
+
+            results = [_format(predictor, *r) for r in zip(alerts, confidence, proba)]
+            if self.path == '/predict':
+                self._send(200, results[0])
+            else:
+                self._send(200, {'predictions': results})
+
+    return ScoringHandler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve earthquake impact predictions over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--model-dir', default=None,
+                        help="directory holding earthquake_impact_rf.pkl and feature_order.pkl")
+    parser.add_argument('--max-batch', type=int, default=256,
+                        help="maximum rows scored in one forest call")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0,
+                        help="how long to wait for more requests before scoring a batch")
+    parser.add_argument('--timing', action='store_true',
+                        help="record stage timings for /metrics (same as AI_IMPACTSENSE_TIMING=1)")
+    args = parser.parse_args(argv)
+
+    if args.timing:
+        TIMER.enable()
+    predictor = ImpactPredictor.load(args.model_dir)
+    batcher = MicroBatcher(predictor, max_batch=args.max_batch,
+                           max_wait=args.max_wait_ms / 1000.0)
+    server = ScoringServer((args.host, args.port), make_handler(batcher))
+    print(f"Serving AI-ImpactSense on http://{args.host}:{args.port} "
+          f"(max batch {args.max_batch}, max wait {args.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == '__main__':
+    main()
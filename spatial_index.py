@@ -0,0 +1,528 @@
+"""
+Zone index of scored events
+===========================
+
+A uniform latitude/longitude grid over scored events with located epicentres.
+Each cell stores its event count per alert level. Events are also kept sorted
+by cell, so the events of any one cell are a contiguous slice.
+
+Queries answer "how many events, and what is the highest predicted alert,
+within R km of this point" or "inside this bounding box":
+
+* Cells lying wholly inside the query area are summed from prefix-summed
+  counts: one subtraction per grid row for a radius and four lookups for a
+  box.
+* Only the cells the query boundary cuts through are scanned event by event
+  with an exact great-circle or box test.
+
+A query therefore costs O(rows spanned + events in boundary cells), however
+many events the index holds. Longitudes wrap at the antimeridian and boxes
+with ``west > east`` cross it. The cell size must divide 180 degrees, so the
+grid has no partial cells at the poles or the antimeridian.
+
+Usage:
+    python spatial_index.py build scored.parquet               # output of score_catalog.py --keep latitude longitude
+    python spatial_index.py build alerts.jsonl                 # output of event_stream.py
+    python spatial_index.py build events.csv --model-dir .     # unscored events are scored first
+    python spatial_index.py query --lat 35.7 --lon 139.7 --radius-km 250
+    python spatial_index.py query --bbox 30 129 46 146
+    python spatial_index.py bench --events 5000000
+"""
+
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+
+from synthetic_catalog import ALERT_ORDER
+
+ZONE_INDEX_FILE = "zone_index.npz"
+DEFAULT_CELL_DEG = 0.5
+EARTH_RADIUS_KM = 6371.0088
+
+ALERT_RANKS = {alert: rank for rank, alert in enumerate(ALERT_ORDER)}
+
+# Extra grids the benchmark self-check rebuilds and verifies
+CHECK_CELL_DEGS = (0.3, 1.5, 7.5)
+
+
+def grid_shape(cell_deg):
+    """``(n_rows, n_cols)`` of a ``cell_deg`` grid.
+
+    Raises ValueError unless the cell size divides 180 degrees: partial cells
+    at the poles and the antimeridian would break the wrap-around arithmetic.
+    """
+    cell_deg = float(cell_deg)
+    n_rows = round(180.0 / cell_deg) if cell_deg > 0 else 0
+    if n_rows < 1 or not math.isclose(n_rows * cell_deg, 180.0, rel_tol=1e-9):
+        raise ValueError(f"Cell size must divide 180 degrees (e.g. 0.25, 0.5, 1, 2.5), "
+                         f"got {cell_deg:g}")
+    return n_rows, 2 * n_rows
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; arguments in degrees, broadcast like NumPy."""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def alert_ranks(alerts):
+    """Alert names (or ranks already) as int8 severity ranks, green = 0."""
+    alerts = np.asarray(alerts)
+    if alerts.dtype.kind in 'iu':
+        return alerts.astype(np.int8)
+    lookup = np.vectorize(lambda a: ALERT_RANKS.get(a, -1), otypes=[np.int8])
+    ranks = lookup(alerts)
+    if (ranks < 0).any():
+        raise ValueError(f"Unknown alert levels: {sorted(set(alerts[ranks < 0]))}")
+    return ranks
+
+
+class ZoneIndex:
+    """Per-cell alert counts over a ``cell_deg`` grid plus the events by cell."""
+
+    def __init__(self, cell_deg, counts, offsets, latitude, longitude, rank):
+        self.cell_deg = float(cell_deg)
+        self.n_rows, self.n_cols = counts.shape[:2]
+        self.counts = counts
+        self._offsets = offsets
+        self._lat = latitude
+        self._lon = longitude
+        self._rank = rank
+        # Running sums along each row, then down the rows, with a leading zero
+        # row/column: any run of cells in a row, or any block of cells, is a
+        # difference of two or four lookups
+        self._row_prefix = np.zeros((self.n_rows, self.n_cols + 1, len(ALERT_ORDER)), np.int64)
+        np.cumsum(counts, axis=1, out=self._row_prefix[:, 1:])
+        self._table = np.zeros((self.n_rows + 1, self.n_cols + 1, len(ALERT_ORDER)), np.int64)
+        np.cumsum(self._row_prefix, axis=0, out=self._table[1:])
+
+    @classmethod
+    def build(cls, latitude, longitude, alerts, cell_deg=DEFAULT_CELL_DEG):
+        """Index events given their coordinates in degrees and predicted alerts."""
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        rank = alert_ranks(alerts)
+        located = np.isfinite(latitude) & np.isfinite(longitude)
+        if not located.all():
+            latitude, longitude, rank = latitude[located], longitude[located], rank[located]
+        # Normalise to [-180, 180)
+        longitude = (longitude + 180.0) % 360.0 - 180.0
+
+        n_rows, n_cols = grid_shape(cell_deg)
+        cells = _cell_ids(latitude, longitude, cell_deg, n_rows, n_cols)
+        order = np.argsort(cells, kind='stable')
+        cells = cells[order]
+        per_class = np.bincount(cells * len(ALERT_ORDER) + rank[order],
+                                minlength=n_rows * n_cols * len(ALERT_ORDER))
+        counts = per_class.reshape(n_rows, n_cols, len(ALERT_ORDER))
+        offsets = np.zeros(n_rows * n_cols + 1, dtype=np.int64)
+        np.cumsum(counts.sum(axis=2).ravel(), out=offsets[1:])
+        return cls(cell_deg, counts, offsets, latitude[order], longitude[order], rank[order])
+
+    def __len__(self):
+        return len(self._rank)
+
+    @property
+    def nbytes(self):
+        arrays = (self.counts, self._offsets, self._lat, self._lon, self._rank,
+                  self._row_prefix, self._table)
+        return sum(a.nbytes for a in arrays)
+
+    # ------------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------------
+
+    def within_radius(self, latitude, longitude, radius_km):
+        """Events within ``radius_km`` of a point: count, count per alert, highest alert."""
+        delta = radius_km / EARTH_RADIUS_KM
+        if delta >= math.pi:
+            return _summary(self._table[-1, -1])
+        cell = self.cell_deg
+        lat0, lon0 = float(latitude), (float(longitude) + 180.0) % 360.0 - 180.0
+        phi0 = math.radians(lat0)
+        delta_deg = math.degrees(delta)
+
+        r0 = max(int((lat0 - delta_deg + 90.0) // cell), 0)
+        r1 = min(int((lat0 + delta_deg + 90.0) // cell), self.n_rows - 1)
+        if abs(lat0) + delta_deg >= 90.0:
+            # The circle covers a pole, so every longitude
+            half_width = 180.0
+        else:
+            half_width = math.degrees(math.asin(min(math.sin(delta) / math.cos(phi0), 1.0)))
+        if half_width >= 180.0 - cell:
+            c0, c1 = 0, self.n_cols - 1
+        else:
+            c0 = int(math.floor((lon0 - half_width + 180.0) / cell))
+            c1 = int(math.floor((lon0 + half_width + 180.0) / cell))
+
+        # A cell lies inside the circle when its four corners do. Along each
+        # row edge the corners inside span +/- inner degrees of longitude.
+        rows = np.arange(r0, r1 + 1)
+        south = np.radians(rows * cell - 90.0)
+        north = np.radians(np.minimum((rows + 1) * cell - 90.0, 90.0))
+        inner = np.minimum(_half_width(phi0, south, delta), _half_width(phi0, north, delta))
+        full0 = np.ceil((lon0 - inner + 180.0) / cell).astype(np.int64)
+        full1 = np.floor((lon0 + inner + 180.0) / cell).astype(np.int64) - 1
+        full1 = np.minimum(full1, full0 + self.n_cols - 1)
+        whole_row = inner >= 180.0
+        full0[whole_row], full1[whole_row] = 0, self.n_cols - 1
+        full1 = np.maximum(full1, full0 - 1)
+        totals = self._row_runs(rows, full0, full1)
+
+        # Cells cut by the circle: in the bounding columns but not inside
+        columns = np.arange(c0, c1 + 1)
+        cut = (columns[None, :] - full0[:, None]) % self.n_cols >= (full1 - full0 + 1)[:, None]
+        cut_rows, cut_cols = np.nonzero(cut)
+        cells = rows[cut_rows] * self.n_cols + columns[cut_cols] % self.n_cols
+        index = self._events_in(cells)
+        if len(index):
+            near = haversine_km(lat0, lon0, self._lat[index], self._lon[index]) <= radius_km
+            totals = totals + np.bincount(self._rank[index[near]], minlength=len(ALERT_ORDER))
+        return _summary(totals)
+
+    def within_bbox(self, south, west, north, east):
+        """Events with ``south <= lat <= north`` and ``west <= lon <= east``.
+
+        ``west > east`` selects the box across the antimeridian.
+        """
+        if south > north:
+            raise ValueError("south must not exceed north")
+        west = (west + 180.0) % 360.0 - 180.0 if west != 180.0 else 180.0
+        east = (east + 180.0) % 360.0 - 180.0 if east != 180.0 else 180.0
+        if west > east:
+            totals = self._box(south, west, north, 180.0) + self._box(south, -180.0, north, east)
+        else:
+            totals = self._box(south, west, north, east)
+        return _summary(totals)
+
+    def cells(self, south, west, north, east):
+        """Non-empty cells overlapping a box (no antimeridian crossing):
+        centre latitude/longitude, event count and highest alert rank."""
+        r0, r1 = self._span(south, north, 90.0, self.n_rows)
+        c0, c1 = self._span(west, east, 180.0, self.n_cols)
+        block = self.counts[r0:r1 + 1, c0:c1 + 1]
+        count = block.sum(axis=2)
+        rows, cols = np.nonzero(count)
+        occupied = block[rows, cols] > 0
+        highest = len(ALERT_ORDER) - 1 - np.argmax(occupied[:, ::-1], axis=1)
+        return {
+            'latitude': (rows + r0 + 0.5) * self.cell_deg - 90.0,
+            'longitude': (cols + c0 + 0.5) * self.cell_deg - 180.0,
+            'count': count[rows, cols],
+            'max_rank': highest,
+        }
+
+    def summary(self):
+        return _summary(self._table[-1, -1])
+
+    # ------------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------------
+
+    def _span(self, low, high, origin, n):
+        first = min(max(int((low + origin) // self.cell_deg), 0), n - 1)
+        last = min(max(int((high + origin) // self.cell_deg), 0), n - 1)
+        return first, last
+
+    def _row_runs(self, rows, first, last):
+        """Per-class sums of cells ``first..last`` (may wrap) in each row."""
+        length = last - first + 1
+        start = first % self.n_cols
+        end = start + length
+        prefix = self._row_prefix
+        wraps = end > self.n_cols
+        head = prefix[rows, np.minimum(end, self.n_cols)] - prefix[rows, start]
+        tail = np.where(wraps[:, None], prefix[rows, np.maximum(end - self.n_cols, 0)], 0)
+        return (head + tail)[length > 0].sum(axis=0)
+
+    def _box(self, south, west, north, east):
+        """Per-class counts in a box that does not cross the antimeridian."""
+        cell = self.cell_deg
+        r0, r1 = self._span(south, north, 90.0, self.n_rows)
+        c0, c1 = self._span(west, east, 180.0, self.n_cols)
+        # Cells wholly inside the box
+        i0 = math.ceil((south + 90.0) / cell)
+        i1 = min(math.floor((north + 90.0) / cell), self.n_rows) - 1
+        j0 = math.ceil((west + 180.0) / cell)
+        j1 = min(math.floor((east + 180.0) / cell), self.n_cols) - 1
+        totals = np.zeros(len(ALERT_ORDER), dtype=np.int64)
+        if i0 <= i1 and j0 <= j1:
+            t = self._table
+            # Row prefix sums already cover columns, the table adds rows
+            totals += t[i1 + 1, j1 + 1] - t[i0, j1 + 1] - t[i1 + 1, j0] + t[i0, j0]
+        rows, cols = np.meshgrid(np.arange(r0, r1 + 1), np.arange(c0, c1 + 1), indexing='ij')
+        edge = ~((rows >= i0) & (rows <= i1) & (cols >= j0) & (cols <= j1))
+        index = self._events_in(rows[edge] * self.n_cols + cols[edge])
+        if len(index):
+            lat, lon = self._lat[index], self._lon[index]
+            inside = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+            totals += np.bincount(self._rank[index[inside]], minlength=len(ALERT_ORDER))
+        return totals
+
+    def _events_in(self, cells):
+        """Positions of the events in ``cells``, which are disjoint slices."""
+        starts = self._offsets[cells]
+        lengths = self._offsets[cells + 1] - starts
+        keep = lengths > 0
+        starts, lengths = starts[keep], lengths[keep]
+        if not len(lengths):
+            return np.empty(0, dtype=np.int64)
+        # Ranges concatenated without a Python loop
+        steps = np.ones(lengths.sum(), dtype=np.int64)
+        bounds = np.cumsum(lengths)[:-1]
+        steps[0] = starts[0]
+        steps[bounds] = starts[1:] - (starts[:-1] + lengths[:-1]) + 1
+        return np.cumsum(steps)
+
+    # ------------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------------
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, cell_deg=self.cell_deg, counts=self.counts, offsets=self._offsets,
+                 latitude=self._lat, longitude=self._lon, rank=self._rank)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(float(data['cell_deg']), data['counts'], data['offsets'],
+                       data['latitude'], data['longitude'], data['rank'])
+
+
+def _cell_ids(latitude, longitude, cell_deg, n_rows, n_cols):
+    rows = np.clip(((latitude + 90.0) // cell_deg).astype(np.int64), 0, n_rows - 1)
+    cols = np.clip(((longitude + 180.0) // cell_deg).astype(np.int64), 0, n_cols - 1)
+    return rows * n_cols + cols
+
+
+def _half_width(phi0, phi, delta):
+    """Degrees of longitude either side of the centre that lie within angular
+    distance ``delta`` at latitude ``phi`` (0 when none do, 180 when all do)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_dlon = (math.cos(delta) - math.sin(phi0) * np.sin(phi)) / (math.cos(phi0) * np.cos(phi))
+    # At a pole every longitude is the same point
+    at_pole = np.abs(np.cos(phi)) < 1e-12
+    pole_inside = np.abs(phi0 - phi) <= delta
+    cos_dlon = np.where(at_pole, np.where(pole_inside, -1.0, 2.0), cos_dlon)
+    width = np.degrees(np.arccos(np.clip(cos_dlon, -1.0, 1.0)))
+    return np.where(cos_dlon > 1.0, -1.0, width)
+
+
+def _summary(totals):
+    counts = {alert: int(n) for alert, n in zip(ALERT_ORDER, totals)}
+    present = [alert for alert in ALERT_ORDER if counts[alert]]
+    return {'count': int(sum(counts.values())), 'counts': counts,
+            'max_alert': present[-1] if present else None}
+
+
+# ============================================================================
+# BUILDING FROM FILES
+# ============================================================================
+
+def iter_scored(path, predictor=None, chunk_size=500_000):
+    """Yield ``(latitude, longitude, alerts)`` chunks from a file of events.
+
+    CSV and Parquet come from ``score_catalog.py`` (with ``--keep latitude
+    longitude``), JSON Lines from ``event_stream.py``. Files without an
+    ``alert`` column are scored with ``predictor`` first.
+    """
+    import pandas as pd
+
+    from score_catalog import iter_chunks
+
+    if path.lower().endswith(('.jsonl', '.json')):
+        chunks = pd.read_json(path, lines=True, chunksize=chunk_size)
+    else:
+        chunks = iter_chunks(path, None, chunk_size)
+    for frame in chunks:
+        missing = {'latitude', 'longitude'} - set(frame.columns)
+        if missing:
+            raise ValueError(f"{path} has no {' or '.join(sorted(missing))} column")
+        if 'alert' in frame.columns:
+            alerts = frame['alert'].to_numpy()
+        elif predictor is not None:
+            alerts, _, _ = predictor.predict_batch(frame[predictor.feature_order].to_numpy(np.float64))
+        else:
+            raise ValueError(f"{path} has no alert column; pass --model-dir to score it")
+        yield (frame['latitude'].to_numpy(np.float64), frame['longitude'].to_numpy(np.float64),
+               alert_ranks(alerts))
+
+
+def build_from_files(paths, cell_deg=DEFAULT_CELL_DEG, predictor=None):
+    parts = [chunk for path in paths for chunk in iter_scored(path, predictor)]
+    if not parts:
+        raise ValueError("No events to index")
+    latitude, longitude, ranks = (np.concatenate(columns) for columns in zip(*parts))
+    return ZoneIndex.build(latitude, longitude, ranks, cell_deg)
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+
+def synthetic_events(n, seed=42):
+    """Events clustered along a few belts plus uniform background, with ranks."""
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform([-60.0, -180.0], [70.0, 180.0], size=(40, 2))
+    clustered = int(n * 0.8)
+    pick = rng.integers(0, len(centres), clustered)
+    latitude = np.concatenate([centres[pick, 0] + rng.normal(0, 3.0, clustered),
+                               rng.uniform(-90.0, 90.0, n - clustered)])
+    longitude = np.concatenate([centres[pick, 1] + rng.normal(0, 3.0, clustered),
+                                rng.uniform(-180.0, 180.0, n - clustered)])
+    latitude = np.clip(latitude, -90.0, 90.0)
+    ranks = rng.choice(len(ALERT_ORDER), size=n, p=[0.7, 0.2, 0.08, 0.02]).astype(np.int8)
+    return latitude, longitude, ranks
+
+
+def benchmark(n_events, n_queries=1000, radius_km=200.0, cell_deg=DEFAULT_CELL_DEG,
+              seed=42, check=20, log=print):
+    """Build over synthetic events, time random radius/box queries and check
+    a sample of them against a full scan."""
+    latitude, longitude, ranks = synthetic_events(n_events, seed)
+    start = time.perf_counter()
+    index = ZoneIndex.build(latitude, longitude, ranks, cell_deg)
+    log(f"Indexed {n_events:,} events on a {cell_deg} degree grid in "
+        f"{time.perf_counter() - start:.2f} s ({index.nbytes / 1e6:.0f} MB)")
+
+    rng = np.random.default_rng(seed + 1)
+    points = np.column_stack([latitude, longitude])[rng.integers(0, n_events, n_queries)]
+    for name, query in (
+        ('radius', lambda p: index.within_radius(p[0], p[1], radius_km)),
+        ('bbox', lambda p: index.within_bbox(p[0] - 2, p[1] - 2, p[0] + 2, p[1] + 2)),
+    ):
+        query(points[0])
+        times = []
+        for point in points:
+            t = time.perf_counter()
+            query(point)
+            times.append(time.perf_counter() - t)
+        us = np.asarray(times) * 1e6
+        log(f"{name:>7}: p50 {np.percentile(us, 50):.0f} us, p99 {np.percentile(us, 99):.0f} us")
+
+    points = np.concatenate([points[:check], _edge_points(rng, check)])
+    _self_check(index, latitude, longitude, ranks, points, radius_km)
+    log(f"{len(points)} radius and box queries, {check} of them at the antimeridian "
+        f"or poles, match a full scan")
+
+    # Other cell sizes, on a subset so the full scans stay quick
+    subset = slice(0, min(n_events, 200_000))
+    for cell in CHECK_CELL_DEGS:
+        other = ZoneIndex.build(latitude[subset], longitude[subset], ranks[subset], cell)
+        _self_check(other, latitude[subset], longitude[subset], ranks[subset], points, radius_km)
+    for cell in (0.7, 7.0):
+        try:
+            ZoneIndex.build(latitude[:1], longitude[:1], ranks[:1], cell)
+        except ValueError:
+            continue
+        raise AssertionError(f"cell size {cell} does not divide 180 but was accepted")
+    log(f"Same queries match on {', '.join(map(str, CHECK_CELL_DEGS))} degree grids; "
+        f"cell sizes that do not divide 180 are rejected")
+    return index
+
+
+def _edge_points(rng, n):
+    """Query centres on and around the antimeridian and near the poles."""
+    longitude = rng.choice([-180.0, -179.9, 179.9, 180.0], n)
+    latitude = rng.uniform(-89.0, 89.0, n)
+    latitude[::4] = rng.choice([-89.9, 89.9], len(latitude[::4]))
+    return np.column_stack([latitude, longitude])
+
+
+def _self_check(index, latitude, longitude, ranks, points, radius_km):
+    """Compare radius and box queries at ``points`` against a full scan."""
+    for lat, lon in points:
+        got = index.within_radius(lat, lon, radius_km)
+        near = haversine_km(lat, lon, latitude, longitude) <= radius_km
+        expected = _summary(np.bincount(ranks[near], minlength=len(ALERT_ORDER)))
+        if got != expected:
+            raise AssertionError(f"radius query at {lat:.3f},{lon:.3f} on a {index.cell_deg:g} "
+                                 f"degree grid: {got} != {expected}")
+        south, north = max(lat - 2, -90.0), min(lat + 2, 90.0)
+        got = index.within_bbox(south, lon - 2, north, lon + 2)
+        wrapped = (longitude - (lon - 2)) % 360.0 <= 4.0
+        inside = (latitude >= south) & (latitude <= north) & wrapped
+        expected = _summary(np.bincount(ranks[inside], minlength=len(ALERT_ORDER)))
+        if got != expected:
+            raise AssertionError(f"bbox query at {lat:.3f},{lon:.3f} on a {index.cell_deg:g} "
+                                 f"degree grid: {got} != {expected}")
+
+
+def _print_result(result):
+    counts = ", ".join(f"{alert} {n:,}" for alert, n in result['counts'].items())
+    print(f"{result['count']:,} events ({counts}); highest alert: {result['max_alert'] or '-'}")
+
+
+def _cell_deg(text):
+    try:
+        grid_shape(float(text))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+    return float(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query the zone index of scored events.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="index scored (or scorable) event files")
+    build.add_argument('inputs', nargs='+', help="CSV, Parquet or JSON Lines files with latitude/longitude")
+    build.add_argument('--output', default=ZONE_INDEX_FILE)
+    build.add_argument('--cell-deg', type=_cell_deg, default=DEFAULT_CELL_DEG,
+                       help="grid cell size in degrees; must divide 180")
+    build.add_argument('--model-dir', default=None,
+                       help="score files without an alert column with this model")
+
+    query = commands.add_parser('query', help="count events around a point or in a box")
+    query.add_argument('--index', default=ZONE_INDEX_FILE)
+    query.add_argument('--lat', type=float)
+    query.add_argument('--lon', type=float)
+    query.add_argument('--radius-km', type=float, default=100.0)
+    query.add_argument('--bbox', type=float, nargs=4, metavar=('SOUTH', 'WEST', 'NORTH', 'EAST'))
+
+    bench = commands.add_parser('bench', help="time queries over synthetic events")
+    bench.add_argument('--events', type=int, default=1_000_000)
+    bench.add_argument('--queries', type=int, default=1000)
+    bench.add_argument('--radius-km', type=float, default=200.0)
+    bench.add_argument('--cell-deg', type=_cell_deg, default=DEFAULT_CELL_DEG)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        predictor = None
+        if args.model_dir is not None:
+            from predictor import ImpactPredictor
+
+            predictor = ImpactPredictor.load(args.model_dir)
+        start = time.perf_counter()
+        index = build_from_files(args.inputs, args.cell_deg, predictor)
+        index.save(args.output)
+        print(f"Indexed {len(index):,} located events in {time.perf_counter() - start:.1f} s "
+              f"-> {args.output}")
+        _print_result(index.summary())
+    elif args.command == 'query':
+        if not os.path.exists(args.index):
+            raise SystemExit(f"No zone index at {args.index}; run: python spatial_index.py build ...")
+        index = ZoneIndex.load(args.index)
+        start = time.perf_counter()
+        if args.bbox:
+            result = index.within_bbox(*args.bbox)
+        elif args.lat is not None and args.lon is not None:
+            result = index.within_radius(args.lat, args.lon, args.radius_km)
+        else:
+            parser.error("give --lat and --lon, or --bbox")
+        elapsed = time.perf_counter() - start
+        _print_result(result)
+        print(f"Query time: {elapsed * 1e6:.0f} us")
+    else:
+        benchmark(args.events, args.queries, args.radius_km, args.cell_deg)
+
+
+if __name__ == '__main__':
+    main()
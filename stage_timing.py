@@ -0,0 +1,184 @@
+"""
+Per-stage timing hooks
+======================
+
+A process-wide registry of named stage timings and counters. Each stage
+feeds a cumulative latency histogram (Prometheus-style buckets) plus a small
+window of recent samples for percentiles, and the whole registry can be
+rendered in Prometheus text exposition format.
+
+Timing is off unless ``AI_IMPACTSENSE_TIMING=1`` is set or ``TIMER.enable()``
+is called. While off, ``TIMER.stage(name)`` returns a shared no-op context
+manager, so a hook costs one method call and one attribute check.
+
+    with TIMER.stage("predictor.predict_proba"):
+        proba = engine.predict_proba(X)
+"""
+
+import bisect
+import contextlib
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Histogram upper bounds in seconds
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_SAMPLES = 1024
+
+_NULL = contextlib.nullcontext()
+
+
+class _Stage:
+    """Histogram, sum and recent samples for one stage."""
+
+    __slots__ = ('counts', 'count', 'total', 'recent')
+
+    def __init__(self, n_buckets):
+        self.counts = [0] * (n_buckets + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+
+class _Timing:
+    __slots__ = ('timer', 'name', 'start')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class StageTimer:
+    """Thread-safe stage latency histograms and counters."""
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def stage(self, name):
+        """Context manager timing the enclosed block as ``name``."""
+        if not self.enabled:
+            return _NULL
+        return _Timing(self, name)
+
+    def start(self):
+        """Start token for ``stop``; for stages that do not fit a ``with`` block."""
+        return time.perf_counter() if self.enabled else None
+
+    def stop(self, name, token):
+        if token is not None:
+            self.observe(name, time.perf_counter() - token)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = _Stage(len(self.buckets))
+            # Buckets are stored non-cumulative and summed on export
+            stage.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            stage.count += 1
+            stage.total += seconds
+            stage.recent.append(seconds)
+
+    def increment(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self):
+        """Per-stage summary rows, slowest total time first.
+
+        Percentiles are over the last ``RECENT_SAMPLES`` observations.
+        """
+        with self._lock:
+            stages = [(name, s.count, s.total, list(s.recent)) for name, s in self._stages.items()]
+            counters = dict(self._counters)
+        rows = []
+        for name, count, total, recent in stages:
+            ms = np.asarray(recent) * 1000
+            rows.append({
+                'stage': name,
+                'count': count,
+                'total_ms': total * 1000,
+                'mean_ms': total * 1000 / count,
+                'p50_ms': float(np.percentile(ms, 50)),
+                'p95_ms': float(np.percentile(ms, 95)),
+                'p99_ms': float(np.percentile(ms, 99)),
+            })
+        rows.sort(key=lambda r: r['total_ms'], reverse=True)
+        return rows, counters
+
+    def to_prometheus(self, prefix='impactsense', gauges=None):
+        """Registry in Prometheus text exposition format.
+
+        ``gauges`` adds point-in-time values such as cache sizes.
+        """
+        with self._lock:
+            stages = sorted((name, list(s.counts), s.count, s.total)
+                            for name, s in self._stages.items())
+            counters = sorted(self._counters.items())
+
+        metric = f'{prefix}_stage_duration_seconds'
+        lines = [f'# HELP {metric} Time spent in each instrumented stage.',
+                 f'# TYPE {metric} histogram']
+        for name, counts, count, total in stages:
+            label = _escape(name)
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{stage="{label}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{stage="{label}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{stage="{label}"}} {total:.9g}')
+            lines.append(f'{metric}_count{{stage="{label}"}} {count}')
+
+        if counters:
+            metric = f'{prefix}_events_total'
+            lines += [f'# HELP {metric} Counted events by name.', f'# TYPE {metric} counter']
+            lines += [f'{metric}{{event="{_escape(name)}"}} {value}' for name, value in counters]
+
+        for name, value in sorted((gauges or {}).items()):
+            metric = f'{prefix}_{name}'
+            lines += [f'# TYPE {metric} gauge', f'{metric} {value}']
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path, **kwargs):
+        """Atomically write ``to_prometheus()`` for a node_exporter textfile collector."""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus(**kwargs))
+        os.replace(tmp_path, path)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Shared by the app, predictor and service in this process
+TIMER = StageTimer(enabled=os.environ.get('AI_IMPACTSENSE_TIMING', '') not in ('', '0'))
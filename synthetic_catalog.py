@@ -0,0 +1,194 @@
+"""
+Synthetic earthquake catalog generator
+======================================
+
+Generates labelled events with the five model features using NumPy only, one
+chunk at a time, so catalogs of any size can be written to CSV or Parquet
+with bounded memory. Labels come from the same weighted risk score the
+training fallback always used, with optional Gaussian noise on the score and
+random label flips. A target class balance is met exactly per chunk by
+drawing candidate events until every class quota is filled.
+
+Output is reproducible for a given ``seed`` and ``chunk_size``.
+
+Usage:
+    python synthetic_catalog.py events.parquet --rows 5000000
+    python synthetic_catalog.py events.csv --rows 100000 --balance green=1,yellow=1,orange=1,red=1
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from score_catalog import DEFAULT_CHUNK_SIZE, ChunkWriter
+
+# Uniform range each feature is drawn from
+FEATURE_BOUNDS = {
+    'magnitude': (3.0, 9.0),
+    'depth': (5.0, 700.0),
+    'cdi': (1.0, 10.0),
+    'mmi': (1.0, 12.0),
+    'sig': (10.0, 1000.0),
+}
+
+# Alerts in increasing risk order and the risk score where each one ends
+ALERT_ORDER = ('green', 'yellow', 'orange', 'red')
+RISK_CUTS = (0.35, 0.55, 0.75)
+
+# Largest candidate pool drawn at once while filling class quotas
+MAX_POOL_ROWS = 2_000_000
+
+
+def risk_score(magnitude, depth, cdi, mmi, sig):
+    """Weighted 0-1 risk score; shallow, strong, widely felt events score high."""
+    return (magnitude / 9 * 0.35
+            + (1 - depth / 700) * 0.15
+            + cdi / 10 * 0.20
+            + mmi / 12 * 0.20
+            + sig / 1000 * 0.10)
+
+
+def _draw(rng, n, noise, label_noise):
+    """``n`` candidate events: feature columns plus an alert code per row."""
+    columns = {f: rng.uniform(low, high, n) for f, (low, high) in FEATURE_BOUNDS.items()}
+    risk = risk_score(**columns)
+    if noise:
+        risk = risk + rng.normal(0.0, noise, n)
+    codes = np.searchsorted(RISK_CUTS, risk, side='right')
+    if label_noise:
+        flip = rng.random(n) < label_noise
+        # Shift by 1..3 so a flipped label always lands on a different class
+        codes[flip] = (codes[flip] + rng.integers(1, len(ALERT_ORDER), flip.sum())) % len(ALERT_ORDER)
+    return columns, codes
+
+
+def _parse_balance(balance):
+    """Normalised class weights in ``ALERT_ORDER`` order, or None."""
+    if balance is None:
+        return None
+    unknown = set(balance) - set(ALERT_ORDER)
+    if unknown:
+        raise ValueError(f"Unknown alert classes in balance: {sorted(unknown)}")
+    weights = np.array([float(balance.get(a, 0.0)) for a in ALERT_ORDER])
+    if (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError("Class balance weights must be non-negative with a positive sum")
+    return weights / weights.sum()
+
+
+def generate_chunk(rng, n, balance=None, noise=0.0, label_noise=0.0):
+    """One DataFrame of ``n`` events with the feature columns and ``alert``.
+
+    Without ``balance`` classes fall where the risk score puts them. With it,
+    each class gets a multinomial quota and candidates are drawn in vectorized
+    pools, sized from the acceptance rate seen so far, until every quota is met.
+    """
+    weights = _parse_balance(balance)
+    if weights is None:
+        columns, codes = _draw(rng, n, noise, label_noise)
+    else:
+        needed = rng.multinomial(n, weights)
+        parts, part_codes = [], []
+        seen = np.zeros(len(ALERT_ORDER))
+        drawn = 0
+        while needed.any():
+            # Acceptance rate per class, floored so an unseen class still grows the pool
+            rate = np.maximum(seen / max(drawn, 1), 1e-4)
+            pool = int(min(MAX_POOL_ROWS, max(1024, 1.2 * (needed / rate).max())))
+            columns, codes = _draw(rng, pool, noise, label_noise)
+            seen += np.bincount(codes, minlength=len(ALERT_ORDER))
+            drawn += pool
+            take = np.zeros(pool, dtype=bool)
+            for c in np.flatnonzero(needed):
+                rows = np.flatnonzero(codes == c)[:needed[c]]
+                take[rows] = True
+                needed[c] -= len(rows)
+            parts.append({f: v[take] for f, v in columns.items()})
+            part_codes.append(codes[take])
+        order = rng.permutation(n)
+        columns = {f: np.concatenate([p[f] for p in parts])[order] for f in FEATURE_BOUNDS}
+        codes = np.concatenate(part_codes)[order]
+
+    frame = pd.DataFrame(columns)
+    frame['alert'] = np.asarray(ALERT_ORDER, dtype=object)[codes]
+    return frame
+
+
+def iter_catalog(rows, seed=42, chunk_size=DEFAULT_CHUNK_SIZE, balance=None,
+                 noise=0.0, label_noise=0.0):
+    """Yield DataFrames of at most ``chunk_size`` events, ``rows`` in total.
+
+    Each chunk has its own generator spawned from ``seed``.
+    """
+    n_chunks = -(-rows // chunk_size)
+    streams = np.random.SeedSequence(seed).spawn(n_chunks)
+    for i, stream in enumerate(streams):
+        n = min(chunk_size, rows - i * chunk_size)
+        yield generate_chunk(np.random.default_rng(stream), n, balance, noise, label_noise)
+
+
+def generate_catalog(rows, seed=42, balance=None, noise=0.0, label_noise=0.0,
+                     chunk_size=DEFAULT_CHUNK_SIZE):
+    """The whole catalog as one DataFrame; use ``write_catalog`` for large ones."""
+    chunks = iter_catalog(rows, seed, chunk_size, balance, noise, label_noise)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def write_catalog(path, rows, seed=42, chunk_size=DEFAULT_CHUNK_SIZE, balance=None,
+                  noise=0.0, label_noise=0.0, log=sys.stderr):
+    """Stream a catalog to a CSV or Parquet ``path``; returns ``(rows, seconds)``."""
+    writer = ChunkWriter(path)
+    written = 0
+    start = time.perf_counter()
+    try:
+        for chunk in iter_catalog(rows, seed, chunk_size, balance, noise, label_noise):
+            writer.write(chunk)
+            written += len(chunk)
+            if log is not None:
+                elapsed = time.perf_counter() - start
+                print(f"{written:,} rows written ({written / max(elapsed, 1e-9):,.0f} rows/s)",
+                      file=log)
+    finally:
+        writer.close()
+    return written, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic labelled earthquake catalog.")
+    parser.add_argument('output', help="CSV or Parquet file to write")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="number of events")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"rows generated and written at a time (default {DEFAULT_CHUNK_SIZE:,})")
+    parser.add_argument('--balance', default=None,
+                        help="class weights, e.g. green=1,yellow=1,orange=1,red=1 "
+                             "(default: whatever the risk score gives)")
+    parser.add_argument('--noise', type=float, default=0.0,
+                        help="std of Gaussian noise added to the risk score before labelling")
+    parser.add_argument('--label-noise', type=float, default=0.0,
+                        help="fraction of labels replaced with a different random class")
+    args = parser.parse_args(argv)
+
+    if args.rows <= 0 or args.chunk_size <= 0:
+        parser.error("--rows and --chunk-size must be positive")
+    if not 0.0 <= args.label_noise <= 1.0:
+        parser.error("--label-noise must be between 0 and 1")
+    balance = None
+    if args.balance:
+        try:
+            balance = {k.strip(): float(v) for k, v in
+                       (item.split('=') for item in args.balance.split(','))}
+        except ValueError:
+            parser.error("--balance must look like green=1,yellow=1,orange=1,red=1")
+
+    rows, seconds = write_catalog(args.output, args.rows, seed=args.seed,
+                                  chunk_size=args.chunk_size, balance=balance,
+                                  noise=args.noise, label_noise=args.label_noise)
+    print(f"Wrote {rows:,} events in {seconds:.2f}s "
+          f"({rows / max(seconds, 1e-9):,.0f} rows/s) -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
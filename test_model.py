@@ -18,3 +18,29 @@ if os.path.exists(model_path):
     features = joblib.load(feature_path)
     print(f"Features: {features}")
 
+
+    # The flattened engine must reproduce sklearn exactly
+    import numpy as np
+    from forest_engine import FlatForest
+
+    engine = FlatForest.from_model(model)
+    sample = np.array([[5.8, 10.5, 4.2, 6.5, 450.0]])
+    labels, proba = engine.predict_with_proba(sample)
+    print(f"Engine prediction: {labels[0]} (confidence {proba[0].max():.3f})")
+
+    # Many rows spanning the feature ranges, some with missing values, so a
+    # last-bit difference in any path or in the tree summation shows up
+    import warnings
+    ranges = {'magnitude': (1, 10), 'depth': (0, 700), 'cdi': (0, 10),
+              'mmi': (1, 12), 'sig': (0, 3000)}
+    rng = np.random.default_rng(0)
+    rows = np.column_stack([rng.uniform(*ranges.get(str(f), (0, 1000)), 20000)
+                            for f in model.feature_names_in_])
+    rows[::97, rng.integers(rows.shape[1])] = np.nan
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message='X does not have valid feature names')
+        expected = model.predict_proba(rows)
+    matches = np.array_equal(engine.predict_proba(rows), expected)
+    print(f"Engine matches sklearn on {len(rows)} rows: {matches}")
+    if not matches:
+        raise SystemExit("Engine probabilities differ from sklearn's predict_proba")
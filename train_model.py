@@ -4,100 +4,99 @@ Train and save the earthquake impact prediction model
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split, RandomizedSearchCV
+from sklearn.model_selection import RandomizedSearchCV
 from sklearn.metrics import accuracy_score
 import joblib
+import argparse
+import json
 import os
 
+from compaction import DEFAULT_TOLERANCE, compact_forest
+from dataset_store import (LABEL_MAPPING, DatasetError, load_training_frame, prepare_training_data,
+                           split_training_data)
+from forest_artifact import ARTIFACT_FILE, save_forest
+from forest_engine import FlatForest
+from halving_search import PARAM_DISTRIBUTIONS, HalvingForestSearch, compare_searches, print_comparison
+from model_card import DEFAULT_BOOTSTRAP, MODEL_CARD_FILE, build_model_card, print_model_card, save_model_card
+from model_registry import publish
+
+COMPACT_ARTIFACT_FILE = "earthquake_impact_rf.compact.forest"
+COMPACTION_REPORT_FILE = "compaction_report.json"
+SEARCH_REPORT_FILE = "search_report.json"
+
+parser = argparse.ArgumentParser(description="Train the earthquake impact model.")
+parser.add_argument("--compaction-tolerance", type=float, default=DEFAULT_TOLERANCE,
+                    help="weighted-F1 drop allowed for the compacted forest")
+parser.add_argument("--skip-compaction", action="store_true",
+                    help="only save the full forest")
+parser.add_argument("--synthetic-rows", type=int, default=0,
+                    help="train on this many generated events instead of downloading")
+parser.add_argument("--dataset", action="append", default=None,
+                    help="CSV URL or path to train on (repeatable; default: the project sources)")
+parser.add_argument("--data-dir", default=None,
+                    help="local dataset cache directory (default: data_cache/)")
+parser.add_argument("--offline", action="store_true",
+                    help="never download; fail if the dataset is not cached")
+parser.add_argument("--refresh-dataset", action="store_true",
+                    help="re-download the dataset even if a cached copy exists")
+parser.add_argument("--search", choices=["random", "halving", "compare"], default="random",
+                    help="hyperparameter search: RandomizedSearchCV, successive halving with "
+                         "warm-started forests, or both with a time/F1 comparison")
+parser.add_argument("--card-bootstrap", type=int, default=DEFAULT_BOOTSTRAP,
+                    help="bootstrap resamples for the model card's confidence intervals")
+parser.add_argument("--publish", action="store_true",
+                    help="add the trained model to the models/ registry and activate it; "
+                         "running apps swap to it without a restart")
+args = parser.parse_args()
+
 # Download and prepare data
-print("Downloading dataset...")
-# Try multiple sources for earthquake data
 try:
-    df = pd.read_csv("https://raw.githubusercontent.com/anushkadhiman/AI-impactSense/main/dataset/earthquake.csv")
-except:
-    try:
-        df = pd.read_csv("https://raw.githubusercontent.com/holtzy/Data_to_Viz/master/Story/earthquake/earthquake.csv")
-    except:
-        # Create sample data for testing
-        print("Using sample data...")
-        np.random.seed(42)
-        n_samples = 1000
-        # Generate features
-        data = {
-            'magnitude': np.random.uniform(3, 9, n_samples),
-            'depth': np.random.uniform(5, 700, n_samples),
-            'cdi': np.random.uniform(1, 10, n_samples),
-            'mmi': np.random.uniform(1, 12, n_samples),
-            'sig': np.random.uniform(10, 1000, n_samples),
-        }
-        df = pd.DataFrame(data)
-        
-        # Generate alert labels based on a risk calculation
-        def calculate_alert(row):
-            risk = (row['magnitude'] / 9 * 0.35 + 
-                    (1 - row['depth'] / 700) * 0.15 + 
-                    row['cdi'] / 10 * 0.20 + 
-                    row['mmi'] / 12 * 0.20 + 
-                    row['sig'] / 1000 * 0.10)
-            if risk < 0.35:
-                return 'green'
-            elif risk < 0.55:
-                return 'yellow'
-            elif risk < 0.75:
-                return 'orange'
-            else:
-                return 'red'
-        
-        df['alert'] = df.apply(calculate_alert, axis=1)
+    df = load_training_frame(args.synthetic_rows, args.dataset, args.data_dir,
+                             offline=args.offline, refresh=args.refresh_dataset)
+except DatasetError as e:
+    raise SystemExit(f"Training data unavailable: {e}")
 
 print(f"Dataset shape: {df.shape}")
 print(f"Columns: {df.columns.tolist()}")
 
-# Clean data
-df = df.drop_duplicates()
-df['alert'] = df['alert'].astype(str).str.strip()
-
-# Prepare features and target
-X = df[['magnitude', 'depth', 'cdi', 'mmi', 'sig']]
-y = df['alert']
-
-# Encode labels
-label_mapping = {'green': 0, 'yellow': 3, 'orange': 1, 'red': 2}
-y_encoded = y.map(label_mapping)
+# Clean data, prepare features and encode labels
+X, y_encoded, y = prepare_training_data(df)
+label_mapping = LABEL_MAPPING
 
 print(f"Features: {X.columns.tolist()}")
 print(f"Label mapping: {label_mapping}")
 print(f"Class distribution:\n{y.value_counts()}")
 
 # Split data
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y_encoded, test_size=0.2, random_state=42
-)
+X_train, X_test, y_train, y_test = split_training_data(X, y_encoded)
 
 # Hyperparameter tuning
-print("\nTraining Random Forest with hyperparameter tuning...")
-param_dist = {
-    "n_estimators": [200, 300, 500],
-    "max_depth": [20, 30, 40, None],
-    "min_samples_split": [2, 5],
-    "min_samples_leaf": [1, 2],
-    "max_features": ["sqrt"],
-    "bootstrap": [True],
-}
-
-rf = RandomForestClassifier(random_state=42)
-rf_search = RandomizedSearchCV(
-    estimator=rf,
-    param_distributions=param_dist,
-    n_iter=20,
-    scoring='f1_weighted',
-    cv=5,
-    verbose=1,
-    random_state=42,
-    n_jobs=-1
-)
-
-rf_search.fit(X_train, y_train)
+param_dist = PARAM_DISTRIBUTIONS
+search_report = None
+
+if args.search == "random":
+    print("\nTraining Random Forest with hyperparameter tuning...")
+    rf = RandomForestClassifier(random_state=42)
+    rf_search = RandomizedSearchCV(
+        estimator=rf,
+        param_distributions=param_dist,
+        n_iter=20,
+        scoring='f1_weighted',
+        cv=5,
+        verbose=1,
+        random_state=42,
+        n_jobs=-1
+    )
+    rf_search.fit(X_train, y_train)
+elif args.search == "halving":
+    print("\nTraining Random Forest with successive-halving search...")
+    rf_search = HalvingForestSearch(param_dist, n_candidates=20, random_state=42)
+    rf_search.fit(X_train, y_train)
+else:
+    print("\nComparing successive-halving search with RandomizedSearchCV...")
+    rf_search, search_report = compare_searches(param_dist, X_train, y_train, X_test, y_test,
+                                                n_iter=20, cv=5, random_state=42)
+    print_comparison(search_report)
 
 final_model = rf_search.best_estimator_
 print(f"Best parameters: {rf_search.best_params_}")
@@ -116,7 +115,58 @@ joblib.dump(final_model, model_path)
 feature_order = X_train.columns.tolist()
 joblib.dump(feature_order, feature_path)
 
+# Memory-mapped copy of the forest that app and worker processes share
+artifact_path = os.path.join(script_dir, ARTIFACT_FILE)
+save_forest(FlatForest.from_model(final_model), artifact_path, source=model_path)
+
 print(f"\nModel saved to: {model_path}")
+print(f"Artifact saved to: {artifact_path}")
 print(f"Feature order saved to: {feature_path}")
 print(f"Feature order: {feature_order}")
 
+# Held-out metrics the app shows next to each prediction
+print(f"\nBuilding model card ({args.card_bootstrap} bootstrap resamples)...")
+card = build_model_card(final_model, feature_order, X_test, y_test, X_train, y_train,
+                        n_bootstrap=args.card_bootstrap)
+card_path = os.path.join(script_dir, MODEL_CARD_FILE)
+save_model_card(card, card_path)
+print_model_card(card)
+print(f"Model card saved to: {card_path}")
+
+if args.publish:
+    version = publish(script_dir, activate=True)
+    print(f"Published and activated model version {version}")
+
+if search_report is not None:
+    search_report_path = os.path.join(script_dir, SEARCH_REPORT_FILE)
+    with open(search_report_path, "w") as f:
+        json.dump(search_report, f, indent=2, default=str)
+    print(f"Search comparison saved to: {search_report_path}")
+
+# Latency-budgeted compaction: fewest trees and shallowest depth cap within
+# the tolerance of the full forest, then redundant splits pruned
+if not args.skip_compaction:
+    print(f"\nCompacting forest (tolerance {args.compaction_tolerance})...")
+    compact, report = compact_forest(
+        final_model, X_train, y_train, X_test, y_test,
+        tolerance=args.compaction_tolerance,
+    )
+    compact_path = os.path.join(script_dir, COMPACT_ARTIFACT_FILE)
+    report_path = os.path.join(script_dir, COMPACTION_REPORT_FILE)
+    save_forest(compact, compact_path)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    selected = report["selected"]
+    print(f"Selected {selected['n_trees']} trees, max depth {selected['max_depth']} "
+          f"({report['selection_source']} F1 {report['selection_f1']['compact']:.4f} "
+          f"vs {report['selection_f1']['full']:.4f})")
+    print(f"Test accuracy: {report['test']['compact']['accuracy']:.4f} "
+          f"(full {report['test']['full']['accuracy']:.4f})")
+    print(f"Single-row latency: {report['latency_ms_single_row']['compact']:.3f} ms "
+          f"(full {report['latency_ms_single_row']['full']:.3f} ms)")
+    print(f"Artifact size: {report['artifact_bytes']['compact'] / 1e6:.1f} MB "
+          f"(full {report['artifact_bytes']['full'] / 1e6:.1f} MB)")
+    print(f"Compacted model saved to: {compact_path}")
+    print(f"Compaction report saved to: {report_path}")
+
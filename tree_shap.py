@@ -0,0 +1,246 @@
+"""
+Exact tree-path feature attributions
+====================================
+
+Per-prediction SHAP values for a ``FlatForest``, equal to path-dependent
+TreeSHAP (the ``tree_path_dependent`` mode of the ``shap`` package): a
+feature outside the coalition follows both branches of a split, weighted by
+the training samples (node cover) that went each way.
+
+For one leaf the game is a product over the features on its path. Feature
+``k`` contributes ``a_k`` (1 when the row lies inside the leaf's interval on
+``k``, or is missing there and every split on ``k`` sends missing values the
+path's way; else 0) when it is in the coalition and ``b_k`` (the share of cover
+the path's splits on ``k`` keep) when it is not. With ``C`` the set of
+features the row is consistent with, the leaf adds its value times
+
+    phi_j = -Psi(C)                       for j not in C
+    phi_j = (1 - b_j) / b_j * Psi(C - j)  for j in C
+
+to feature ``j``, where ``Psi(C) = sum over S within C of w(|S|) *
+prod_{k not in S} b_k`` and ``w`` are the Shapley weights. ``Psi`` depends on
+the tree only, so it is tabulated once for all ``2**M`` feature sets of every
+leaf. Explaining a row is then an interval test against every leaf, one table
+lookup per feature and a matrix product, vectorized over leaves and rows.
+
+Leaves are grouped by the class they predict. A pure leaf only moves its own
+class's probability, so explaining a single class walks that class's leaves
+and skips the rest.
+"""
+
+from math import factorial
+
+import numpy as np
+
+from forest_engine import float32_floor
+
+# The lookup table holds 2**M entries per leaf
+MAX_FEATURES = 12
+
+# Rows explained together, and (row, leaf) pairs handled per step
+BLOCK_ROWS = 32
+LEAF_BLOCK = 32768
+
+
+def shapley_weights(n_features):
+    """``w[s] = s! (M - s - 1)! / M!`` for coalitions of size ``s < M``."""
+    M = n_features
+    return np.array([factorial(s) * factorial(M - s - 1) / factorial(M) for s in range(M)])
+
+
+def leaf_paths(forest):
+    """Per-leaf path summary, walking all trees one depth level at a time.
+
+    Returns ``(leaves, lo, hi, log_b, nan_ok)``: global leaf indices, the
+    float32 interval ``lo < x <= hi`` a row must fall in on each feature to
+    reach the leaf, the log of the cover share the path keeps on each
+    feature, and whether a missing value on each feature still reaches it.
+    """
+    cover = getattr(forest, "cover", None)
+    if cover is None:
+        raise ValueError(
+            "Forest carries no node cover (quantized or older artifact); re-export it "
+            "with: python forest_artifact.py earthquake_impact_rf.pkl"
+        )
+    M = forest.n_features
+    is_leaf = forest.left == np.arange(len(forest.left))
+    threshold = float32_floor(forest.threshold)
+    log_cover = np.log(np.maximum(cover, np.finfo(np.float64).tiny))
+    # Same default as the engine: without the flag, missing values go right
+    missing_left = (np.zeros(len(forest.left), dtype=bool)
+                    if forest.missing_go_left is None else forest.missing_go_left)
+
+    frontier = forest.roots
+    lo = np.full((len(frontier), M), -np.inf, dtype=np.float32)
+    hi = np.full((len(frontier), M), np.inf, dtype=np.float32)
+    log_b = np.zeros((len(frontier), M))
+    nan_ok = np.ones((len(frontier), M), dtype=bool)
+    leaves, leaf_lo, leaf_hi, leaf_log_b, leaf_nan_ok = [], [], [], [], []
+    while frontier.size:
+        done = is_leaf[frontier]
+        leaves.append(frontier[done])
+        leaf_lo.append(lo[done])
+        leaf_hi.append(hi[done])
+        leaf_log_b.append(log_b[done])
+        leaf_nan_ok.append(nan_ok[done])
+
+        keep = ~done
+        node, lo, hi, log_b, nan_ok = (frontier[keep], lo[keep], hi[keep], log_b[keep],
+                                       nan_ok[keep])
+        rows = np.arange(len(node))
+        f = forest.feature[node]
+        left, right = forest.left[node], forest.right[node]
+
+        hi_left, log_b_left = hi.copy(), log_b.copy()
+        hi_left[rows, f] = np.minimum(hi[rows, f], threshold[node])
+        log_b_left[rows, f] += log_cover[left] - log_cover[node]
+        nan_ok_left = nan_ok.copy()
+        nan_ok_left[rows, f] &= missing_left[node]
+        lo_right = lo.copy()
+        lo_right[rows, f] = np.maximum(lo[rows, f], threshold[node])
+        log_b[rows, f] += log_cover[right] - log_cover[node]
+        nan_ok[rows, f] &= ~missing_left[node]
+
+        frontier = np.concatenate([left, right])
+        lo = np.concatenate([lo, lo_right])
+        hi = np.concatenate([hi_left, hi])
+        log_b = np.concatenate([log_b_left, log_b])
+        nan_ok = np.concatenate([nan_ok_left, nan_ok])
+
+    return (np.concatenate(leaves), np.concatenate(leaf_lo), np.concatenate(leaf_hi),
+            np.concatenate(leaf_log_b), np.concatenate(leaf_nan_ok))
+
+
+class TreeExplainer:
+    """Exact path-dependent SHAP values of a ``FlatForest``'s probabilities."""
+
+    def __init__(self, forest):
+        M = forest.n_features
+        if M > MAX_FEATURES:
+            raise ValueError(f"Exact attributions support up to {MAX_FEATURES} features, got {M}")
+        self.n_features = M
+        self.classes_ = forest.classes_
+        self.feature_names = forest.feature_names
+        n_classes = len(self.classes_)
+
+        leaves, lo, hi, log_b, nan_ok = leaf_paths(forest)
+        value = forest.value[leaves] / forest.n_trees
+
+        # Pure leaves grouped by class, mixed leaves last; segment c holds
+        # the leaves that only move class c
+        pure = np.count_nonzero(value, axis=1) == 1
+        group = np.where(pure, value.argmax(axis=1), n_classes)
+        order = np.argsort(group, kind="stable")
+        self._bounds = np.searchsorted(group[order], np.arange(n_classes + 2))
+        lo, hi, log_b, value = lo[order], hi[order], log_b[order], value[order]
+        nan_ok = nan_ok[order]
+
+        # Feature-major, so each per-feature pass streams one array
+        self._lo = np.ascontiguousarray(lo.T)
+        self._hi = np.ascontiguousarray(hi.T)
+        self._nan_ok = np.ascontiguousarray(nan_ok.T)
+        self._inv_b = np.ascontiguousarray(np.exp(-log_b).T.astype(np.float32))
+        self._value = value.astype(np.float32)
+        self._class_value = np.ascontiguousarray(self._value.T)
+
+        # Feature sets are bit masks; member[k, S] is 1 when k is in S
+        sets = np.arange(1 << M)
+        member = (sets[np.newaxis, :] >> np.arange(M)[:, np.newaxis]) & 1
+        # prod_{k not in S} b_k for every leaf and set S
+        cold = np.exp(log_b @ (1 - member))
+        subset = (sets[:, np.newaxis] & sets[np.newaxis, :]) == sets[:, np.newaxis]
+        # The full set is never looked up, so its weight is irrelevant
+        weights = shapley_weights(M)[np.minimum(member.sum(axis=0), M - 1)]
+        self._psi = (cold @ (weights[:, np.newaxis] * subset)).astype(np.float32).ravel()
+        self._row_offset = np.arange(len(value), dtype=np.intp) << M
+        # Per-leaf bit mask of the features a row is consistent with
+        self._mask_dtype = np.uint8 if M <= 8 else np.uint16
+
+        # Mean probability over the training rows each tree saw
+        self.expected_value = cold[:, 0] @ value
+
+    @property
+    def n_leaves(self):
+        return len(self._value)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self._lo, self._hi, self._nan_ok, self._inv_b, self._value,
+                                      self._class_value, self._psi, self._row_offset))
+
+    def _as_matrix(self, X):
+        if hasattr(X, "columns") and self.feature_names is not None:
+            X = X[self.feature_names]
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected input with {self.n_features} features, got shape {X.shape}")
+        if np.isinf(X).any():
+            raise ValueError("Input contains infinity")
+        return X
+
+    def shap_values(self, X):
+        """SHAP values for every class, shape (n, n_features, n_classes).
+
+        Columns follow the forest's feature order; per row,
+        ``expected_value + values.sum(axis=1)`` equals ``predict_proba``.
+        """
+        X = self._as_matrix(X)
+        out = np.zeros((X.shape[0], self.n_features, len(self.classes_)))
+        for start in range(0, X.shape[0], BLOCK_ROWS):
+            block = X[start:start + BLOCK_ROWS]
+            out[start:start + len(block)] = self._explain(block, 0, self.n_leaves, self._value)
+        return out
+
+    def class_shap_values(self, X, columns):
+        """SHAP values of one probability column per row, shape (n, n_features).
+
+        ``columns`` gives the class column to explain for each row, e.g. the
+        argmax of ``predict_proba``. Only leaves that can move that class are
+        visited.
+        """
+        X = self._as_matrix(X)
+        columns = np.broadcast_to(np.asarray(columns, dtype=np.intp), (X.shape[0],))
+        mixed = self._bounds[-2], self._bounds[-1]
+        out = np.zeros((X.shape[0], self.n_features))
+        for column in np.unique(columns):
+            rows = np.flatnonzero(columns == column)
+            for start in range(0, len(rows), BLOCK_ROWS):
+                index = rows[start:start + BLOCK_ROWS]
+                block = X[index]
+                for a, b in ((self._bounds[column], self._bounds[column + 1]), mixed):
+                    if b > a:
+                        out[index] += self._explain(block, a, b, self._class_value[column])
+        return out
+
+    def _explain(self, X, a, b, value):
+        """Contributions of leaves ``a:b`` to ``value`` (leaf values, one
+        column or all) for a block of rows, shape (n, M) + value.shape[1:]."""
+        out = np.zeros((X.shape[0], self.n_features) + value.shape[1:])
+        # Leaf chunks small enough that the block's lookups stay in cache
+        step = max(LEAF_BLOCK // X.shape[0], 1)
+        for start in range(a, b, step):
+            stop = min(start + step, b)
+            mask = self._mask_dtype
+            consistent = np.zeros((X.shape[0], stop - start), dtype=mask)
+            for j in range(self.n_features):
+                x = X[:, j:j + 1]
+                inside = np.less(self._lo[j, start:stop], x)
+                inside &= np.less_equal(x, self._hi[j, start:stop])
+                missing = np.isnan(x[:, 0])
+                if missing.any():
+                    inside[missing] = self._nan_ok[j, start:stop]
+                consistent |= inside.astype(mask) << mask(j)
+            index = self._row_offset[start:stop] + consistent
+
+            for j in range(self.n_features):
+                bit = consistent & mask(1 << j)
+                # Psi(C - j) when the row is consistent on j, Psi(C) otherwise
+                coef = self._psi.take(index - bit)
+                # times (1 - b_j) / b_j = 1 / b_j - 1 when consistent, else -1
+                factor = self._inv_b[j, start:stop] * (bit >> mask(j))
+                factor -= 1
+                coef *= factor
+                out[:, j] += coef @ value[start:stop]
+        return out
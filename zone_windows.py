@@ -0,0 +1,377 @@
+"""
+Sliding-window alert counts per zone
+====================================
+
+Rolling counts of green/yellow/orange/red predictions per zone over the last
+hour, day and week, kept up to date as scored events arrive. Nothing is
+recomputed from the event history.
+
+Each window is a ring of time buckets per zone: 60 one-minute buckets for
+the hour, 96 quarter-hour buckets for the day, 168 hourly buckets for the
+week. Every bucket remembers which period it holds. Adding an event touches
+one bucket per window: a bucket still holding an older period is cleared
+first. Expiry therefore costs O(1) per event, and a zone that goes quiet
+costs nothing.
+
+A query sums the buckets whose period falls inside the window ending at
+``now``. It reads every zone and window in one NumPy pass, so counts are
+exact to one bucket at the window's old end. ``now`` defaults to the latest
+event time seen, so replayed feeds age by event time rather than wall-clock
+time.
+
+``snapshot()`` writes the rings to one ``.npz`` file and ``restore()`` reads
+them back, so a restarted stream carries on without replaying the history.
+
+Zones are ``zone_cell_deg`` grid squares named by their south-west corner
+(``N35E135``), or any string passed to ``add``.
+
+Usage:
+    python zone_windows.py build scored.parquet alerts.jsonl --output zone_windows.npz
+    python zone_windows.py query --zone N35E135
+    python zone_windows.py top --window hour --alert red --limit 10
+    python event_stream.py run feed.jsonl --zone-windows zone_windows.npz
+"""
+
+import argparse
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from spatial_index import ALERT_ORDER, alert_ranks
+
+ZONE_WINDOWS_FILE = "zone_windows.npz"
+DEFAULT_ZONE_CELL_DEG = 5.0
+DEFAULT_SNAPSHOT_EVERY = 60.0
+
+# (name, bucket width in seconds, buckets): each window spans width * buckets
+WINDOWS = (
+    ('hour', 60, 60),
+    ('day', 900, 96),
+    ('week', 3600, 168),
+)
+
+
+def zone_name(latitude, longitude, cell_deg=DEFAULT_ZONE_CELL_DEG):
+    """Grid square containing a point, named by its south-west corner."""
+    if latitude is None or longitude is None or not (math.isfinite(latitude) and math.isfinite(longitude)):
+        return None
+    south = min(math.floor((latitude + 90.0) / cell_deg), math.ceil(180.0 / cell_deg) - 1) * cell_deg - 90.0
+    west = math.floor((((longitude + 180.0) % 360.0)) / cell_deg) * cell_deg - 180.0
+    return (f"{'N' if south >= 0 else 'S'}{abs(south):g}"
+            f"{'E' if west >= 0 else 'W'}{abs(west):g}")
+
+
+class ZoneWindows:
+    """Per-zone ring buffers of alert counts for each of ``windows``.
+
+    Thread-safe: the stream's sink thread can add events while other threads
+    query.
+    """
+
+    def __init__(self, windows=WINDOWS, zone_cell_deg=DEFAULT_ZONE_CELL_DEG, capacity=64):
+        self.windows = tuple((name, int(width), int(n)) for name, width, n in windows)
+        self.zone_cell_deg = zone_cell_deg
+        self._offsets = np.cumsum([0] + [n for _, _, n in self.windows])
+        n_buckets = int(self._offsets[-1])
+        self.zones = []
+        self._slots = {}
+        # Bucket period number (time // width); -1 marks a bucket never used
+        self._period = np.full((capacity, n_buckets), -1, dtype=np.int64)
+        self._counts = np.zeros((capacity, n_buckets, len(ALERT_ORDER)), dtype=np.int32)
+        self.latest = None
+        self.added = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.zones)
+
+    def _slot(self, zone):
+        slot = self._slots.get(zone)
+        if slot is None:
+            slot = self._slots[zone] = len(self.zones)
+            self.zones.append(zone)
+            if slot == len(self._period):
+                # Grow by doubling, so adding zones stays amortised O(1)
+                self._period = np.concatenate([self._period, np.full_like(self._period, -1)])
+                self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)])
+        return slot
+
+    # ------------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------------
+
+    def add(self, zone, alert, event_time):
+        """Count one event; returns False when it is older than every window."""
+        rank = alert if isinstance(alert, (int, np.integer)) else ALERT_ORDER.index(alert)
+        counted = False
+        with self._lock:
+            slot = self._slot(zone)
+            period_row, count_row = self._period[slot], self._counts[slot]
+            for (_, width, n), offset in zip(self.windows, self._offsets):
+                period = int(event_time // width)
+                bucket = offset + period % n
+                held = period_row[bucket]
+                if held < period:
+                    # The bucket's old period has left the window
+                    period_row[bucket] = period
+                    count_row[bucket] = 0
+                elif held > period:
+                    continue
+                count_row[bucket, rank] += 1
+                counted = True
+            self._advance(event_time, 1 if counted else 0, 0 if counted else 1)
+        return counted
+
+    def add_batch(self, zones, alerts, event_times):
+        """Count many events at once; returns how many fell in some window."""
+        zones = list(zones)
+        if not zones:
+            return 0
+        ranks = alert_ranks(alerts).astype(np.int64)
+        times = np.asarray(event_times, dtype=np.float64)
+        with self._lock:
+            slots = np.fromiter((self._slot(z) for z in zones), dtype=np.int64, count=len(zones))
+            n_buckets = self._period.shape[1]
+            period_flat = self._period.reshape(-1)
+            counts_flat = self._counts.reshape(-1, len(ALERT_ORDER))
+            counted = np.zeros(len(zones), dtype=bool)
+            for (_, width, n), offset in zip(self.windows, self._offsets):
+                periods = (times // width).astype(np.int64)
+                keys = slots * n_buckets + offset + periods % n
+                # Newest period each touched bucket holds after the batch;
+                # events of older periods in that bucket have expired
+                touched, position = np.unique(keys, return_inverse=True)
+                newest = period_flat[touched]
+                np.maximum.at(newest, position, periods)
+                renewed = touched[newest > period_flat[touched]]
+                counts_flat[renewed] = 0
+                period_flat[touched] = newest
+                current = periods == period_flat[keys]
+                np.add.at(counts_flat, (keys[current], ranks[current]), 1)
+                counted |= current
+            self._advance(times.max(), int(counted.sum()), int((~counted).sum()))
+        return int(counted.sum())
+
+    def _advance(self, event_time, added, expired):
+        self.added += added
+        self.expired += expired
+        if self.latest is None or event_time > self.latest:
+            self.latest = float(event_time)
+
+    # ------------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------------
+
+    def table(self, now=None):
+        """Counts for every zone: ``(zones, array[zone, window, alert])``."""
+        with self._lock:
+            now = self.latest if now is None else now
+            n_zones = len(self.zones)
+            result = np.zeros((n_zones, len(self.windows), len(ALERT_ORDER)), dtype=np.int64)
+            if now is None:
+                return list(self.zones), result
+            for w, ((_, width, n), offset) in enumerate(zip(self.windows, self._offsets)):
+                current = int(now // width)
+                periods = self._period[:n_zones, offset:offset + n]
+                live = (periods > current - n) & (periods <= current)
+                result[:, w] = (self._counts[:n_zones, offset:offset + n] * live[..., None]).sum(axis=1)
+            return list(self.zones), result
+
+    def counts(self, zone, now=None):
+        """``{window: {alert: count}}`` for one zone (zeros for an unseen zone)."""
+        with self._lock:
+            now = self.latest if now is None else now
+            slot = self._slots.get(zone)
+            out = {}
+            for (name, width, n), offset in zip(self.windows, self._offsets):
+                totals = np.zeros(len(ALERT_ORDER), dtype=np.int64)
+                if slot is not None and now is not None:
+                    current = int(now // width)
+                    periods = self._period[slot, offset:offset + n]
+                    live = (periods > current - n) & (periods <= current)
+                    totals = self._counts[slot, offset:offset + n][live].sum(axis=0)
+                out[name] = {alert: int(c) for alert, c in zip(ALERT_ORDER, totals)}
+            return out
+
+    def top(self, window='hour', alert='red', limit=10, now=None):
+        """Zones with the most ``alert`` events in ``window``, most first."""
+        names = [name for name, _, _ in self.windows]
+        zones, result = self.table(now)
+        column = result[:, names.index(window), ALERT_ORDER.index(alert)]
+        order = np.argsort(-column, kind='stable')[:limit]
+        return [(zones[i], int(column[i])) for i in order if column[i] > 0]
+
+    # ------------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------------
+
+    def snapshot(self, path):
+        """Write the rings to ``path`` atomically."""
+        with self._lock:
+            n_zones = len(self.zones)
+            tmp_path = path + '.tmp.npz'
+            np.savez(tmp_path,
+                     windows=np.array([(width, n) for _, width, n in self.windows], dtype=np.int64),
+                     window_names=np.array([name for name, _, _ in self.windows]),
+                     zone_cell_deg=self.zone_cell_deg,
+                     zones=np.array(self.zones, dtype=str),
+                     period=self._period[:n_zones], counts=self._counts[:n_zones],
+                     latest=np.nan if self.latest is None else self.latest,
+                     totals=np.array([self.added, self.expired], dtype=np.int64))
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def restore(cls, path):
+        with np.load(path) as data:
+            windows = [(str(name), int(width), int(n))
+                       for name, (width, n) in zip(data['window_names'], data['windows'])]
+            restored = cls(windows, float(data['zone_cell_deg']), capacity=max(len(data['zones']), 1))
+            restored.zones = [str(z) for z in data['zones']]
+            restored._slots = {zone: slot for slot, zone in enumerate(restored.zones)}
+            restored._period[:len(restored.zones)] = data['period']
+            restored._counts[:len(restored.zones)] = data['counts']
+            latest = float(data['latest'])
+            restored.latest = None if math.isnan(latest) else latest
+            restored.added, restored.expired = (int(v) for v in data['totals'])
+        return restored
+
+
+# ============================================================================
+# STREAM SINK
+# ============================================================================
+
+class ZoneWindowSink:
+    """Wraps an ``event_stream`` sink: passes results through, counts them per
+    zone and snapshots the windows every ``snapshot_every`` seconds."""
+
+    def __init__(self, windows, inner=None, snapshot_path=None, snapshot_every=DEFAULT_SNAPSHOT_EVERY):
+        self.windows = windows
+        self.inner = inner
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self._last_snapshot = time.monotonic()
+
+    def write(self, results):
+        if self.inner is not None:
+            self.inner.write(results)
+        zones, alerts, times = [], [], []
+        for result in results:
+            zone = zone_name(result['latitude'], result['longitude'], self.windows.zone_cell_deg)
+            if zone is not None:
+                zones.append(zone)
+                alerts.append(result['alert'])
+                times.append(result['time'] if result['time'] is not None else time.time())
+        self.windows.add_batch(zones, alerts, times)
+        if self.snapshot_path and time.monotonic() - self._last_snapshot >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self):
+        if self.snapshot_path:
+            self.windows.snapshot(self.snapshot_path)
+            self._last_snapshot = time.monotonic()
+
+    def close(self):
+        self.snapshot()
+        if self.inner is not None:
+            self.inner.close()
+
+
+# ============================================================================
+# COMMAND LINE
+# ============================================================================
+
+def _event_times(frame):
+    import pandas as pd
+
+    if 'time' not in frame.columns:
+        raise ValueError("scored events need a time column")
+    column = frame['time']
+    if column.dtype.kind in 'if':
+        values = column.to_numpy(np.float64)
+        # Epoch milliseconds as USGS writes them
+        return np.where(values > 1e11, values / 1000.0, values)
+    return pd.to_datetime(column, utc=True).astype('int64').to_numpy() / 1e9
+
+
+def build_from_files(paths, windows=None, zone_cell_deg=DEFAULT_ZONE_CELL_DEG, chunk_size=500_000):
+    """Replay scored CSV/Parquet/JSON Lines files (with latitude, longitude,
+    alert and time) into fresh windows, oldest events first."""
+    import pandas as pd
+
+    from score_catalog import iter_chunks
+
+    windows = windows or ZoneWindows(zone_cell_deg=zone_cell_deg)
+    for path in paths:
+        if path.lower().endswith(('.jsonl', '.json')):
+            chunks = pd.read_json(path, lines=True, chunksize=chunk_size)
+        else:
+            chunks = iter_chunks(path, None, chunk_size)
+        for frame in chunks:
+            times = _event_times(frame)
+            order = np.argsort(times, kind='stable')
+            latitude = frame['latitude'].to_numpy(np.float64)[order]
+            longitude = frame['longitude'].to_numpy(np.float64)[order]
+            alerts = frame['alert'].to_numpy()[order]
+            zones = [zone_name(lat, lon, windows.zone_cell_deg) for lat, lon in zip(latitude, longitude)]
+            located = np.array([z is not None for z in zones], dtype=bool)
+            windows.add_batch([z for z in zones if z is not None], alerts[located], times[order][located])
+    return windows
+
+
+def print_counts(zone, counts):
+    print(f"{zone}")
+    for window, by_alert in counts.items():
+        print(f"  {window:>5}: " + "  ".join(f"{alert} {n:>6,}" for alert, n in by_alert.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rolling alert counts per zone.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="replay scored files into a snapshot")
+    build.add_argument('inputs', nargs='+', help="scored CSV, Parquet or JSON Lines with latitude/longitude/time")
+    build.add_argument('--output', default=ZONE_WINDOWS_FILE)
+    build.add_argument('--zone-deg', type=float, default=DEFAULT_ZONE_CELL_DEG, help="zone size in degrees")
+
+    query = commands.add_parser('query', help="counts for zones")
+    query.add_argument('--snapshot', default=ZONE_WINDOWS_FILE)
+    query.add_argument('--zone', nargs='*', default=None, help="zone names (default: every zone)")
+    query.add_argument('--now', type=float, default=None,
+                       help="epoch seconds the windows end at (default: latest event)")
+
+    top = commands.add_parser('top', help="zones with the most alerts of a level")
+    top.add_argument('--snapshot', default=ZONE_WINDOWS_FILE)
+    top.add_argument('--window', default='hour', choices=[name for name, _, _ in WINDOWS])
+    top.add_argument('--alert', default='red', choices=ALERT_ORDER)
+    top.add_argument('--limit', type=int, default=10)
+    top.add_argument('--now', type=float, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        windows = build_from_files(args.inputs, zone_cell_deg=args.zone_deg)
+        windows.snapshot(args.output)
+        print(f"Counted {windows.added:,} events ({windows.expired:,} older than a week) in "
+              f"{len(windows):,} zones in {time.perf_counter() - start:.1f} s -> {args.output}")
+        return
+
+    if not os.path.exists(args.snapshot):
+        raise SystemExit(f"No snapshot at {args.snapshot}; run: python zone_windows.py build ...")
+    windows = ZoneWindows.restore(args.snapshot)
+    if args.command == 'query':
+        for zone in args.zone or windows.zones:
+            print_counts(zone, windows.counts(zone, args.now))
+    else:
+        ranked = windows.top(args.window, args.alert, args.limit, args.now)
+        if not ranked:
+            print(f"No {args.alert} alerts in the last {args.window}")
+        for zone, count in ranked:
+            print(f"{zone:>10}  {count:,}")
+
+
+if __name__ == '__main__':
+    main()